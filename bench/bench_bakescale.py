@@ -0,0 +1,115 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Scale bake benchmark
+#    Compares the per object make_single_user / transform_apply operator
+#    calls against the data level bakeScales used by sceneObjects, on a
+#    generated scene of scaled objects sharing a few meshes.
+#
+#   Run with:
+#     blender -b --python bench/bench_bakescale.py -- --objects 1000
+# ------------------------------------------------------------------------
+
+import bpy, os, sys, time, random, argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blender", "addons", "defender"))
+
+from defoldsync import defoldCmds
+
+# ------------------------------------------------------------------------
+# Objects with random scales, every mesh shared by a number of objects
+
+def makeTestScene( count, shared ):
+
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for me in list(bpy.data.meshes):
+        bpy.data.meshes.remove(me)
+
+    coll = bpy.context.scene.collection
+    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=3)
+    base = bpy.context.active_object.data
+    bpy.data.objects.remove(bpy.context.active_object)
+    meshes = [ base.copy() for i in range(max(1, count // shared)) ]
+    bpy.data.meshes.remove(base)
+
+    random.seed(1)
+    objects = []
+    for i in range(count):
+        obj = bpy.data.objects.new("Bench" + str(i), meshes[i % len(meshes)])
+        obj.location = (random.uniform(-50, 50), random.uniform(-50, 50), 0.0)
+        obj.scale = (random.choice([1.0, 2.0, 0.5]), 1.0, random.choice([1.0, 3.0]))
+        coll.objects.link(obj)
+        objects.append(obj)
+    return objects
+
+# ------------------------------------------------------------------------
+# The original per object operator path
+
+def operatorBake( objects ):
+    for obj in objects:
+        obj.select_set(True)
+        bpy.ops.object.make_single_user(object=True, obdata=True)
+        bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+        obj.select_set(False)
+
+# ------------------------------------------------------------------------
+
+def worldVerts( objects ):
+    bpy.context.view_layer.update()
+    return [ [ tuple(round(c, 4) for c in obj.matrix_world @ v.co) for v in obj.data.vertices[:8] ] for obj in objects ]
+
+# ------------------------------------------------------------------------
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Defender scale bake benchmark")
+    parser.add_argument("--objects", type=int, default=1000, help="Number of generated objects")
+    parser.add_argument("--shared", type=int, default=10, help="Objects sharing each mesh")
+    args = parser.parse_args(argv)
+
+    objects = makeTestScene(args.objects, args.shared)
+    for o in bpy.context.selected_objects:
+        o.select_set(False)
+    start = time.perf_counter()
+    operatorBake(objects)
+    ops_time = time.perf_counter() - start
+    expected = worldVerts(objects)
+    ops_meshes = len(bpy.data.meshes)
+
+    objects = makeTestScene(args.objects, args.shared)
+    start = time.perf_counter()
+    defoldCmds.bakeScales(objects)
+    data_time = time.perf_counter() - start
+    same = worldVerts(objects) == expected and all(tuple(o.scale) == (1.0, 1.0, 1.0) for o in objects)
+
+    print("[ BENCH ] Objects: " + str(args.objects) + "  shared per mesh: " + str(args.shared))
+    print("[ BENCH ] Operators:  %.3fs  meshes: %d" % (ops_time, ops_meshes))
+    print("[ BENCH ] Data level: %.3fs  meshes: %d  (%.1fx)" % (data_time, len(bpy.data.meshes), ops_time / max(data_time, 1e-9)))
+    print("[ BENCH ] World vertices identical: " + str(same))
+
+    if(same == False):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Data benchmark (no Blender needed)
+#    Times the parts of the export that only work on data, using the fake
+#    bpy in fakebpy: the syncdata.lua writers and the mesh buffer path
+#    (mesh arrays, corner streams, welding, buffer file and geometry hash).
+#    Results are printed and written as json like bench_export.
+#
+#   Run with:
+#     python bench/bench_data.py --objects 20000 --tris 100000 --output data.json
+# ------------------------------------------------------------------------
+
+import os, sys, json, time, argparse, tempfile
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(bench_dir)
+sys.path.append(os.path.join(bench_dir, "..", "blender", "addons", "defender"))
+
+import fakebpy
+fakebpy.install()
+
+from defoldsync import defoldUtils
+from defoldsync import defoldMesh
+
+import bench_luawriter
+import bench_export
+
+# Axis conversion used by the exporter (Y forward, Z up to -Z forward, Y up)
+convert_mat = [ [ 1.0, 0.0, 0.0, 0.0 ], [ 0.0, 0.0, 1.0, 0.0 ], [ 0.0, -1.0, 0.0, 0.0 ], [ 0.0, 0.0, 0.0, 1.0 ] ]
+convert_irot = [ [ 1.0, 0.0, 0.0, 0.0 ], [ 0.0, 0.0, -1.0, 0.0 ], [ 0.0, 1.0, 0.0, 0.0 ], [ 0.0, 0.0, 0.0, 1.0 ] ]
+
+# ------------------------------------------------------------------------
+
+def timeit( func, *args ):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+# ------------------------------------------------------------------------
+# The mesh buffer export path, one step at a time
+
+def meshBuffer( me, filepath, uv2 ):
+
+    times = {}
+    times["getMeshArrays"], arrays = timeit(defoldMesh.getMeshArrays, me, convert_mat, convert_irot, uv2)
+    times["cornerStreams"], streams = timeit(defoldMesh.cornerStreams, arrays, False)
+    times["weldVertices"], welded = timeit(defoldMesh.weldVertices, *streams)
+    times["writeMeshBuffer"], _ = timeit(defoldMesh.writeMeshBuffer, filepath, *welded)
+    times["geometryHash"], _ = timeit(defoldMesh.geometryHash, me)
+    return times
+
+# ------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Defender data benchmark")
+    parser.add_argument("--objects", type=int, default=20000, help="Object entries for the syncdata writers")
+    parser.add_argument("--tris", type=int, default=100000, help="Triangles in the generated mesh")
+    parser.add_argument("--uv-layers", type=int, default=2, help="Uv layers in the generated mesh")
+    parser.add_argument("--output", default=None, help="Write the results to this json file")
+    args = parser.parse_args()
+
+    filepath = os.path.join(tempfile.gettempdir(), "bench_data")
+
+    lua = {}
+    lua["dump_lua"], _ = timeit(bench_luawriter.writeDumpLua, filepath + ".lua", args.objects)
+    lua["LuaWriter"], _ = timeit(bench_luawriter.writeLuaWriter, filepath + ".lua", args.objects)
+
+    me = fakebpy.makeMesh(max(3, args.tris // 2), args.tris, args.uv_layers)
+    mesh = meshBuffer(me, filepath + ".mbuf", args.uv_layers > 1)
+
+    results = {
+        "commit": bench_export.gitCommit(),
+        "objects": args.objects,
+        "tris": args.tris,
+        "uv_layers": args.uv_layers,
+        "syncdata": lua,
+        "meshbuffer": mesh,
+    }
+    for name, seconds in list(lua.items()) + list(mesh.items()):
+        print("[ BENCH ] %-16s %.4fs" % (name, seconds))
+
+    if(args.output):
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    print("[ BENCH ] RESULT " + json.dumps(results))
+
+if __name__ == "__main__":
+    main()
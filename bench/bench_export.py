@@ -0,0 +1,146 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Export benchmark
+#    Generates a synthetic scene (see scenegen) and times a full sync -
+#    getData and the Lua generation - for each mesh export mode. Results
+#    are printed and written as json so runs on different commits can be
+#    compared.
+#
+#   Run with:
+#     blender -b --factory-startup --python bench/bench_export.py -- --objects 1000 --tris 500 --output results.json
+# ------------------------------------------------------------------------
+
+import bpy, os, sys, json, time, argparse, tempfile, subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+addon_dir = os.path.abspath(os.path.join(bench_dir, "..", "blender", "addons", "defender"))
+sys.path.append(bench_dir)
+sys.path.append(addon_dir)
+sys.path.append(os.path.dirname(addon_dir))
+
+import scenegen
+
+# ------------------------------------------------------------------------
+# Load the addon from this checkout (not an installed copy)
+
+def loadAddon():
+    import defender
+    defender.dir = addon_dir
+    if(hasattr(bpy.types.Scene, "sync_tool") == False):
+        defender.register()
+    return defender
+
+# ------------------------------------------------------------------------
+
+def gitCommit():
+    try:
+        return subprocess.check_output([ "git", "rev-parse", "--short", "HEAD" ], cwd=bench_dir, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+# ------------------------------------------------------------------------
+# One full sync of the saved scene with a mesh export mode
+
+def runMode( blendfile, projpath, mode, args ):
+
+    from defoldsync import defoldProfile
+
+    bpy.ops.wm.open_mainfile(filepath=blendfile)
+    mytool = bpy.context.scene.sync_tool
+    mytool.stream_mesh_type = mode
+    mytool.sync_proj = projpath
+    mytool.sync_scene = "bench_" + mode.lower()
+    mytool.sync_incremental = False
+    mytool.sync_nondestructive = args.nondestructive
+    mytool.stream_anim = args.armatures > 0
+
+    start = time.perf_counter()
+    bpy.ops.wm.sync_scene()
+    total = time.perf_counter() - start
+
+    stages = {}
+    counts = {}
+    if(defoldProfile.profile != None):
+        stages = { stage: entry["time"] for stage, entry in defoldProfile.profile.stages.items() }
+        counts = defoldProfile.profile.counts
+
+    mytool = bpy.context.scene.sync_tool
+    return {
+        "mode": mode,
+        "total": total,
+        "getData": stages.get("getData", 0.0),
+        "luajit": stages.get("luajit", 0.0),
+        "stages": stages,
+        "counts": counts,
+        "errors": list(mytool.sync_errors_str),
+    }
+
+# ------------------------------------------------------------------------
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Defender export benchmark")
+    parser.add_argument("--objects", type=int, default=200, help="Number of mesh objects")
+    parser.add_argument("--tris", type=int, default=200, help="Triangles per mesh")
+    parser.add_argument("--uv-layers", type=int, default=1, help="Uv layers per mesh")
+    parser.add_argument("--shared", type=float, default=0.5, help="Fraction of objects using a shared material")
+    parser.add_argument("--depth", type=int, default=1, help="Parent chain depth")
+    parser.add_argument("--armatures", type=int, default=0, help="Armatures with a skinned mesh")
+    parser.add_argument("--linked", type=float, default=0.0, help="Fraction of objects that are linked duplicates")
+    parser.add_argument("--modes", default="MESH,GLTF,GLB", help="Mesh export modes to run")
+    parser.add_argument("--nondestructive", action="store_true", help="Non destructive export (MESH mode)")
+    parser.add_argument("--output", default=None, help="Write the results to this json file")
+    args = parser.parse_args(argv)
+
+    loadAddon()
+
+    workdir = tempfile.mkdtemp(prefix="defender_bench_")
+    blendfile = os.path.join(workdir, "bench.blend")
+    projpath = os.path.join(workdir, "project")
+    os.makedirs(projpath, exist_ok=True)
+
+    start = time.perf_counter()
+    scene = scenegen.makeScene(args.objects, args.tris, args.uv_layers, args.shared, args.depth, args.armatures, args.linked)
+    print("[ BENCH ] Scene generated in %.3fs" % (time.perf_counter() - start))
+    bpy.ops.wm.save_as_mainfile(filepath=blendfile)
+
+    results = {
+        "commit": gitCommit(),
+        "blender": bpy.app.version_string,
+        "scene": scene,
+        "runs": [],
+    }
+    for mode in args.modes.split(","):
+        run = runMode(blendfile, projpath, mode.strip().upper(), args)
+        results["runs"].append(run)
+        print("[ BENCH ] %-5s total %.3fs  getData %.3fs  luajit %.3fs  errors %d" % (run["mode"], run["total"], run["getData"], run["luajit"], len(run["errors"])))
+
+    if(args.output):
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    print("[ BENCH ] RESULT " + json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# syncdata.lua writer benchmark
+#    Writes a generated OBJECTS table with dump_lua (one string per object)
+#    and with the streaming LuaWriter, and compares time and peak memory.
+#
+#   Run with:
+#     blender -b --python bench/bench_luawriter.py -- --objects 20000
+# ------------------------------------------------------------------------
+
+import os, sys, time, argparse, tempfile, tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blender", "addons", "defender"))
+
+from defoldsync import defoldUtils
+
+# ------------------------------------------------------------------------
+# An object entry like the ones sceneObjects writes
+
+def makeObject( i ):
+    return {
+        "name": "Object" + str(i),
+        "type": "MESH",
+        "parent": { "name": "Parent" + str(i // 10), "type": "OBJECT" },
+        "location": { "x": i * 0.1, "y": -i * 0.25, "z": 1.0 / (i + 1) },
+        "dimensions": { "x": 1.0, "y": 2.0, "z": 0.5 },
+        "rotation": {
+            "quat": { "x": 0.0, "y": 0.7071067811865476, "z": 0.0, "w": 0.7071067811865476 },
+            "euler": { "x": 0.0, "y": 1.5707963267948966, "z": 0.0 },
+        },
+        "scaling": { "x": 1.0, "y": 1.0, "z": 1.0 },
+        "props": [ { "name": "Collider", "collider_group": "default", "collider_mask": "default" } ],
+    }
+
+# ------------------------------------------------------------------------
+
+def writeDumpLua( filepath, count ):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('{ \n')
+        for i in range(count):
+            thisobj = makeObject(i)
+            f.write('["' + thisobj["name"] + '"] = ' + defoldUtils.dump_lua(thisobj) + ', \n')
+        f.write('} \n')
+
+def writeLuaWriter( filepath, count ):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        lw = defoldUtils.LuaWriter(f)
+        lw.begin()
+        for i in range(count):
+            thisobj = makeObject(i)
+            lw.field(thisobj["name"], thisobj)
+        lw.end(True)
+
+# ------------------------------------------------------------------------
+
+def measure( func, filepath, count ):
+    start = time.perf_counter()
+    func(filepath, count)
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced on a second run, tracing slows everything down
+    tracemalloc.start()
+    func(filepath, count)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, os.path.getsize(filepath)
+
+# ------------------------------------------------------------------------
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Defender syncdata writer benchmark")
+    parser.add_argument("--objects", type=int, default=20000, help="Number of object entries")
+    args = parser.parse_args(argv)
+
+    filepath = os.path.join(tempfile.gettempdir(), "bench_syncdata.lua")
+
+    dump = measure(writeDumpLua, filepath, args.objects)
+    stream = measure(writeLuaWriter, filepath, args.objects)
+
+    print("[ BENCH ] Objects: " + str(args.objects))
+    print("[ BENCH ] dump_lua:  %.3fs  peak %d bytes  file %d bytes" % dump)
+    print("[ BENCH ] LuaWriter: %.3fs  peak %d bytes  file %d bytes" % stream)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Mesh buffer extraction benchmark
+#    Compares the per vertex mesh extraction loop (json tables) against the
+#    bulk foreach_get/numpy path (binary mesh buffer) and checks they hold
+#    the same triangle corner data.
+#
+#   Run with:
+#     blender -b --python bench/bench_meshbuffer.py -- --subdiv 7
+#     blender -b myscene.blend --python bench/bench_meshbuffer.py -- --object Cube
+# ------------------------------------------------------------------------
+
+import bpy, os, sys, json, time, argparse, tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blender", "addons", "defender"))
+
+from defoldsync import defoldCmds
+from defoldsync import defoldMesh
+
+convert_mat = defoldCmds.convert_mat
+
+# ------------------------------------------------------------------------
+# The original per vertex export loop (geometry part only)
+
+def legacyMeshBuffer( obj, facenormals, want_uv2 ):
+
+    thisobj = {}
+    me = obj.data
+    me.calc_loop_triangles()
+
+    verts   = []
+    normals = []
+
+    verts_local = [convert_mat @ v.co for v in obj.data.vertices]
+    convert_rot = convert_mat.to_quaternion().to_matrix().to_4x4()
+    convert_irot = convert_rot.inverted()
+
+    normals_transformed = [convert_irot @ v.normal for v in obj.data.vertices]
+
+    if(facenormals == True):
+        for v in verts_local:
+            verts.append( { "x": v.x, "y": v.y, "z": v.z } )
+    else:
+        idx = 0
+        for v in verts_local:
+            normal = normals_transformed[idx]
+            verts.append( { "x": v.x, "y": v.y, "z": v.z } )
+            normals.append( { "x": normal.x, "y": normal.y, "z": normal.z } )
+            idx = idx + 1
+
+    thisobj["vertices"] = verts
+
+    tris = []
+    for i, face in enumerate(me.loop_triangles):
+        verts_indices = face.vertices[:]
+        triobj = {}
+        thistri = []
+        facenormal = convert_irot @ face.normal
+
+        for ti in range(0, 3):
+            idx = verts_indices[ti]
+            nidx = idx
+
+            if(facenormals == True):
+                normals.append( { "x": facenormal.x, "y": facenormal.y, "z": facenormal.z } )
+                nidx = nidx + 1
+
+            uv = None
+            uv_layer = None
+            if(me.uv_layers.active != None):
+                uv_layer = me.uv_layers.active.data
+            if(uv_layer):
+                uv = uv_layer[face.loops[ti]].uv
+
+            tridata = {
+                "vertex": idx,
+                "normal": nidx,
+                "uv": { "x": uv.x if uv else 0.0, "y": uv.y if uv else 0.0 }
+            }
+
+            if( want_uv2 ):
+                uvs = [uv for uv in obj.data.uv_layers if uv.active_render != True]
+                uv1 = uvs[0].data[face.loops[ti]].uv
+                tridata["uv2"] = { "x": uv1.x, "y": uv1.y }
+
+            thistri.append( tridata )
+
+        triobj["tri"] = thistri
+        tris.append(triobj)
+
+    thisobj["tris"] = tris
+    thisobj["normals"] = normals
+    return thisobj
+
+# ------------------------------------------------------------------------
+# The bulk extraction path used by exportMeshBuffer
+
+def bulkMeshBuffer( obj, facenormals, want_uv2, filepath ):
+
+    me = obj.data
+    me.calc_loop_triangles()
+
+    convert_rot = convert_mat.to_quaternion().to_matrix().to_4x4()
+    convert_irot = convert_rot.inverted()
+
+    arrays = defoldMesh.getMeshArrays(me, convert_mat, convert_irot, want_uv2)
+    positions, normals, uv, uv2 = defoldMesh.cornerStreams(arrays, facenormals)
+    defoldMesh.writeMeshBuffer(filepath, positions, normals, uv, uv2)
+    return positions, uv, uv2
+
+# ------------------------------------------------------------------------
+# Expand the legacy json tables the same way makebufferfile did
+
+def legacyCorners( thisobj ):
+    verts = thisobj["vertices"]
+    positions, uv, uv2 = [], [], []
+    for tri in thisobj["tris"]:
+        for t in tri["tri"]:
+            v = verts[t["vertex"]]
+            positions.append([v["x"], v["y"], v["z"]])
+            uv.append([t["uv"]["x"], t["uv"]["y"]])
+            if("uv2" in t):
+                uv2.append([t["uv2"]["x"], t["uv2"]["y"]])
+    return positions, uv, uv2
+
+# ------------------------------------------------------------------------
+
+def timeit( func, *args ):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+# ------------------------------------------------------------------------
+
+def makeTestObject( subdiv ):
+    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdiv)
+    obj = bpy.context.active_object
+    obj.data.uv_layers.new(name="UVMap")
+    obj.data.uv_layers.new(name="Lightmap")
+    return obj
+
+# ------------------------------------------------------------------------
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Defender mesh buffer benchmark")
+    parser.add_argument("--object", default=None, help="Object to export (default: generate an ico sphere)")
+    parser.add_argument("--subdiv", type=int, default=6, help="Ico sphere subdivisions for the generated object")
+    parser.add_argument("--facenormals", action="store_true", help="Use face normals")
+    parser.add_argument("--uv2", action="store_true", help="Export the second uv layer")
+    args = parser.parse_args(argv)
+
+    if(args.object):
+        obj = bpy.data.objects[args.object]
+    else:
+        obj = makeTestObject(args.subdiv)
+
+    want_uv2 = args.uv2 and len(obj.data.uv_layers) > 1
+    obj.data.calc_loop_triangles()
+    print("[ BENCH ] Object: " + obj.name + "  verts: " + str(len(obj.data.vertices)) + "  tris: " + str(len(obj.data.loop_triangles)))
+
+    bufferfile = os.path.join(tempfile.gettempdir(), "bench_meshbuffer.mbuf")
+
+    legacy_time, legacy = timeit(lambda: json.dumps(legacyMeshBuffer(obj, args.facenormals, want_uv2)))
+    bulk_time, bulk = timeit(bulkMeshBuffer, obj, args.facenormals, want_uv2, bufferfile)
+
+    positions, uv, uv2 = legacyCorners(json.loads(legacy))
+    same = np.array_equal(np.array(positions, dtype=np.float32), bulk[0].astype(np.float32))
+    same = same and np.array_equal(np.array(uv, dtype=np.float32), bulk[1].astype(np.float32))
+    if(bulk[2] is not None):
+        same = same and np.array_equal(np.array(uv2, dtype=np.float32), bulk[2].astype(np.float32))
+
+    print("[ BENCH ] Per vertex loop + json: %.3fs  %d bytes" % (legacy_time, len(legacy)))
+    print("[ BENCH ] Bulk numpy + buffer:    %.3fs  %d bytes  (%.1fx)" % (bulk_time, os.path.getsize(bufferfile), legacy_time / max(bulk_time, 1e-9)))
+    # Welded (indexed) buffer - expanding the indices must give the same corners
+    weldfile = os.path.join(tempfile.gettempdir(), "bench_meshbuffer_weld.mbuf")
+    start = time.perf_counter()
+    arrays = defoldMesh.cornerStreams(defoldMesh.getMeshArrays(obj.data, convert_mat, convert_mat.to_quaternion().to_matrix().to_4x4().inverted(), want_uv2), args.facenormals)
+    welded = defoldMesh.weldVertices(*arrays)
+    defoldMesh.writeMeshBuffer(weldfile, *welded)
+    weld_time = time.perf_counter() - start
+    indices = welded[4]
+    same = same and np.array_equal(welded[0][indices], arrays[0].astype(np.float32))
+
+    print("[ BENCH ] Welded buffer:          %.3fs  %d bytes  vertices %d -> %d" % (weld_time, os.path.getsize(weldfile), len(arrays[0]), len(welded[0])))
+    print("[ BENCH ] Corner data identical: " + str(same))
+
+    if(same == False):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Generated texture benchmark
+#    Writes a number of 16x16 solid color pngs through Blender images
+#    (images.new, generated_color, save) and with the numpy/zlib writer in
+#    defoldTextures, then loads both back to compare the pixels.
+#
+#   Run with:
+#     blender -b --python bench/bench_pngwriter.py -- --colors 500
+# ------------------------------------------------------------------------
+
+import bpy, os, sys, time, random, argparse, tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "blender", "addons", "defender"))
+
+from defoldsync import defoldUtils
+from defoldsync import defoldTextures
+
+# ------------------------------------------------------------------------
+# The bpy image path makeBlockPNG used
+
+def writeBpy( jobs ):
+    for filepath, col in jobs:
+        gencolor = (defoldUtils.to_srgb(col[0]), defoldUtils.to_srgb(col[1]), defoldUtils.to_srgb(col[2]), col[3])
+        img = bpy.data.images.new(os.path.basename(filepath), width=16, height=16, alpha=True)
+        img.file_format = 'PNG'
+        img.generated_color = gencolor
+        img.filepath_raw = filepath
+        img.save()
+        bpy.data.images.remove(img)
+
+# ------------------------------------------------------------------------
+
+def loadPixels( filepath ):
+    img = bpy.data.images.load(filepath)
+    pixels = np.empty(len(img.pixels), dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    bpy.data.images.remove(img)
+    return pixels
+
+# ------------------------------------------------------------------------
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="Defender generated texture benchmark")
+    parser.add_argument("--colors", type=int, default=500, help="Number of solid color textures")
+    args = parser.parse_args(argv)
+
+    folder = tempfile.mkdtemp(prefix="bench_png")
+    random.seed(1)
+    colors = [ [ random.random(), random.random(), random.random(), 1.0 ] for i in range(args.colors) ]
+    bpyjobs = [ (os.path.join(folder, "bpy_" + str(i) + ".png"), col) for i, col in enumerate(colors) ]
+    npjobs = [ (os.path.join(folder, "np_" + str(i) + ".png"), col) for i, col in enumerate(colors) ]
+
+    start = time.perf_counter()
+    writeBpy(bpyjobs)
+    bpy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    defoldTextures.writeSolidPNGs(npjobs)
+    np_time = time.perf_counter() - start
+
+    # Only a few are compared, loading is slow
+    diff = 0.0
+    for i in range(0, args.colors, max(1, args.colors // 20)):
+        diff = max(diff, float(np.abs(loadPixels(bpyjobs[i][0]) - loadPixels(npjobs[i][0])).max()))
+
+    print("[ BENCH ] Colors: " + str(args.colors))
+    print("[ BENCH ] bpy images:   %.3fs" % bpy_time)
+    print("[ BENCH ] numpy + zlib: %.3fs  (%.1fx)" % (np_time, bpy_time / max(np_time, 1e-9)))
+    print("[ BENCH ] Max pixel difference: %.4f" % diff)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Fake bpy for benchmarking the pure data parts without Blender
+#    install() puts stand in bpy and mathutils modules in place (only when
+#    the real ones arent there) so defoldUtils and defoldMesh can be
+#    imported by plain python. makeMesh builds a mesh with the collections
+#    and foreach_get that defoldMesh reads from.
+
+import sys, types
+import numpy as np
+
+# ------------------------------------------------------------------------
+
+def install():
+    try:
+        import bpy
+        return False
+    except ImportError:
+        pass
+
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.SimpleNamespace(ID=type("ID", (object,), {}))
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Matrix = type("Matrix", (object,), {})
+    sys.modules["bpy"] = bpy
+    sys.modules["mathutils"] = mathutils
+    return True
+
+# ------------------------------------------------------------------------
+# A bpy collection of n items with numpy backed attributes
+
+class Collection(object):
+
+    def __init__(self, count, **attrs):
+        self.count = count
+        self.attrs = attrs
+
+    def __len__(self):
+        return self.count
+
+    def foreach_get(self, attr, data):
+        data[:] = self.attrs[attr].ravel()
+
+class UVLayer(object):
+
+    def __init__(self, name, uvs, active_render):
+        self.name = name
+        self.data = Collection(len(uvs), uv=uvs)
+        self.active_render = active_render
+
+class UVLayers(list):
+    active = None
+    active_index = 0
+
+# ------------------------------------------------------------------------
+# A random triangle mesh, the same layout Blender gives after
+#   calc_loop_triangles (every polygon a triangle)
+
+def makeMesh( verts, tris, uv_layers = 1, seed = 1 ):
+
+    rnd = np.random.default_rng(seed)
+    co = rnd.uniform(-5.0, 5.0, (verts, 3)).astype(np.float32)
+    normals = rnd.uniform(-1.0, 1.0, (verts, 3)).astype(np.float32)
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+
+    tri_verts = rnd.integers(0, verts, (tris, 3)).astype(np.int32)
+    tri_loops = np.arange(tris * 3, dtype=np.int32).reshape(-1, 3)
+    face_normals = rnd.uniform(-1.0, 1.0, (tris, 3)).astype(np.float32)
+
+    me = types.SimpleNamespace()
+    me.vertices = Collection(verts, co=co, normal=normals)
+    me.loop_triangles = Collection(tris, vertices=tri_verts, loops=tri_loops, normal=face_normals)
+    me.loops = Collection(tris * 3, vertex_index=tri_verts.ravel())
+    me.polygons = Collection(tris, loop_total=np.full(tris, 3, dtype=np.int32), material_index=np.zeros(tris, dtype=np.int32), use_smooth=np.ones(tris, dtype=bool))
+    me.shape_keys = None
+
+    me.uv_layers = UVLayers()
+    for i in range(uv_layers):
+        me.uv_layers.append(UVLayer("UVMap" + str(i), rnd.random((tris * 3, 2)).astype(np.float32), i == 0))
+    if(uv_layers > 0):
+        me.uv_layers.active = me.uv_layers[0]
+    return me
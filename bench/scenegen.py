@@ -0,0 +1,184 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Synthetic scene generator for the benchmarks
+#    Builds a scene of grid meshes directly through bpy.data (no operators)
+#    so even large scenes are quick to make:
+#      objects         - number of mesh objects
+#      tris            - triangles per mesh (rounded to whole grid quads)
+#      uv_layers       - uv layers per mesh
+#      shared          - fraction of objects using one of a few shared
+#                        materials, the rest get a material of their own
+#      depth           - objects are parented in chains this deep
+#      armatures       - armatures, each with a skinned mesh child
+#      linked          - fraction of objects reusing an earlier mesh (linked
+#                        duplicates)
+#
+#   Use from a blender -b script:
+#     import scenegen
+#     scenegen.makeScene(objects=1000, tris=500)
+# ------------------------------------------------------------------------
+
+import bpy, math, random
+import numpy as np
+
+SHARED_MATERIALS    = 4
+
+# ------------------------------------------------------------------------
+
+def clearScene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for collection in [ bpy.data.meshes, bpy.data.materials, bpy.data.armatures, bpy.data.actions, bpy.data.collections ]:
+        for item in list(collection):
+            collection.remove(item)
+
+# ------------------------------------------------------------------------
+# A grid of quads with about tris triangles, built from numpy arrays
+
+def makeGridMesh( name, tris, uv_layers ):
+
+    quads = max(1, tris // 2)
+    side = max(1, int(math.sqrt(quads)))
+    rows = max(1, quads // side)
+
+    xs, ys = np.meshgrid(np.linspace(-1.0, 1.0, side + 1), np.linspace(-1.0, 1.0, rows + 1))
+    zs = 0.1 * np.sin(xs * 3.0) * np.cos(ys * 3.0)
+    verts = np.stack([xs.ravel(), ys.ravel(), zs.ravel()], axis=1).astype(np.float32)
+
+    cols = side + 1
+    r, c = np.meshgrid(np.arange(rows), np.arange(side), indexing="ij")
+    first = (r * cols + c).ravel()
+    loops = np.stack([first, first + 1, first + cols + 1, first + cols], axis=1).astype(np.int32)
+
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set("co", verts.ravel())
+    me.loops.add(loops.size)
+    me.loops.foreach_set("vertex_index", loops.ravel())
+    me.polygons.add(len(loops))
+    me.polygons.foreach_set("loop_start", np.arange(0, loops.size, 4, dtype=np.int32))
+    me.polygons.foreach_set("loop_total", np.full(len(loops), 4, dtype=np.int32))
+
+    uvs = (verts[loops.ravel(), :2] + 1.0) * 0.5
+    for i in range(uv_layers):
+        layer = me.uv_layers.new(name="UVMap" + str(i))
+        layer.data.foreach_set("uv", (uvs * (i + 1)).ravel())
+
+    me.update(calc_edges=True)
+    me.validate()
+    return me
+
+# ------------------------------------------------------------------------
+
+def makeMaterial( name, color ):
+    mat = bpy.data.materials.new(name)
+    mat.use_nodes = True
+    bsdf = mat.node_tree.nodes.get("Principled BSDF")
+    if(bsdf != None):
+        bsdf.inputs["Base Color"].default_value = color
+    mat.diffuse_color = color
+    return mat
+
+# ------------------------------------------------------------------------
+# An armature with a chain of bones and a mesh skinned to it
+
+def makeArmature( name, coll, tris, uv_layers, bones ):
+
+    arm = bpy.data.armatures.new(name)
+    rig = bpy.data.objects.new(name, arm)
+    coll.objects.link(rig)
+
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    for i in range(bones):
+        bone = arm.edit_bones.new("Bone" + str(i))
+        bone.head = (0.0, 0.0, i * 0.5)
+        bone.tail = (0.0, 0.0, (i + 1) * 0.5)
+        if(i > 0):
+            bone.parent = arm.edit_bones["Bone" + str(i - 1)]
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    me = makeGridMesh(name + "Skin", tris, uv_layers)
+    skin = bpy.data.objects.new(name + "Skin", me)
+    coll.objects.link(skin)
+    skin.parent = rig
+    mod = skin.modifiers.new("Armature", 'ARMATURE')
+    mod.object = rig
+    count = len(me.vertices)
+    for i in range(bones):
+        group = skin.vertex_groups.new(name="Bone" + str(i))
+        group.add(list(range(i * count // bones, (i + 1) * count // bones)), 1.0, 'REPLACE')
+    return rig
+
+# ------------------------------------------------------------------------
+
+def makeScene( objects = 100, tris = 200, uv_layers = 1, shared = 0.5, depth = 1, armatures = 0, linked = 0.0, seed = 1 ):
+
+    clearScene()
+    rnd = random.Random(seed)
+    # The exporter writes the top level collections
+    coll = bpy.data.collections.new("Bench")
+    bpy.context.scene.collection.children.link(coll)
+
+    materials = [ makeMaterial("Shared" + str(i), (rnd.random(), rnd.random(), rnd.random(), 1.0)) for i in range(SHARED_MATERIALS) ]
+
+    meshes = []
+    parents = []
+    for i in range(objects):
+        if(len(meshes) > 0 and rnd.random() < linked):
+            me = rnd.choice(meshes)
+        else:
+            me = makeGridMesh("Mesh" + str(i), tris, uv_layers)
+            if(rnd.random() < shared):
+                me.materials.append(rnd.choice(materials))
+            else:
+                me.materials.append(makeMaterial("Material" + str(i), (rnd.random(), rnd.random(), rnd.random(), 1.0)))
+            meshes.append(me)
+
+        obj = bpy.data.objects.new("Object" + str(i), me)
+        obj.location = (rnd.uniform(-100, 100), rnd.uniform(-100, 100), rnd.uniform(0, 10))
+        obj.rotation_euler = (0.0, 0.0, rnd.uniform(0, math.pi))
+        coll.objects.link(obj)
+
+        # Chains of depth objects, each parented to the one before
+        if(depth > 1 and i % depth != 0):
+            obj.parent = parents[-1]
+        parents.append(obj)
+
+    for i in range(armatures):
+        makeArmature("Rig" + str(i), coll, tris, uv_layers, 4)
+
+    bpy.context.view_layer.update()
+    return {
+        "objects": objects,
+        "tris": tris,
+        "uv_layers": uv_layers,
+        "shared": shared,
+        "depth": depth,
+        "armatures": armatures,
+        "linked": linked,
+        "meshes": len(bpy.data.meshes),
+        "materials": len(bpy.data.materials),
+    }
@@ -52,7 +52,7 @@ bl_info = {
     "category": "Development"
 }
 
-import bpy, subprocess, os, sys, socket
+import bpy, subprocess, os, sys, socket, time, queue, threading
 import platform
 
 from bpy.props import (StringProperty,
@@ -77,6 +77,20 @@ if "bpy" in locals():
     import importlib
     if "defoldUtils" in locals():
         importlib.reload(defoldUtils)
+    if "defoldMesh" in locals():
+        importlib.reload(defoldMesh)
+    if "defoldManifest" in locals():
+        importlib.reload(defoldManifest)
+    if "defoldWorkers" in locals():
+        importlib.reload(defoldWorkers)
+    if "defoldScene" in locals():
+        importlib.reload(defoldScene)
+    if "defoldProfile" in locals():
+        importlib.reload(defoldProfile)
+    if "defoldProgress" in locals():
+        importlib.reload(defoldProgress)
+    if "defoldTextures" in locals():
+        importlib.reload(defoldTextures)
     if "defoldMaterials" in locals():
         importlib.reload(defoldMaterials)
     if "defoldCmds" in locals():
@@ -98,6 +112,13 @@ if not dir in sys.path:
 # ------------------------------------------------------------------------
 
 from defoldsync import defoldUtils
+from defoldsync import defoldMesh
+from defoldsync import defoldManifest
+from defoldsync import defoldWorkers
+from defoldsync import defoldScene
+from defoldsync import defoldProfile
+from defoldsync import defoldProgress
+from defoldsync import defoldTextures
 from defoldsync import defoldMaterials
 from defoldsync import defoldCmds
 from defoldsync import defoldObjectProps
@@ -128,6 +149,8 @@ def update_lightglobal(self, context):
 class SyncProperties(PropertyGroup):
 
     sync_errors_str = []
+    # Level of each ErrorLine message (ERROR or WARNING)
+    sync_errors_level = []
 
     stream_info: BoolProperty(
         name="Stream Info",
@@ -151,6 +174,14 @@ class SyncProperties(PropertyGroup):
             ]
         )
 
+    sync_gltf_workers: IntProperty(
+        name="GLTF Workers",
+        description="Number of background Blender processes exporting GLTF/GLB files. 1 exports in this Blender.",
+        default = 1,
+        min = 1,
+        max = 32
+        )
+
     stream_object: BoolProperty(
         name="Stream Objects",
         description="Enable Object Stream",
@@ -260,6 +291,64 @@ class SyncProperties(PropertyGroup):
         description="Export second set of UV's if found in the mesh.",
         default = False
         )
+
+    sync_mat_palette: BoolProperty(
+        name="Color Palette",
+        description="Materials with only constant colors and values share palette textures instead of one small texture per value. Mesh export type only.",
+        default = False
+        )
+
+    sync_tex_max_size: EnumProperty(
+        name="Max Texture Size",
+        description="Image textures larger than this are resized when exported.",
+        items=[ 
+                ('NONE', "Source size", ""),
+                ('4096', "4096", ""),
+                ('2048', "2048", ""),
+                ('1024', "1024", ""),
+                ('512', "512", ""),
+                ('256', "256", ""),
+            ],
+        default = 'NONE'
+        )
+
+    sync_tex_pow2: BoolProperty(
+        name="Power of Two Textures",
+        description="Resize image textures down to power of two sizes when exported.",
+        default = False
+        )
+
+    sync_texture_workers: IntProperty(
+        name="Texture Threads",
+        description="Number of threads packing, resizing and writing textures while meshes export. 1 does it inline.",
+        default = 4,
+        min = 1,
+        max = 32
+        )
+
+    sync_weld_transfer: BoolProperty(
+        name="Weld Transfer Buffers",
+        description="Merge triangle corners with the same position, normal and uvs in the mesh buffer files passed to the generator. Makes the temp files smaller, the Defold buffers are still triangle lists. Mesh export type only.",
+        default = False
+        )
+
+    sync_incremental: BoolProperty(
+        name="Incremental Sync",
+        description="Only export objects that changed since the last sync.",
+        default = True
+        )
+
+    sync_nondestructive: BoolProperty(
+        name="Non Destructive",
+        description="Export without changing the scene (no file revert after sync). Mesh export type only.",
+        default = False
+        )
+
+    sync_batch_scenes: BoolProperty(
+        name="Batch Scenes",
+        description="Sync the collections of every scene in the file in one run. Meshes, textures and materials are shared by all the scenes. Non destructive mesh export only.",
+        default = False
+        )
         
     sync_mode: EnumProperty(
         name="Dropdown:",
@@ -285,101 +374,300 @@ class SyncProperties(PropertyGroup):
 #    Operators
 # ------------------------------------------------------------------------
 
+# Write all the Defender properties to a config file for the Lua generator
+
+def writeConfig(mytool):
+
+    projpath    = os.path.realpath(bpy.path.abspath(mytool.sync_proj))
+    projsubfolder = mytool.sync_subfolder
+     
+    # Convert \ in path to \\
+    projpath        = projpath.replace('\\','\\\\')
+    projsubfolder   = projsubfolder.replace('\\','\\\\')
+
+    prm = mytool.sync_mat_params  
+    lv = mytool.sync_light_vector  
+    animname = ""
+    if (mytool.stream_anim_name != None):
+        animname = str(mytool.stream_anim_name.name)
+
+    with open(  os.path.abspath(dir + '/defoldsync/config.lua'), 'w') as f:
+        f.write('-- Lua generated config - do not edit.\n')
+        f.write('return {\n')
+        f.write('   sync_mode        = "' + str(mytool.sync_mode) + '",\n')
+        f.write('   sync_proj        = "' + projpath + '",\n')
+        f.write('   sync_subfolder   = "' + projsubfolder + '",\n')
+        f.write('   sync_scene       = "' + mytool.sync_scene + '",\n')
+        f.write('   sync_shader      = "' + str(mytool.sync_shader) + '",\n')
+        f.write('   sync_light_mode  = "' + str(mytool.sync_light_mode) + '",\n')
+        f.write('   sync_light_vec   = { x = ' + str(lv[0]) + ', y = ' + str(lv[1]) + ', z = ' + str(lv[2]) + ' },\n')
+        f.write('   sync_mat_params   = { x = ' + str(prm[0]) + ', y = ' + str(prm[1]) + ', z = ' + str(prm[2]) + ' },\n')
+        f.write('   sync_mat_facenormals = ' + str(mytool.sync_mat_facenormals).lower() + ',\n')
+        f.write('   sync_mat_uv2     = ' + str(mytool.sync_mat_uv2).lower() + ',\n')
+        f.write('   stream_info      = ' + str(mytool.stream_info).lower() + ',\n')
+        f.write('   stream_object    = ' + str(mytool.stream_object).lower() + ',\n')
+        f.write('   stream_mesh      = ' + str(mytool.stream_mesh).lower() + ',\n')
+        f.write('   stream_mesh_type = "' + str(mytool.stream_mesh_type).lower() + '",\n')
+        f.write('   stream_anim      = ' + str(mytool.stream_anim).lower() + ',\n')
+        f.write('   stream_anim_name = "' + animname + '",\n')
+
+        # Write out game data lua files to temp for processing.
+        if (mytool.stream_gamedata == True):
+            f.write('   stream_gamedata = "' + gamedata + '",\n')
+
+        f.write('}\n')
+
+# ------------------------------------------------------------------------
+# The data streams getData writes
+
+def syncCommands(mytool):
+
+    # Run with library demo
+    # result = subprocess.check_output(['luajit', '-l', 'demo', '-e', 'test("a", "b")'])
+    commands    = [ "scene", "meshes" ]
+    if(mytool.stream_anim == True):
+        commands.append("anims")
+    return commands
+
+# ------------------------------------------------------------------------
+# Data is written for each stream. 
+
+platform_luajits = {
+    "Linux": {
+        "path": "luajit/linux/",
+        "exe": "luajit"
+    },
+    "Windows": {
+        "path": "luajit/win/",
+        "exe": "luajit.exe"
+    },
+    "Darwin": {
+        "path": "luajit/darwin/",
+        "exe": "luajit"
+    }
+}
+
+# The luajit command line that runs the generator
+def luajitCommand():
+
+    this_platform = platform.system()
+    defolddir = dir + '/defoldsync/'
+    luajit_cmd = os.path.abspath(defolddir + platform_luajits[this_platform]["path"] + platform_luajits[this_platform]["exe"] )
+    dirpath     = os.path.abspath(dir + '/defoldsync/main.lua')
+    return [ luajit_cmd, dirpath, os.path.abspath(dir) ]
+
+# ------------------------------------------------------------------------
+# Lua generation has finished - keep the manifest for the next sync
+
+def syncComplete(context):
+
+    defoldManifest.commitManifest(os.path.abspath(dir + '/defoldsync/temp'))
+    prog_text = "Process Complete."
+    defoldProgress.endProgress(prog_text)
+
+# ------------------------------------------------------------------------
+# Finish the sync profile and write it next to the defender-<scene>.log
+
+def saveProfile(mytool):
+
+    defoldProfile.endProfile()
+    defoldProfile.saveProfile(bpy.path.abspath("//defender-" + mytool.sync_scene + "-profile"))
+
+# ------------------------------------------------------------------------
+# Put back a scene the export converted. Run from a timer by the background
+#   sync, as the file cant be reloaded while its operator is running.
+
+def revertScene(filepath):
+
+    def revert():
+        if(bpy.data.filepath == filepath):
+            bpy.ops.wm.revert_mainfile()
+        return None
+    return revert
+
+# ------------------------------------------------------------------------
+
 class WM_OT_SyncTool(Operator):
 
     bl_label = "Sync Scene"
     bl_idname = "wm.sync_scene"
 
+    # Export time per timer event for the background sync
+    slice_time = 0.05
+    running = False
+
+    @classmethod
+    def poll(cls, context):
+        return WM_OT_SyncTool.running == False
+
+    # From the panel the sync runs in the background, see modal
+    def invoke(self, context, event):
+        if(bpy.app.background == True):
+            return self.execute(context)
+
+        mytool = context.scene.sync_tool
+        writeConfig(mytool)
+        mytool.msgcount = 0 
+
+        # The operator context is only valid during each call, the export runs over many
+        self.steps = defoldCmds.getDataSteps(bpy.context, syncCommands(mytool), dir, mytool)
+        self.proc = None
+        self.lines = queue.Queue()
+        self.output = []
+        self.converted = defoldCmds.isNonDestructive(mytool) == False
+        self.filepath = bpy.data.filepath
+
+        defoldCmds.redraw_progress = False
+        defoldCmds.update_progress(context, 0, "Exporting... (Esc to cancel)")
+        WM_OT_SyncTool.running = True
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    # The export runs a slice at a time on timer events, then luajit runs as
+    #   a separate process with its output shown in the progress label. Other
+    #   events are passed through so the UI stays responsive, Esc cancels.
+    def modal(self, context, event):
+        mytool = context.scene.sync_tool
+
+        if(event.type == 'ESC'):
+            self.cancel(context)
+            defoldCmds.update_progress(context, 0, "Sync cancelled.")
+            return {'CANCELLED'}
+
+        if(event.type != 'TIMER'):
+            return {'PASS_THROUGH'}
+
+        if(self.steps != None):
+            end = time.perf_counter() + self.slice_time
+            defoldProfile.resume()
+            try:
+                while(time.perf_counter() < end):
+                    next(self.steps)
+                defoldProfile.pause()
+            except StopIteration:
+                self.steps = None
+                self.startLua(context, mytool)
+            except Exception as e:
+                self.steps = None
+                self.cancel(context)
+                defoldUtils.ErrorLine(mytool, " " + str(e), "Sync", "ERROR")
+                defoldCmds.update_progress(context, 0, "Process Error.")
+                raise
+
+        elif(self.proc != None):
+            while(self.lines.empty() == False):
+                index, line = self.lines.get()
+                if(line == None):
+                    return self.finishLua(context, mytool)
+                if(len(line) > 0):
+                    self.output.append(line)
+                    defoldProgress.message(line)
+
+        else:
+            self.finish(context)
+            return {'FINISHED'}
+
+        self.tagRedraw(context)
+        return {'RUNNING_MODAL'}
+
+    def startLua(self, context, mytool):
+        cmd = luajitCommand()
+        if(os.access(cmd[0], os.X_OK) == False):
+            mytool.sync_errors_str.append("[Execution Persmissions Error]")
+            mytool.sync_errors_level.append("ERROR")
+            mytool.sync_errors_str.append("    File: " + cmd[0])
+            defoldCmds.update_progress(context, 0, "Process Error.")
+            return
+
+        prog_text = "Generating Defold data..."
+        defoldProgress.begin("lua", 1, prog_text)
+        print("[Command] " + " ".join(cmd))
+        self.luatimer = defoldProfile.timed("luajit").begin()
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace")
+        threading.Thread(target=defoldWorkers.readWorker, args=(self.proc, 0, self.lines), daemon=True).start()
+
+    def finishLua(self, context, mytool):
+        result = self.proc.wait()
+        self.luatimer.end()
+        defoldProgress.end()
+        self.proc = None
+        self.finish(context)
+        saveProfile(mytool)
+        if(result != 0):
+            defoldUtils.ErrorLine(mytool, " luajit exited with " + str(result), "Lua", "ERROR")
+            for line in self.output:
+                mytool.sync_errors_str.append("    " + line)
+            mytool.msgcount = len(mytool.sync_errors_str)
+            defoldCmds.update_progress(context, 0, "Process Error.")
+        else:
+            syncComplete(context)
+
+        # A converted scene is put back whether luajit worked or not
+        if(self.converted == True):
+            bpy.app.timers.register(revertScene(self.filepath), first_interval=0.0)
+        return {'FINISHED'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        defoldCmds.redraw_progress = True
+        WM_OT_SyncTool.running = False
+        self.tagRedraw(context)
+
+    # Stop the export or luajit. A converted scene is put back.
+    def cancel(self, context):
+        if(self.steps != None):
+            self.steps.close()
+            self.steps = None
+        if(self.proc != None):
+            self.proc.terminate()
+            self.proc.wait()
+            self.proc = None
+        self.finish(context)
+        if(self.converted == True):
+            bpy.app.timers.register(revertScene(self.filepath), first_interval=0.0)
+
+    def tagRedraw(self, context):
+        for window in context.window_manager.windows:
+            for area in window.screen.areas:
+                if(area.type == 'VIEW_3D'):
+                    area.tag_redraw()
+
     def execute(self, context):
         scene = context.scene
         mytool = scene.sync_tool
 
-        dirpath     = os.path.abspath(dir + '/defoldsync/main.lua')
-               
-        projpath    = os.path.realpath(bpy.path.abspath(mytool.sync_proj))
-        projsubfolder = mytool.sync_subfolder
-         
-        # Convert \ in path to \\
-        projpath        = projpath.replace('\\','\\\\')
-        projsubfolder   = projsubfolder.replace('\\','\\\\')
-
-        prm = mytool.sync_mat_params  
-        lv = mytool.sync_light_vector  
-        animname = ""
-        if (mytool.stream_anim_name != None):
-            animname = str(mytool.stream_anim_name.name)
-
-        # Write all the Defender properties to a config file
-        with open(  os.path.abspath(dir + '/defoldsync/config.lua'), 'w') as f:
-            f.write('-- Lua generated config - do not edit.\n')
-            f.write('return {\n')
-            f.write('   sync_mode        = "' + str(mytool.sync_mode) + '",\n')
-            f.write('   sync_proj        = "' + projpath + '",\n')
-            f.write('   sync_subfolder   = "' + projsubfolder + '",\n')
-            f.write('   sync_scene       = "' + mytool.sync_scene + '",\n')
-            f.write('   sync_shader      = "' + str(mytool.sync_shader) + '",\n')
-            f.write('   sync_light_mode  = "' + str(mytool.sync_light_mode) + '",\n')
-            f.write('   sync_light_vec   = { x = ' + str(lv[0]) + ', y = ' + str(lv[1]) + ', z = ' + str(lv[2]) + ' },\n')
-            f.write('   sync_mat_params   = { x = ' + str(prm[0]) + ', y = ' + str(prm[1]) + ', z = ' + str(prm[2]) + ' },\n')
-            f.write('   sync_mat_facenormals = ' + str(mytool.sync_mat_facenormals).lower() + ',\n')
-            f.write('   sync_mat_uv2     = ' + str(mytool.sync_mat_uv2).lower() + ',\n')
-            f.write('   stream_info      = ' + str(mytool.stream_info).lower() + ',\n')
-            f.write('   stream_object    = ' + str(mytool.stream_object).lower() + ',\n')
-            f.write('   stream_mesh      = ' + str(mytool.stream_mesh).lower() + ',\n')
-            f.write('   stream_mesh_type = "' + str(mytool.stream_mesh_type).lower() + '",\n')
-            f.write('   stream_anim      = ' + str(mytool.stream_anim).lower() + ',\n')
-            f.write('   stream_anim_name = "' + animname + '",\n')
-
-            # Write out game data lua files to temp for processing.
-            if (mytool.stream_gamedata == True):
-                f.write('   stream_gamedata = "' + gamedata + '",\n')
-
-            f.write('}\n')
-
-        # Run with library demo
-        # result = subprocess.check_output(['luajit', '-l', 'demo', '-e', 'test("a", "b")'])
-        commands    = [ "scene", "meshes" ]
-        if(mytool.stream_anim == True):
-            commands.append("anims")
+        writeConfig(mytool)
+        commands = syncCommands(mytool)
 
         mytool.msgcount = 0 
 
         # get the data from the objects in blender
         defoldCmds.getData(context, commands, dir, mytool)
 
-        # Data is written for each stream. 
-        platform_luajits = {
-            "Linux": {
-                "path": "luajit/linux/",
-                "exe": "luajit"
-            },
-            "Windows": {
-                "path": "luajit/win/",
-                "exe": "luajit.exe"
-            },
-            "Darwin": {
-                "path": "luajit/darwin/",
-                "exe": "luajit"
-            }
-        }
-        this_platform = platform.system()
-
         prog_text = "Generating Defold data..."
-        defoldCmds.update_progress(context, 10, prog_text)
-        defolddir = dir + '/defoldsync/'
+        defoldProgress.begin("lua", 1, prog_text)
 
-        luajit_cmd = os.path.abspath(defolddir + platform_luajits[this_platform]["path"] + platform_luajits[this_platform]["exe"] )
+        cmd = luajitCommand()
+        luajit_cmd = cmd[0]
         #Check execution permissions
         perm = os.access(luajit_cmd, os.X_OK) # Check for execution access
 
         if(perm):
-            print("[Command] " + str(luajit_cmd) + " " + str(dirpath) + " " + str(os.path.abspath(dir)))
-            subprocess.check_output([luajit_cmd, dirpath, os.path.abspath(dir)])
-            prog_text = "Process Complete."
-            defoldCmds.update_progress(context, 100, prog_text)
-            bpy.ops.wm.revert_mainfile()
+            print("[Command] " + " ".join(cmd))
+            with defoldProfile.timed("luajit"):
+                subprocess.check_output(cmd)
+            defoldProgress.end()
+            saveProfile(mytool)
+            syncComplete(context)
+            # Only needed when the export converted the scene
+            if(defoldCmds.isNonDestructive(mytool) == False):
+                bpy.ops.wm.revert_mainfile()
         else:
             mytool.sync_errors_str.append("[Execution Persmissions Error]")
+            mytool.sync_errors_level.append("ERROR")
             mytool.sync_errors_str.append("    File: " + luajit_cmd)
         
         if(len(mytool.sync_errors_str) > 0):
@@ -429,6 +717,9 @@ class OBJECT_PT_CustomPanel(Panel):
 
         row = box.row()
         row.prop(mytool, "stream_mesh_type")
+        if(mytool.stream_mesh_type != "MESH"):
+            row = box.row()
+            row.prop(mytool, "sync_gltf_workers")
 
         row = box.row()
         row.prop(mytool, "sync_mat_params")
@@ -436,6 +727,22 @@ class OBJECT_PT_CustomPanel(Panel):
         row.prop(mytool, "sync_mat_facenormals")
         row = box.row()
         row.prop(mytool, "sync_mat_uv2")
+        row = box.row()
+        row.prop(mytool, "sync_weld_transfer")
+        row = box.row()
+        row.prop(mytool, "sync_mat_palette")
+        row = box.row()
+        row.prop(mytool, "sync_tex_max_size")
+        row = box.row()
+        row.prop(mytool, "sync_tex_pow2")
+        row = box.row()
+        row.prop(mytool, "sync_texture_workers")
+        row = box.row()
+        row.prop(mytool, "sync_incremental")
+        row = box.row()
+        row.prop(mytool, "sync_nondestructive")
+        row = box.row()
+        row.prop(mytool, "sync_batch_scenes")
 
         layout.separator()
 
@@ -482,6 +789,17 @@ class OBJECT_PT_CustomPanel(Panel):
         row = layout.row()
         row.prop( mytool, "sync_progress", text=mytool.sync_progress_label )
 
+        # Slowest objects of the last sync (the full profile is in defender-<scene>-profile.csv)
+        profile = defoldProfile.profile
+        if(profile != None and len(profile.top) > 0 and WM_OT_SyncTool.running == False):
+            row = layout.row()
+            row.label( text='Slowest objects (%.2fs total):' % profile.total )
+            box = layout.box()
+            for name, obj in profile.top:
+                row = box.row()
+                row.label( text=name )
+                row.label( text="%.3fs  %d tris" % (obj["time"], obj["tris"]) )
+
         layout.separator()
         
         text = ""
@@ -0,0 +1,105 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Batch sync of many .blend files
+#    Runs defoldCli.py in a background blender for every file, a number of
+#    files at a time. Each file gets its own work folder so the runs dont
+#    share temp files, and keeping the folders between builds lets the
+#    incremental sync skip unchanged objects.
+#
+#    Run from the addon folder (blender/addons/defender):
+#      python -m defoldsync levels/*.blend --jobs 8 --workdir /tmp/defender -- 
+#          --sync_proj /path/to/defold/project
+#
+#    Arguments after -- are passed to defoldCli.py for every file. The exit
+#    code is non zero if any file failed or had errors, the output of each
+#    run is kept in cli.log in its work folder.
+
+import os, sys, time, hashlib, argparse, subprocess, concurrent.futures
+
+cli_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "defoldCli.py")
+
+# ------------------------------------------------------------------------
+# Files with the same name in different folders get different work folders
+
+def workdirFor( root, blendfile ):
+    blendfile = os.path.abspath(blendfile)
+    stem = os.path.splitext(os.path.basename(blendfile))[0]
+    key = hashlib.sha1(blendfile.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(root, stem + "_" + key)
+
+# ------------------------------------------------------------------------
+
+def runFile( blender, blendfile, workdir, cli_args ):
+
+    os.makedirs(workdir, exist_ok=True)
+    cmd = [ blender, "-b", "--factory-startup", blendfile, "--python", cli_script, "--", "--workdir", workdir ] + cli_args
+
+    start = time.perf_counter()
+    with open(os.path.join(workdir, "cli.log"), 'w') as log:
+        code = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    return code, time.perf_counter() - start
+
+# ------------------------------------------------------------------------
+
+def main():
+
+    argv = sys.argv[1:]
+    cli_args = []
+    if("--" in argv):
+        cli_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+
+    parser = argparse.ArgumentParser(prog="python -m defoldsync", description="Defender batch sync")
+    parser.add_argument("files", nargs="+", help="Blend files to sync")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable (default: $BLENDER or blender)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of files synced at the same time")
+    parser.add_argument("--workdir", default="defender-work", help="Folder for the work folders of each file")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.workdir)
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        runs = {}
+        for blendfile in args.files:
+            workdir = workdirFor(root, blendfile)
+            runs[pool.submit(runFile, args.blender, blendfile, workdir, cli_args)] = (blendfile, workdir)
+
+        for run in concurrent.futures.as_completed(runs):
+            blendfile, workdir = runs[run]
+            try:
+                code, elapsed = run.result()
+            except OSError as e:
+                code, elapsed = -1, 0.0
+                print("[ CLI ] " + blendfile + ": " + str(e))
+            status = "OK" if code == 0 else "FAILED (" + str(code) + ")"
+            print("[ CLI ] %s %s  %.1fs  %s" % (blendfile, status, elapsed, os.path.join(workdir, "cli.log")), flush=True)
+            if(code != 0):
+                failed.append(blendfile)
+
+    print("[ CLI ] Synced " + str(len(args.files) - len(failed)) + " of " + str(len(args.files)) + " files")
+    return 1 if len(failed) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
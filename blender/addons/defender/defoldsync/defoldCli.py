@@ -0,0 +1,165 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Command line sync
+#    Runs a sync of a .blend file in background Blender, with any of the
+#    Defender (SyncProperties) settings given as arguments. Settings that
+#    arent given keep the values saved in the file.
+#
+#      blender -b --factory-startup level.blend --python defoldsync/defoldCli.py -- 
+#          --sync_proj /path/to/defold/project --stream_mesh_type GLB --sync_mat_params 0.1,1.0,0.5
+#
+#    Other options:
+#      --workdir DIR   - folder for the temp files, textures and generator
+#                        (default: the addon folder). Runs in parallel need
+#                        their own, and keeping it lets incremental sync work.
+#      --events        - print progress events as json lines
+#
+#    The exit code is 0 when the sync had no errors, 1 when ErrorLine
+#    reported errors (warnings dont count) and 2 when the sync failed. Many files can be run in
+#    parallel with python -m defoldsync (see __main__.py).
+
+import bpy, os, sys, json, shutil, argparse
+
+addon_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EXIT_OK         = 0
+EXIT_ERRORS     = 1
+EXIT_FAILED     = 2
+
+# Properties that are state, not settings
+cli_ignore      = [ "rna_type", "sync_progress", "sync_progress_label", "sync_errors" ]
+
+# ------------------------------------------------------------------------
+# Load the addon from this folder (blender -b --factory-startup has no addons)
+
+def loadAddon():
+    sys.path.append(addon_dir)
+    sys.path.append(os.path.dirname(addon_dir))
+    addon = __import__(os.path.basename(addon_dir))
+    # Run from this folder, not an installed copy of the addon
+    addon.dir = addon_dir
+    if(hasattr(bpy.types.Scene, "sync_tool") == False):
+        addon.register()
+    return addon
+
+# ------------------------------------------------------------------------
+# An argument for every SyncProperties setting, converted from the string
+#   by the rna type
+
+def parseBool(value):
+    return value.lower() in [ "1", "true", "yes", "on" ]
+
+def parseVector(value):
+    return [ float(v) for v in value.split(",") ]
+
+def addPropertyArgs(parser, props):
+    for prop in props.bl_rna.properties:
+        if(prop.identifier in cli_ignore):
+            continue
+        parser.add_argument("--" + prop.identifier, default=None, help=prop.description or prop.name)
+
+def setProperty(props, prop, value):
+
+    if(prop.type == 'BOOLEAN'):
+        value = parseBool(value)
+    elif(prop.type == 'INT'):
+        value = int(value)
+    elif(prop.type == 'FLOAT'):
+        if(prop.array_length > 0):
+            value = parseVector(value)
+        else:
+            value = float(value)
+    elif(prop.type == 'POINTER'):
+        # Objects and actions by name
+        collection = { "Object": bpy.data.objects, "Action": bpy.data.actions }.get(prop.fixed_type.identifier)
+        if(collection == None or value not in collection):
+            raise ValueError("No " + prop.fixed_type.identifier + " called " + value)
+        value = collection[value]
+    setattr(props, prop.identifier, value)
+
+# ------------------------------------------------------------------------
+# A work folder with its own copy of the generator, so runs dont share the
+#   temp folder, config.lua or textures
+
+def makeWorkdir(workdir):
+
+    workdir = os.path.abspath(workdir)
+    shutil.copytree(os.path.join(addon_dir, "defoldsync"), os.path.join(workdir, "defoldsync"), 
+        dirs_exist_ok=True, ignore=shutil.ignore_patterns("temp", "__pycache__", "config.lua"))
+    return workdir
+
+# ------------------------------------------------------------------------
+
+def printEvent(event):
+    print("[ PROGRESS ] " + json.dumps(event), flush=True)
+
+# ------------------------------------------------------------------------
+
+def main():
+
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    addon = loadAddon()
+
+    from defoldsync import defoldProgress
+
+    mytool = bpy.context.scene.sync_tool
+    parser = argparse.ArgumentParser(description="Defender command line sync")
+    parser.add_argument("--workdir", default=None, help="Folder for the temp files, textures and generator")
+    parser.add_argument("--events", action="store_true", help="Print progress events as json lines")
+    addPropertyArgs(parser, mytool)
+    args = parser.parse_args(argv)
+
+    try:
+        for prop in mytool.bl_rna.properties:
+            value = getattr(args, prop.identifier, None)
+            if(value != None and prop.identifier not in cli_ignore):
+                setProperty(mytool, prop, value)
+    except ValueError as e:
+        print("[ CLI ] " + str(e))
+        return EXIT_FAILED
+
+    # Name the collection after the file if it has no name
+    if(mytool.sync_scene == ""):
+        mytool.sync_scene = os.path.splitext(os.path.basename(bpy.data.filepath))[0]
+
+    if(args.workdir):
+        addon.dir = makeWorkdir(args.workdir)
+    if(args.events):
+        defoldProgress.addListener(printEvent)
+
+    try:
+        bpy.ops.wm.sync_scene()
+    except Exception as e:
+        print("[ CLI ] Sync failed: " + str(e))
+        return EXIT_FAILED
+
+    for line in addon.SyncProperties.sync_errors_str:
+        print("[ CLI ] " + line)
+    if("ERROR" in addon.SyncProperties.sync_errors_level):
+        return EXIT_ERRORS
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,7 +22,14 @@
 
 
 from defoldsync import defoldUtils
+from defoldsync import defoldTextures
 from defoldsync import defoldMaterials
+from defoldsync import defoldMesh
+from defoldsync import defoldManifest
+from defoldsync import defoldWorkers
+from defoldsync import defoldScene
+from defoldsync import defoldProfile
+from defoldsync import defoldProgress
 
 # ------------------------------------------------------------------------
 
@@ -49,6 +56,10 @@ class Struct(object):
 
 # ------------------------------------------------------------------------
 # update progress bar 
+#   The background sync turns the forced redraw off, Blender redraws the
+#   panel between its time slices.
+
+redraw_progress = True
 
 def update_progress( context, value, text ):
 
@@ -58,14 +69,24 @@ def update_progress( context, value, text ):
     mytool.sync_progress = value
     mytool.sync_progress_label = text
 
-    bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+    if(redraw_progress == True and bpy.app.background == False):
+        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+
+# Progress events (see defoldProgress) shown in the panel
+def progressListener( context ):
+
+    def listener(event):
+        if(event["text"] != None):
+            update_progress(context, event["percent"], event["text"])
+    return listener
 
 # ------------------------------------------------------------------------
 # Get scene information - objects, names and parent names
-def sceneInfo(context, f):
-    dataobjs = {}  
+def sceneInfo(context, f, index):
+    lw = defoldUtils.LuaWriter(f)
+    lw.begin()
 
-    scene_objects = [ obj for obj in context.scene if obj in bpy.context.visible_objects ]
+    scene_objects = index.objects
     for obj in scene_objects:
 
         thisobj = {
@@ -79,9 +100,9 @@ def sceneInfo(context, f):
                 "type": str(obj.parent_type)
             }
         
-        dataobjs[thisobj["name"]] = thisobj
+        lw.field(thisobj["name"], thisobj)
 
-    f.write( defoldUtils.dump_lua(dataobjs) )
+    lw.end(True)
 
 # ------------------------------------------------------------------------
 
@@ -155,197 +176,346 @@ def processDefoldProperties(obj, thisobj):
                 defold_item["material_texture_defold"] = item.material_texture_defold 
 
             if item.command == "Set Key/Value":
-                val = (item.store_value).replace('"', '\\"')
-                defold_item["keyval"] = { "key": item.store_key, "value": val, "is_table": item.store_is_table }
+                defold_item["keyval"] = { "key": item.store_key, "value": item.store_value, "is_table": item.store_is_table }
 
             if item.command == "Init Script":
-                defold_item["scipt_init"] = item.command_init.replace('"', '\\"')
+                defold_item["scipt_init"] = item.command_init
 
             if item.command == "Update Script":
-                defold_item["scipt_update"] = item.command_update.replace('"', '\\"')
+                defold_item["scipt_update"] = item.command_update
             
             defold_output_props.append(defold_item)
 
         if(len(defold_output_props) > 0):
             thisobj["defold_props"] = defold_output_props
 
+# ------------------------------------------------------------------------
+# Material Name / Material Texture props change the generated mesh file, so
+#   objects using them always get their own mesh
+
+def hasMaterialProps(obj):
+
+    proplist = obj.demo_list
+    if( obj.parent != None and len(obj.parent.demo_list) > 0 and obj.parent.apply_children == True):
+        proplist = obj.parent.demo_list
+
+    for item in proplist:
+        if(item.command == "Material Name" or item.command == "Material Texture"):
+            return True
+    return False
+
+# ------------------------------------------------------------------------
+# Bake object scale into the object data - the same result as Apply Scale
+#   but done on the data directly, so there are no operator calls (and
+#   depsgraph updates / undo pushes) per object.
+#   Shared data is copied once for each different scale it is used with,
+#   so objects with the same data and scale still share it.
+
+scale_data_types = [ "MESH", "CURVE", "SURFACE", "FONT", "META", "ARMATURE", "LATTICE" ]
+
+def objectDepth(obj):
+    depth = 0
+    while(obj.parent != None):
+        obj = obj.parent
+        depth = depth + 1
+    return depth
+
+def bakeScales(objects):
+
+    start = time.perf_counter()
+    baked = {}
+    worlds = {}
+    count = 0
+    copies = 0
+
+    # Parents first, so a childs scale includes what it picked up from its parent
+    objects = sorted(set(objects), key=objectDepth)
+
+    for obj in objects:
+
+        scale = tuple(obj.scale)
+        if(scale == (1.0, 1.0, 1.0) or 0.0 in scale):
+            continue
+
+        if(obj.type in scale_data_types and obj.data != None):
+            key = (obj.data.as_pointer(), scale)
+            if(key in baked):
+                obj.data = baked[key]
+            else:
+                data = obj.data
+                if(data.users > 1 or data.library != None):
+                    data = data.copy()
+                    copies = copies + 1
+                data.transform(Matrix.Diagonal(scale).to_4x4())
+                baked[key] = data
+                obj.data = data
+        elif(obj.type == "EMPTY"):
+            obj.empty_display_size *= max([abs(s) for s in scale])
+        else:
+            continue
+
+        # Children keep their world transform (as Apply Scale does)
+        world = worlds.get(obj.name, obj.matrix_world.copy())
+        world = world @ Matrix.Diagonal(scale).inverted().to_4x4()
+        worlds[obj.name] = world
+        obj.scale = (1.0, 1.0, 1.0)
+        for child in obj.children:
+            if(child.parent_type == 'OBJECT'):
+                childworld = worlds.get(child.name, child.matrix_world.copy())
+                worlds[child.name] = childworld
+                child.matrix_parent_inverse = world.inverted()
+                child.matrix_basis = childworld
+        count = count + 1
+
+    # One depsgraph update so world matrices and dimensions are current again
+    if(count > 0):
+        bpy.context.view_layer.update()
+
+    print("[ TIMING ] Bake scale: " + str(count) + " of " + str(len(objects)) + " objects, " + str(copies) + " data copies in %.3fs" % (time.perf_counter() - start))
+
+# ------------------------------------------------------------------------
+# Non destructive export
+#   The scene is only read. Transforms are converted here instead of on the
+#   objects, and the scale bakeScales would apply goes into the exported
+#   vertices instead (see exportMeshBuffer). Only the mesh buffer export can
+#   work like this, the GLTF exporter needs the converted scene.
+
+def isNonDestructive(config):
+    return config.sync_nondestructive == True and config.stream_mesh_type == "MESH"
+
+def hasBakedScale(obj):
+    if(obj.type not in scale_data_types and obj.type != "EMPTY"):
+        return False
+    return not (0.0 in tuple(obj.matrix_world.to_scale()))
+
+# Axis converted world matrix, without scale if it is baked
+def exportWorldMatrix(obj, worlds):
+    world = worlds.get(obj.name)
+    if(world == None):
+        world = convert_mat @ obj.matrix_world @ convert_mat.inverted()
+        if(hasBakedScale(obj)):
+            loc, rot, scl = world.decompose()
+            world = Matrix.Translation(loc) @ rot.to_matrix().to_4x4()
+        worlds[obj.name] = world
+    return world
+
+# Converted matrix relative to the parent (the same as matrix_local after conversion)
+def exportLocalMatrix(obj, worlds):
+    local = exportWorldMatrix(obj, worlds)
+    if(obj.parent != None):
+        local = exportWorldMatrix(obj.parent, worlds).inverted() @ local
+    return local
+
+# ------------------------------------------------------------------------
+# Batch sync
+#   The collections of every scene go into one sync, so the meshes (and their
+#   instances), textures and materials are exported once and shared by all
+#   the generated collections. Each scene also gets a collection with
+#   instances of its own collections (SCENES in syncdata).
+#   Other scenes are only read, so this needs the non destructive export.
+
+def batchScenes(config):
+
+    if(config.sync_batch_scenes == False):
+        return []
+    if(isNonDestructive(config) == False):
+        defoldUtils.ErrorLine( config, " Batch Scenes needs a non destructive mesh export, only this scene is synced.", "Batch", "WARNING")
+        return []
+    return list(bpy.data.scenes)
+
+def sceneBatch(f, index):
+
+    lw = defoldUtils.LuaWriter(f)
+    lw.begin()
+    for scenename, collections in index.scenes:
+        lw.field(scenename, collections)
+    lw.end(True)
+    print("[ BATCH ] Scenes: " + str(len(index.scenes)) + "  collections: " + str(len(index.collections)))
+
 # ------------------------------------------------------------------------
 # Get all available obejcts in the scene (including transforms)
-def sceneObjects(context, f, config, handled):
+def sceneObjects(context, f, config, handled, manifest, index):
 
-    f.write('{ \n')
+    lw = defoldUtils.LuaWriter(f)
+    lw.begin()
     scene = context.scene
+    nondestructive = isNonDestructive(config)
+    worlds = {}
 
     # Axis convert everything
     convert_rot = convert_mat.to_quaternion().to_matrix().to_4x4()
     convert_irot = convert_rot.inverted()       
-    for obj in scene.objects: 
 
-        obj.matrix_world = convert_mat @ obj.matrix_world                                         
-        if obj.type == "MESH":
-            # obj.data.transform(convert_rot)
-            obj.matrix_world = obj.matrix_world @ convert_irot
-        else:
-            obj.matrix_world = obj.matrix_world @ convert_irot
-            
-        # else:
-        # if obj.parent == None:
-        #     # Rotate the position too (to simulate rotation around scene origin)
-        #     pos = obj.location
-        #     obj.location = convert_rot @ pos
-        #     print("------->" + str(obj.name))
-        #     else:
-        #         obj.matrix_world = convert_mat @ obj.matrix_world
+    # The scene is left as is for a non destructive export
+    if(nondestructive == False):
+        for obj in scene.objects: 
 
+            obj.matrix_world = convert_mat @ obj.matrix_world                                         
+            if obj.type == "MESH":
+                # obj.data.transform(convert_rot)
+                obj.matrix_world = obj.matrix_world @ convert_irot
+            else:
+                obj.matrix_world = obj.matrix_world @ convert_irot
+            
+            # else:
+            # if obj.parent == None:
+            #     # Rotate the position too (to simulate rotation around scene origin)
+            #     pos = obj.location
+            #     obj.location = convert_rot @ pos
+            #     print("------->" + str(obj.name))
+            #     else:
+            #         obj.matrix_world = convert_mat @ obj.matrix_world
 
-    prog_text = "Exporting objects..."
-    objcount = 0
-    #for coll in bpy.data.collections:
-    for coll in bpy.context.view_layer.layer_collection.children:
-        if coll.is_visible:
-            collection_objects = [ obj for obj in coll.collection.objects if obj in bpy.context.visible_objects ]
-            objcount += len(collection_objects)
-    objcurr = 0
 
     # No collections in the list!! Need a collection!
     if( len(bpy.data.collections) == 0 ):
         defoldUtils.ErrorLine( config, "No Collection found. Please add a collection.", "Scene", 'ERROR' )
-        f.write('} \n')
+        lw.end(True)
         return
 
+    # The stage is begun after the early return, so it is always ended
+    prog_text = "Exporting objects..."
+    objcount = 0
     #for coll in bpy.data.collections:
-    for coll in bpy.context.view_layer.layer_collection.children:
-
-        if coll.is_visible:
-            # Add an object for the collection
-            #   - Probably should make this a collection in Defold?
-
-            f.write('["COLL_' + str(coll.name) + '"] = { \n')
-
-            collection_objects = [ obj for obj in coll.collection.objects if obj in bpy.context.visible_objects ]
+    for coll, collection_objects in index.collections:
+        objcount += len(collection_objects)
+    defoldProgress.begin("objects", objcount, prog_text)
+
+    # Force all scaling to unity - otherwise things are difficult to manage
+    scale_objects = []
+    if(nondestructive == False):
+        for coll, collection_objects in index.collections:
             for obj in collection_objects:
-                            
                 if(handled[obj.name] == False):
+                    if(getattr(obj, 'type', '') not in ["LAMP", "LIGHT"]):
+                        scale_objects.append(obj)
+    bakeScales(scale_objects)
 
-                    update_progress(context, ((objcurr + 1)/objcount) * 100, prog_text )
-                    objcurr += 1
-
-                    # Force all scaling to unity - otherwise things are difficult to manage
-                    objType = getattr(obj, 'type', '')
-                    if(objType not in ["LAMP", "LIGHT"]):
-                        obj.select_set(True)
-                        # Make objects single users and apply scale
-                        bpy.ops.object.make_single_user(object=True, obdata=True)
-                        bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)          
-                        obj.select_set(False)
-
-                    thisobj = {
-                        "name": str(obj.name),
-                        "type": str(obj.type)
-                    }
+    #for coll in bpy.data.collections:
+    for coll, collection_objects in index.collections:
 
-                    #Override Type if this is a grouped object - always a mesh
-                    if(obj.defold_props.group_children == True):
-                        thisobj["type"] = "MESH"
+        # Add an object for the collection
+        #   - Probably should make this a collection in Defold?
 
-                    local_coord = obj.matrix_local.translation # obj.location
+        lw.begin('COLL_' + str(coll.name))
 
-                    rot = obj.rotation_quaternion.to_euler()
-                    if( obj.rotation_mode != "QUATERNION"):
-                        rot = obj.rotation_euler.copy()
-                        rot.order = 'XYZ'
+        for obj in collection_objects:
                         
-                    dimensions = obj.dimensions
-
-                    if(obj.parent != None):
-                        thisobj["parent"] = {
-                            "name": str(obj.parent.name),
-                            "type": str(obj.parent_type)
-                        }
-
-                    # This is a parent object in the collection. Adjust its location and rotation
-                    # else:
-                    #     euler = Matrix.Rotation( radians(-90), 4, 'X')
-                    #     rot = (euler @ rot.to_matrix().to_4x4()).to_euler('XYZ')
-                    #     local_coord = euler @ local_coord
-
-                    dimensions = (convert_mat @ dimensions)
-
-                    thisobj["location"] = { 
-                        "x": local_coord.x, 
-                        "y": local_coord.y, 
-                        "z": local_coord.z 
-                    }
+            if(handled[obj.name] == False):
 
-                    thisobj["dimensions"] = { 
-                        "x": abs(dimensions.x), 
-                        "y": abs(dimensions.y), 
-                        "z": abs(dimensions.z) 
-                    }
+                defoldProgress.advance()
+
+                thisobj = {
+                    "name": str(obj.name),
+                    "type": str(obj.type)
+                }
+
+                #Override Type if this is a grouped object - always a mesh
+                if(obj.defold_props.group_children == True):
+                    thisobj["type"] = "MESH"
+
+                local_coord = obj.matrix_local.translation # obj.location
 
-                    # quat = obj.rotation_quaternion
-                    quat = rot.to_quaternion()
+                rot = obj.rotation_quaternion.to_euler()
+                if( obj.rotation_mode != "QUATERNION"):
+                    rot = obj.rotation_euler.copy()
+                    rot.order = 'XYZ'
+
+                if(nondestructive == True):
+                    local = exportLocalMatrix(obj, worlds)
+                    local_coord = local.to_translation()
+                    rot = local.to_euler('XYZ')
                     
-                    thisobj["rotation"] = { 
-                        "quat": { 
-                        "x": quat.x,
-                        "y": quat.y,
-                        "z": quat.z,
-                        "w": quat.w
-                        },
-                        "euler": {
-                        "x": rot.x,
-                        "y": rot.y,
-                        "z": rot.z
-                        }
-                    }
+                dimensions = obj.dimensions
 
-                    scl = obj.scale.copy()
-                    thisobj["scaling"] = {
-                        "x": scl.x,
-                        "y": scl.y,
-                        "z": scl.z
+                if(obj.parent != None):
+                    thisobj["parent"] = {
+                        "name": str(obj.parent.name),
+                        "type": str(obj.parent_type)
                     }
 
-                    if( obj.type == "CAMERA" ):
-                        cam = obj.data
-                        thisobj["settings"] = {
-                            "fov": cam.angle_y,
-                            "near": cam.clip_start,
-                            "far" : cam.clip_end,
-                            "lens" : cam.lens,
-                            "ortho_scale": cam.ortho_scale
-                        }
-
-                    getProperties(obj, thisobj)
+                # This is a parent object in the collection. Adjust its location and rotation
+                # else:
+                #     euler = Matrix.Rotation( radians(-90), 4, 'X')
+                #     rot = (euler @ rot.to_matrix().to_4x4()).to_euler('XYZ')
+                #     local_coord = euler @ local_coord
+
+                dimensions = (convert_mat @ dimensions)
+
+                thisobj["location"] = { 
+                    "x": local_coord.x, 
+                    "y": local_coord.y, 
+                    "z": local_coord.z 
+                }
+
+                thisobj["dimensions"] = { 
+                    "x": abs(dimensions.x), 
+                    "y": abs(dimensions.y), 
+                    "z": abs(dimensions.z) 
+                }
+
+                # quat = obj.rotation_quaternion
+                quat = rot.to_quaternion()
+                
+                thisobj["rotation"] = { 
+                    "quat": { 
+                    "x": quat.x,
+                    "y": quat.y,
+                    "z": quat.z,
+                    "w": quat.w
+                    },
+                    "euler": {
+                    "x": rot.x,
+                    "y": rot.y,
+                    "z": rot.z
+                    }
+                }
+
+                scl = obj.scale.copy()
+                if(nondestructive == True):
+                    scl = exportLocalMatrix(obj, worlds).to_scale()
+                    if(hasBakedScale(obj)):
+                        scl = Vector((1.0, 1.0, 1.0))
+                thisobj["scaling"] = {
+                    "x": scl.x,
+                    "y": scl.y,
+                    "z": scl.z
+                }
+
+                if( obj.type == "CAMERA" ):
+                    cam = obj.data
+                    thisobj["settings"] = {
+                        "fov": cam.angle_y,
+                        "near": cam.clip_start,
+                        "far" : cam.clip_end,
+                        "lens" : cam.lens,
+                        "ortho_scale": cam.ortho_scale
+                    }
 
-                    # Process the new game data command (additional to custom)
-                    processDefoldProperties(obj, thisobj)
+                getProperties(obj, thisobj)
 
-                    if( defoldUtils.isAnimated(obj) == True ):
-                        thisobj["animated"] = True
+                # Process the new game data command (additional to custom)
+                processDefoldProperties(obj, thisobj)
 
-                    f.write('["' + str(obj.name) + '"] = ' + defoldUtils.dump_lua(thisobj) + ', \n')
-                    #thisobj["name"] ] = thisobj 
+                if( defoldUtils.isAnimated(obj) == True ):
+                    thisobj["animated"] = True
 
-            f.write('}, \n')
+                # Nothing changed since the last sync, the generator can keep its files
+                if( manifest.isChanged(obj.name) == False ):
+                    thisobj["unchanged"] = True
 
-    f.write('} \n')
+                lw.field(str(obj.name), thisobj)
+                #thisobj["name"] ] = thisobj 
 
-# ------------------------------------------------------------------------
-# Little util to taverse children and return a list
+        lw.end()
 
-def getChildren(myObject): 
-    children = [] 
-    for ob in bpy.data.objects: 
-        if ob.parent == myObject: 
-            children.append(ob) 
-    return children 
+    lw.end(True)
+    defoldProgress.end()
 
 # ------------------------------------------------------------------------
 # Mesh Buffer Export helper
 
-def exportMeshBuffer(context, mat, config, thisobj, obj, texture_path):
+def exportMeshBuffer(context, mat, config, thisobj, obj, temppath, texture_path):
     
     lightmap_enable = mat.name.endswith( "_LightMap")
     me = obj.data
@@ -353,107 +523,99 @@ def exportMeshBuffer(context, mat, config, thisobj, obj, texture_path):
     # bpy.ops.mesh.quads_convert_to_tris(quad_method='BEAUTY', ngon_method='BEAUTY')
     me.calc_loop_triangles()
 
-    # Get the vert data
-    verts   = []
-    normals = []
-
-    # Apply the matrix directly to vertex coordinates
-    verts_local = [convert_mat @ v.co for v in obj.data.vertices]
     convert_rot = convert_mat.to_quaternion().to_matrix().to_4x4()
     convert_irot = convert_rot.inverted()       
 
-    normals_transformed = [convert_irot @ v.normal for v in obj.data.vertices]
-
-    # Gltf and Glb are stored in file. No need for this
-    if(config.sync_mat_facenormals == True):
-        for v in verts_local:
-            verts.append( { "x": v.x, "y": v.y, "z": v.z } )
-    else:
-        idx = 0
-        for v in verts_local:
-            normal = normals_transformed[idx]
-            verts.append( { "x": v.x, "y": v.y, "z": v.z } )
-            normals.append( { "x": normal.x, "y": normal.y, "z": normal.z } )
-            idx = idx + 1
-
-    thisobj["vertices"] = verts
     thisobj = defoldMaterials.ProcessMaterial(thisobj, mat, texture_path, context, config)
+    if(thisobj.get("matname", "").endswith("_LightMap")):
+        lightmap_enable = True
+
+    # The object scale goes into the vertices when the scene isnt baked
+    scale = None
+    if(isNonDestructive(config) and hasBakedScale(obj)):
+        scale = obj.matrix_world.decompose()[2]
+
+    # Pull vertices, normals, triangles and uvs out in bulk
+    want_uv2 = len(me.uv_layers) > 1 and ((config.sync_mat_uv2 == True) or (lightmap_enable == True))
+    arrays = defoldMesh.getMeshArrays(me, convert_mat, convert_irot, want_uv2, scale)
+
+    # Geometry goes into a binary buffer file next to the json (which only holds the mesh info)
+    positions, normals, uv, uv2 = defoldMesh.cornerStreams(arrays, config.sync_mat_facenormals)
+    if("palette_uv" in thisobj):
+        uv[:] = thisobj["palette_uv"]
+    indices = None
+    # Only the transfer file is indexed, Defold mesh buffers have no index stream
+    if(config.sync_weld_transfer == True and len(positions) > 0):
+        corners = len(positions)
+        positions, normals, uv, uv2, indices = defoldMesh.weldVertices(positions, normals, uv, uv2)
+        thisobj["index_count"] = len(indices)
+        print("[ WELD ] " + str(thisobj["name"]) + ": " + str(corners) + " -> " + str(len(positions)) + " transfer vertices")
+
+    bufferfile = os.path.abspath(temppath + str(thisobj["name"]) + '.mbuf')
+    defoldMesh.writeMeshBuffer(bufferfile, positions, normals, uv, uv2, indices)
+    defoldProfile.addObjectData(thisobj["name"], len(me.loop_triangles), defoldProfile.fileSize(bufferfile))
+
+    thisobj["meshbuffer"] = bufferfile
+    thisobj["vertex_count"] = len(positions)
 
-    tris = []
-    nidx = 0
-
-    for i, face in enumerate(me.loop_triangles):
-        verts_indices = face.vertices[:]
-
-        triobj = {}
-        thistri = []
-        facenormal = convert_irot @ face.normal
 
-        for ti in range(0, 3):
-            idx = verts_indices[ti]
-            nidx = idx
-            uv = None
-
-            # override normals if using facenormals
-            if(config.sync_mat_facenormals == True):
-                normals.append( { "x": facenormal.x, "y": facenormal.y, "z": facenormal.z } )
-                nidx = nidx + 1
-                #print(idx, normal.x, normal.y, normal.z)
-
-            uv_layer = None
-            if(me.uv_layers.active != None):
-                uv_layer = me.uv_layers.active.data
-
-            if(uv_layer):
-                uv = uv_layer[face.loops[ti]].uv
-            
-            if(uv is None):
-                uv = Struct({ "x": 0.0, "y": 0.0 })
+# ------------------------------------------------------------------------
+# GLTF Export helper
+#   children - names of the objects grouped into this one
+#   jobs - if set the export is queued for the workers (see defoldWorkers)
 
-            tridata = { 
-                "vertex": idx,
-                "normal": nidx,
-                "uv": { "x": uv.x, "y": uv.y }
-            }
+def exportGLTF(context, thisobj, obj, temppath, mode, children, jobs = None):
 
-            if( len(me.uv_layers) > 1 and ((config.sync_mat_uv2 == True) or (lightmap_enable == True)) ):
-                uvs = [uv for uv in obj.data.uv_layers if uv.active_render != True]
-                uv1 = uvs[0].data[face.loops[ti]].uv
-                tridata["uv2"] = { "x": uv1.x, "y": uv1.y }
-            
-            thistri.append( tridata )
+    thisobj["gltf"] = os.path.abspath(temppath + str(thisobj["name"]) + ".gltf")
+    gltffiletype = "GLTF_EMBEDDED"
+    if( mode == "GLB" ):
+        thisobj["gltf"] = os.path.abspath(temppath + str(thisobj["name"]) + ".glb")
+        gltffiletype = "GLB"
 
-        triobj["tri"] = thistri
-        tris.append(triobj)
+    thisobj["normals"] = {}
+    thisobj["tris"] = {}
+    thisobj["vertices"] = {}
 
-    thisobj["tris"] = tris
+    if(jobs != None):
+        cost = 1
+        if(obj.type == "MESH" and obj.data != None):
+            cost = cost + len(obj.data.vertices)
+        jobs.append( { "name": obj.name, "filepath": thisobj["gltf"], "format": gltffiletype, "children": children, "cost": cost } )
+        return
 
-    #normals_world = [obj.matrix_world @ n_local for n_local in normals]
-    thisobj["normals"]  = normals
+    selectGLTFObjects(context, obj, children)
+    writeGLTF(thisobj["gltf"], gltffiletype)
+    defoldProfile.addObjectData(thisobj["name"], gltfTriangles(obj, children), defoldProfile.fileSize(thisobj["gltf"]))
 
+# Triangles in an object (and the objects grouped into it) for the profile
+def gltfTriangles(obj, children):
+    tris = 0
+    for o in [ obj ] + [ bpy.data.objects.get(name) for name in children ]:
+        if(o != None and o.type == "MESH" and o.data != None):
+            sides = defoldMesh.readInts(o.data.polygons, "loop_total", 1)
+            tris = tris + int(sides.sum()) - 2 * len(sides)
+    return tris
 
 # ------------------------------------------------------------------------
-# GLTF Export helper
+# Select just this object (and everything under it if grouped) to export
 
-def exportGLTF(context, thisobj, obj, temppath, mode, children):
-    # Select just this object to export
+def selectGLTFObjects(context, obj, children):
     for o in context.selected_objects:
         o.select_set(False)
 
     obj.select_set(True)
-    if(children == True):
-        for ch in obj.children:
+    for name in children:
+        ch = bpy.data.objects.get(name)
+        if(ch != None):
             ch.select_set(True)
 
     context.view_layer.objects.active = obj      
 
-    thisobj["gltf"] = os.path.abspath(temppath + str(thisobj["name"]) + ".gltf")
-    gltffiletype = "GLTF_EMBEDDED"
-    if( mode == "GLB" ):
-        thisobj["gltf"] = os.path.abspath(temppath + str(thisobj["name"]) + ".glb")
-        gltffiletype = "GLB"
+# ------------------------------------------------------------------------
+
+def writeGLTF(filepath, gltffiletype):
 
-    bpy.ops.export_scene.gltf(filepath=thisobj["gltf"], 
+    bpy.ops.export_scene.gltf(filepath=filepath, 
             export_skins=True,
             export_format=gltffiletype,
             #export_image_format='NONE',
@@ -470,34 +632,120 @@ def exportGLTF(context, thisobj, obj, temppath, mode, children):
             export_animations=True,
             use_visible=True,
             check_existing=False)
-    
-    thisobj["normals"] = {}
-    thisobj["tris"] = {}
-    thisobj["vertices"] = {}
+
+# ------------------------------------------------------------------------
+# Instancing
+#   Objects with the same geometry and materials export the same mesh, so
+#   they all reference the mesh exported for the first one. The geometry is
+#   compared by a content hash, so linked duplicates and copied meshes are
+#   both found (hashes are kept per data block in hashes).
+#   The keys are made before the scene is converted, so the world scale is
+#   part of the key (bakeScales, or the non destructive export, puts it into
+#   the vertices). GLTF files also hold the object rotation.
+#   Returns None for objects that need their own mesh.
+
+def instanceKey(obj, config, mode, hashes):
+
+    if(obj.data == None or len(obj.modifiers) > 0):
+        return None
+    if(defoldUtils.isAnimated(obj) == True or hasMaterialProps(obj) == True):
+        return None
+
+    pointer = obj.data.as_pointer()
+    if(pointer not in hashes):
+        hashes[pointer] = defoldMesh.geometryHash(obj.data)
+
+    key = [ hashes[pointer] ]
+    for slot in obj.material_slots:
+        if(slot.material != None):
+            key.append(slot.material.as_pointer())
+        else:
+            key.append(0)
+
+    key.append( tuple(round(s, 5) for s in obj.matrix_world.to_scale()) )
+    if(mode != "MESH"):
+        key.append( tuple(round(q, 5) for q in obj.matrix_world.to_quaternion()) )
+    return tuple(key)
+
+# Instance keys of the scene meshes sceneMeshes will export (by object name)
+def instanceKeys(objects, config, handled):
+
+    hashes = {}
+    keys = {}
+    for obj in objects:
+        if(obj.type == "MESH" and handled[obj.name] == False):
+            keys[obj.name] = instanceKey(obj, config, config.stream_mesh_type, hashes)
+    return keys
+
+# ------------------------------------------------------------------------
+# Size of the files exported for a mesh json (json, buffer and gltf)
+
+def exportedBytes(meshfile):
+
+    try:
+        with open(meshfile, 'r') as f:
+            mesh = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    size = os.path.getsize(meshfile)
+    for filepath in [ mesh.get("meshbuffer"), mesh.get("gltf") ]:
+        if(filepath != None and os.path.exists(filepath)):
+            size = size + os.path.getsize(filepath)
+    return size
+
+# ------------------------------------------------------------------------
+# False if the mesh json points at a mesh buffer that is stale or cut short
+
+def meshBufferValid(meshfile):
+
+    try:
+        with open(meshfile, 'r') as f:
+            mesh = json.load(f)
+    except (OSError, ValueError):
+        return True
+
+    if(mesh.get("meshbuffer") == None):
+        return True
+    return defoldMesh.checkMeshBuffer(mesh["meshbuffer"])
+
+# ------------------------------------------------------------------------
+# Add a mesh json file to the MESHES table
+
+def writeMeshEntry(fhandle, name, meshfile):
+    defoldUtils.LuaWriter(fhandle).field(name, meshfile)
 
 # ------------------------------------------------------------------------
 # Get all available meshes in the scene (including data)
+#   This is a generator, it yields before each object so the export can be
+#   split into time slices (see getDataSteps). Returns the animated objects.
 
-def sceneMeshes(context, fhandle, temppath, texture_path, config, handled):
+def sceneMeshes(context, fhandle, temppath, texture_path, config, handled, manifest, index, keys):
 
     scene = context.scene
-    all_objects = bpy.data.objects[:]
-    objectsall = [obj for obj in all_objects if obj in bpy.context.visible_objects]
+    objectsall = index.visibleObjects(bpy.data.objects)
 
     mode = config.stream_mesh_type
     fhandle.write('{ \n')
     UVObj = type('UVObj', (object,), {})
 
     prog_text = "Exporting meshes..."
-    objcount = 0
-    objcurr = 0
 
-    #Deselect any selected object
-    for o in context.selected_objects:
-        o.select_set(False)
+    #Deselect any selected object (the selection is only used by the GLTF exporter)
+    if(isNonDestructive(config) == False):
+        for o in context.selected_objects:
+            o.select_set(False)
+
+    # GLTF exports are collected and run on worker processes
+    gltfjobs = None
+    if( (mode == "GLTF" or mode == "GLB") and config.sync_gltf_workers > 1 ):
+        gltfjobs = []
 
     animActionObjs = []
 
+    # Instance key to the mesh json exported for it and how often it is reused
+    instances = {}
+
     for obj in objectsall:
 
         # Collate child collapsed meshes ready for processed
@@ -516,25 +764,33 @@ def sceneMeshes(context, fhandle, temppath, texture_path, config, handled):
 
             meshfile = os.path.abspath(temppath + str(thisobj["name"]) + '.json')
 
+            # Reuse the last export if nothing in the group changed
+            if(manifest.isChanged(obj.name) == False and os.path.exists(meshfile)):
+                writeMeshEntry(fhandle, thisobj["name"], meshfile)
+                continue
+
             if( mode == "GLTF" or mode == "GLB" ):
-                exportGLTF(context, thisobj, obj, temppath, mode, True)
+                with defoldProfile.timed("exportGLTF", obj.name):
+                    exportGLTF(context, thisobj, obj, temppath, mode, [ ch.name for ch in index.getDescendants(obj) ], gltfjobs)
 
             with open( meshfile, 'w') as f:
                 f.write(json.dumps(thisobj))
 
-            meshfile = meshfile.replace('\\','\\\\')       
-            fhandle.write('["' + thisobj["name"] + '"] = "' + meshfile + '", \n')
-            objcount = objcount + 1
-        else:
-            if(handled[obj.name] == False):
-                objcount = objcount + 1
+            writeMeshEntry(fhandle, thisobj["name"], meshfile)
 
     # iterate all the scene objects
-    sceneobjectsall = [obj for obj in scene.objects if obj in bpy.context.visible_objects]
+    sceneobjectsall = index.objects
+
+    # Queued GLTF exports take the second half of the stage
+    steps = len(sceneobjectsall)
+    if(gltfjobs != None):
+        steps = steps * 2
+    defoldProgress.begin("meshes", steps, prog_text)
+
     for obj in sceneobjectsall:
 
-        update_progress(context, ((objcurr + 1)/objcount) * 100, prog_text )
-        objcurr += 1
+        yield
+        defoldProgress.advance()
 
         # Only collect meshes in the scene
         if(obj.type == "MESH" and handled[obj.name] == False):
@@ -543,6 +799,29 @@ def sceneMeshes(context, fhandle, temppath, texture_path, config, handled):
                 if(not obj.name in animActionObjs): 
                     animActionObjs.append(obj.name)
 
+            # Linked duplicates use the mesh of the first object
+            key = keys.get(obj.name)
+            if(key != None and key in instances):
+                instance = instances[key]
+                writeMeshEntry(fhandle, str(obj.name), instance["meshfile"])
+                if(obj.data.as_pointer() == instance["data"]):
+                    instance["linked"] = instance["linked"] + 1
+                else:
+                    instance["copies"] = instance["copies"] + 1
+                continue
+
+            meshfile = os.path.abspath(temppath + str(obj.name) + '.json')
+            if(key != None):
+                instances[key] = { "meshfile": meshfile, "data": obj.data.as_pointer(), "linked": 0, "copies": 0 }
+
+            # Reuse the last export if the object hasnt changed
+            if(manifest.isChanged(obj.name) == False and os.path.exists(meshfile)):
+                writeMeshEntry(fhandle, str(obj.name), meshfile)
+                defoldProfile.count("meshes_reused")
+                continue
+
+            defoldProfile.count("meshes_exported")
+
             thisobj = {
                 "name": str(obj.name),
                 "type": str(obj.type)
@@ -556,43 +835,101 @@ def sceneMeshes(context, fhandle, temppath, texture_path, config, handled):
                 thisobj["parent"] = str(obj.parent.name)
 
             if(obj.data and mode == "MESH"):
-                exportMeshBuffer(context, mat, config, thisobj, obj, texture_path)
+                with defoldProfile.timed("exportMeshBuffer", obj.name):
+                    exportMeshBuffer(context, mat, config, thisobj, obj, temppath, texture_path)
             
 
             meshfile = os.path.abspath(temppath + str(thisobj["name"]) + '.json')
 
             if( mode == "GLTF" or mode == "GLB" ):
-                exportGLTF(context, thisobj, obj, temppath, mode, False)
+                with defoldProfile.timed("exportGLTF", obj.name):
+                    exportGLTF(context, thisobj, obj, temppath, mode, [], gltfjobs)
 
             with open( meshfile, 'w') as f:
                 f.write(json.dumps(thisobj))
 
-            meshfile = meshfile.replace('\\','\\\\')
-
             # with open(meshfile, 'w') as fh:
             #   fh.write('return {\n')
             #   fh.write( '   mesh = ' + defoldUtils.dump_lua(thisobj) + '\n' )
             #   fh.write('}\n')
             
-            fhandle.write('["' + thisobj["name"] + '"] = "' + meshfile + '", \n')
+            writeMeshEntry(fhandle, thisobj["name"], meshfile)
             #dataobjs[ thisobj["name"] ] = thisobj 
             
+    if(gltfjobs):
+        with defoldProfile.timed("exportGLTFJobs"):
+            yield from exportGLTFJobs(context, gltfjobs, temppath, config, len(sceneobjectsall))
+
+    reportInstances(instances)
 
     fhandle.write('} \n')
-    update_progress(context, 100, prog_text )
+    defoldProgress.end()
     return animActionObjs
 
+# ------------------------------------------------------------------------
+# Duplicates found by sceneMeshes and the export size they saved
+
+def reportInstances(instances):
+
+    linked = 0
+    copies = 0
+    saved = 0
+    for instance in instances.values():
+        reused = instance["linked"] + instance["copies"]
+        if(reused > 0):
+            linked = linked + instance["linked"]
+            copies = copies + instance["copies"]
+            saved = saved + reused * exportedBytes(instance["meshfile"])
+
+    if(linked + copies > 0):
+        print("[ INSTANCES ] Linked duplicates: " + str(linked) + "  identical meshes: " + str(copies) + "  bytes saved: " + str(saved))
+
+# ------------------------------------------------------------------------
+# Run the queued GLTF exports on the workers. Anything they couldnt do
+#   is exported here. This is a generator, it yields while the workers run.
+#   span - steps of the meshes progress stage the exports fill
+
+def exportGLTFJobs(context, jobs, temppath, config, span = 1):
+
+    prog_text = "Exporting GLTF files..."
+    defoldProgress.begin("gltf", len(jobs), prog_text, span)
+    def progress(done, total):
+        defoldProgress.advance()
+
+    start = time.perf_counter()
+    remaining = jobs
+    if(len(jobs) > 1):
+        remaining = yield from defoldWorkers.runGLTFJobs(jobs, config.sync_gltf_workers, temppath, progress)
+
+    if(len(remaining) > 0 and len(remaining) < len(jobs)):
+        defoldUtils.ErrorLine( config, " Worker exports failed, exporting here: " + str(len(remaining)), "GLTF", "WARNING")
+
+    for job in remaining:
+        with defoldProfile.timed("exportGLTF", job["name"]):
+            selectGLTFObjects(context, bpy.data.objects[job["name"]], job["children"])
+            writeGLTF(job["filepath"], job["format"])
+        defoldProgress.advance()
+
+    for job in jobs:
+        obj = bpy.data.objects.get(job["name"])
+        if(obj != None):
+            defoldProfile.addObjectData(job["name"], gltfTriangles(obj, job["children"]), defoldProfile.fileSize(job["filepath"]))
+
+    defoldProgress.end()
+    print("[ TIMING ] GLTF export: " + str(len(jobs)) + " files in %.3fs" % (time.perf_counter() - start))
+
 # ------------------------------------------------------------------------
 # Select parents up to the collection
-def selectParent(obj):
-    if(obj.type != "COLLECTION"):
-        obj.select_set(True)
-        if(obj.parent):
-            selectParent(obj.parent)
+def selectParent(obj, index):
+    collection = None
+    if(len(obj.users_collection) > 0):
+        collection = obj.users_collection[0].name
+    for o in index.getAncestors(obj, collection):
+        o.select_set(True)
 
 # ------------------------------------------------------------------------
 # Export scene animations
-def sceneAnimations(context, f, temppath, config, animobjs):
+def sceneAnimations(context, f, temppath, config, animobjs, index):
 
     # write out the animation to a dae file. 
     #   This is then referenced in the model file (if it has an anim association)
@@ -602,15 +939,18 @@ def sceneAnimations(context, f, temppath, config, animobjs):
     # Make a list of animations that are collected and output
     animmeshes = []
 
+    defoldProgress.begin("anims", len(animobjs), "Exporting animations...")
+
     # Select all the meshes
     for meshname in animobjs:
+        defoldProgress.advance()
         meshobj = scene.objects[meshname]
 
         if(meshobj != None):
             for obj in bpy.data.objects: obj.select_set(False)
 
             # Select the mesh - and its parents (need full hierarchy)
-            selectParent(meshobj)
+            selectParent(meshobj, index)
 
             # Add the selection of the Armature modifier
             if(len(meshobj.modifiers) > 0):
@@ -651,13 +991,15 @@ def sceneAnimations(context, f, temppath, config, animobjs):
                             check_existing=False)
 
             animfile = os.path.normpath(animfile)
-            animfile = animfile.replace("\\", "\\\\")
             animmeshes.append( [meshobj.name, animfile] )
 
+    defoldProgress.end()
+
     # Make sure we have vertex objects in this obj
     if( len(animmeshes) > 0 ):
+        lw = defoldUtils.LuaWriter(f)
         for a in animmeshes:
-            f.write( "['" + a[0] + "'] = " + '\"' + a[1] + '\",\n')
+            lw.field(a[0], a[1])
 
     # TODO: Extract each individual action into a separate file 
     #
@@ -704,12 +1046,35 @@ def sceneAnimations(context, f, temppath, config, animobjs):
 
 def getData( context, clientcmds, dir, config):
 
+    for step in getDataSteps(context, clientcmds, dir, config):
+        pass
+
+# ------------------------------------------------------------------------
+# getData as a generator - it yields between the stages and between the
+#   objects in sceneMeshes, so the background sync can run it a slice at a
+#   time. Closing it early (cancel) still finishes the texture jobs and
+#   caches, but doesnt save the manifest.
+
+def getDataSteps( context, clientcmds, dir, config):
+
+    defoldProfile.beginProfile()
+    timer = defoldProfile.timed("getData").begin()
+
+    # Progress for the streams written here, the textures and the Lua generation
+    stages = { "scene": "objects", "meshes": "meshes", "anims": "anims" }
+    stages = [ stages[cmd] for cmd in clientcmds if cmd in stages ] + [ "textures", "lua" ]
+    defoldProgress.beginProgress(stages, [ progressListener(context) ])
+
     temppath = os.path.abspath(dir + '/defoldsync/temp')
 
-    try:
-        shutil.rmtree(temppath, ignore_errors=True)
-    except OSError as e:
-        print("Error: %s : %s" % (dir_path, e.strerror))
+    # Keep the last export around if incremental sync can use it
+    manifest = defoldManifest.SyncManifest(temppath, config)
+    if(config.sync_incremental == False or manifest.valid == False):
+        manifest.reset()
+        try:
+            shutil.rmtree(temppath, ignore_errors=True)
+        except OSError as e:
+            print("Error: %s : %s" % (temppath, e.strerror))
 
     defoldUtils.ClearErrors( config )
 
@@ -717,61 +1082,123 @@ def getData( context, clientcmds, dir, config):
     os.makedirs( temppath, 511, True )
     texture_path = os.path.abspath( dir + "/textures" )
     os.makedirs( texture_path, 511, True )
+    defoldTextures.beginCache( texture_path )
+    defoldTextures.beginBudget( config, texture_path )
+    defoldTextures.beginPool( config )
+    defoldMaterials.beginMaterials( config, texture_path, manifest.valid == False )
 
-    # Write data to temp data file for use by lua
-    with open(os.path.abspath(dir + '/defoldsync/temp/syncdata.lua'), 'w') as f:
-
-        f.write("return {\n")
-
-        animobjs = []
-        handled = {}
-
-        data_objects = [o for o in bpy.data.objects if o in bpy.context.visible_objects]
-        #data_objects = [obj for obj in bpy.data.objects if obj.hide_viewport == False]
-        print("Sizes: " + str(len(bpy.data.objects)) + "   " + str(len(data_objects)))
-
-        for obj in data_objects:
-            # Parent object can be anything. If it is set as the geom group node
-            #   then export everything under it, but also remove any from this children set
-            #   in the scene.objects set
-            if obj.defold_props.group_children == True:
-                children = getChildren(obj)
-                for ch in children:
-                    handled[ch.name] = True
-
-        for obj in data_objects:
-            if(handled.get(obj.name) is None):
-                handled[obj.name] = False
-
-
-        # Check to see what commands are enabled. And collect data if they changed
-        # TODO: Optimise this into mapped methods
-        for cmd in clientcmds:
-
-            # Basic info of the scene
-            if(cmd == 'info'):
-                f.write('INFO = ')
-                sceneInfo(context, f)
-                f.write(', \n')
-
-            # Object transforms and hierarchy
-            if(cmd == 'scene'):
-                f.write('OBJECTS = ')
-                sceneObjects(context, f, config, handled) 
+    try:
+        # Write data to temp data file for use by lua
+        with open(os.path.abspath(dir + '/defoldsync/temp/syncdata.lua'), 'w', encoding='utf-8') as f:
+
+            f.write("return {\n")
+
+            animobjs = []
+            handled = {}
+
+            # Visibility, collections and hierarchy are looked up once for all the stages
+            start = time.perf_counter()
+            scenes = batchScenes(config)
+            index = defoldScene.SceneIndex(context, scenes)
+            print("[ TIMING ] Scene index: %.3fs" % (time.perf_counter() - start))
+            yield
+
+            data_objects = index.visibleObjects(bpy.data.objects)
+            defoldProfile.count("objects", len(data_objects))
+            #data_objects = [obj for obj in bpy.data.objects if obj.hide_viewport == False]
+            print("Sizes: " + str(len(bpy.data.objects)) + "   " + str(len(data_objects)))
+
+            for obj in data_objects:
+                # Parent object can be anything. If it is set as the geom group node
+                #   then export everything under it, but also remove any from this children set
+                #   in the scene.objects set
+                if obj.defold_props.group_children == True:
+                    children = index.getDescendants(obj)
+                    for ch in children:
+                        handled[ch.name] = True
+
+            for obj in data_objects:
+                if(handled.get(obj.name) is None):
+                    handled[obj.name] = False
+
+            # Hash the objects before anything in the scene is converted
+            for obj in data_objects:
+                if(handled[obj.name] == False):
+                    children = []
+                    if obj.defold_props.group_children == True:
+                        children = index.getDescendants(obj)
+                    manifest.update(obj.name, defoldManifest.hashObject(obj, children))
+
+            # An instance uses the mesh of the first object with its key, so it 
+            #   changes with that object (or when it resolves to another one)
+            keys = {}
+            if('meshes' in clientcmds):
+                keys = instanceKeys(index.objects, config, handled)
+                sources = {}
+                for name, key in keys.items():
+                    if(key != None):
+                        source = sources.setdefault(key, name)
+                        if(source != name):
+                            manifest.addInstance(name, source)
+
+            # Mesh buffers left broken by an interrupted sync are exported again
+            if(manifest.valid == True):
+                for name in manifest.current:
+                    if(meshBufferValid(os.path.join(temppath, name + '.json')) == False):
+                        print("[ SYNC ] Invalid mesh buffer, exporting again: " + name)
+                        manifest.forget(name)
+
+            print("[ SYNC ] Changed objects: " + str(manifest.changedCount()) + " of " + str(len(manifest.current)))
+            yield
+
+            # Check to see what commands are enabled. And collect data if they changed
+            # TODO: Optimise this into mapped methods
+            for cmd in clientcmds:
+
+                yield
+
+                # Basic info of the scene
+                if(cmd == 'info'):
+                    f.write('INFO = ')
+                    sceneInfo(context, f, index)
+                    f.write(', \n')
+
+                # Object transforms and hierarchy
+                if(cmd == 'scene'):
+                    f.write('OBJECTS = ')
+                    with defoldProfile.timed("sceneObjects"):
+                        sceneObjects(context, f, config, handled, manifest, index)
+                    f.write(', \n')
+
+                # Mesh data 
+                if(cmd == 'meshes'):
+                    f.write('MESHES = ')
+                    with defoldProfile.timed("sceneMeshes"):
+                        animobjs = yield from sceneMeshes(context, f, temppath + bpy.path.native_pathsep('/'), texture_path, config, handled, manifest, index, keys)
+                    f.write(', \n')
+
+                # All bone animations in the scene
+                if(cmd == 'anims'):
+                    f.write('ANIMS = ')
+                    with defoldProfile.timed("sceneAnimations"):
+                        sceneAnimations(context, f, temppath + bpy.path.native_pathsep('/'), config, animobjs, index)
+                    f.write(', \n')
+
+            # Collections of each scene in a batch sync
+            if(len(scenes) > 0):
+                f.write('SCENES = ')
+                sceneBatch(f, index)
                 f.write(', \n')
 
-            # Mesh data 
-            if(cmd == 'meshes'):
-                f.write('MESHES = ')
-                animobjs = sceneMeshes(context, f, temppath + bpy.path.native_pathsep('/'), texture_path, config, handled)
-                f.write(', \n')
+            f.write("}\n")
 
-            # All bone animations in the scene
-            if(cmd == 'anims'):
-                f.write('ANIMS = ')
-                sceneAnimations(context, f, temppath + bpy.path.native_pathsep('/'), config, animobjs)
-                f.write(', \n')
+    finally:
+        defoldMaterials.endMaterials()
+        defoldTextures.endPool()
+        defoldTextures.endBudget()
+        defoldTextures.endCache()
+        timer.end()
 
-        f.write("}\n")
+    manifest.save()
 
 # ------------------------------------------------------------------------
@@ -0,0 +1,268 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Incremental sync manifest
+#    A content hash is kept for every exported object (transform, mesh data,
+#    materials and Defold properties). On the next sync only objects whose
+#    hash changed are exported again - the rest reuse the files in temp and
+#    the Defold files generated last time.
+#
+#    The manifest is written as pending by getData and only committed once
+#    the Lua generation has succeeded.
+
+import bpy, os, json, hashlib
+
+from defoldsync import defoldMesh
+
+# Bump this when the exported data changes, so old manifests are ignored
+MANIFEST_VERSION    = 3
+
+MANIFEST_FILE       = "manifest.json"
+MANIFEST_PENDING    = "manifest_pending.json"
+
+# Sync properties that dont change the exported data
+config_ignore       = [ "rna_type", "sync_progress", "sync_progress_label", "sync_errors", "sync_incremental", "sync_gltf_workers", "sync_texture_workers" ]
+
+# ------------------------------------------------------------------------
+# Add a bpy value (string, number, array or pointer) to a hash
+
+def hashValue( h, value ):
+
+    if(isinstance(value, str)):
+        h.update(value.encode('utf-8'))
+    elif(isinstance(value, bpy.types.ID)):
+        h.update(value.name.encode('utf-8'))
+    else:
+        try:
+            value = tuple(value)
+        except TypeError:
+            pass
+        h.update(repr(value).encode('utf-8'))
+    h.update(b'|')
+
+# ------------------------------------------------------------------------
+# Add all the rna properties of a property group (or list item) to a hash
+
+def hashProps( h, item, ignore = [] ):
+
+    for prop in item.bl_rna.properties:
+        if(prop.identifier in ignore or prop.identifier == "rna_type"):
+            continue
+        h.update(prop.identifier.encode('utf-8'))
+        hashValue(h, getattr(item, prop.identifier, None))
+
+# ------------------------------------------------------------------------
+
+def hashImage( h, img ):
+
+    hashValue(h, img.name)
+    hashValue(h, img.source)
+    if(img.packed_file != None):
+        hashValue(h, img.packed_file.size)
+    elif(img.source == 'GENERATED'):
+        hashValue(h, img.generated_color)
+        hashValue(h, img.size)
+    else:
+        filepath = bpy.path.abspath(img.filepath)
+        hashValue(h, filepath)
+        if(os.path.exists(filepath)):
+            stat = os.stat(filepath)
+            hashValue(h, stat.st_mtime)
+            hashValue(h, stat.st_size)
+
+# ------------------------------------------------------------------------
+# Material node inputs, links and images
+
+def hashMaterial( h, mat ):
+
+    if(mat == None):
+        hashValue(h, None)
+        return
+
+    hashValue(h, mat.name)
+    if(mat.use_nodes == False or mat.node_tree == None):
+        hashValue(h, mat.diffuse_color)
+        return
+
+    for node in mat.node_tree.nodes:
+        hashValue(h, node.bl_idname)
+        hashValue(h, node.name)
+        for inp in node.inputs:
+            if(hasattr(inp, "default_value")):
+                hashValue(h, inp.default_value)
+        if(node.type == 'TEX_IMAGE' and node.image != None):
+            hashImage(h, node.image)
+        elif(node.type == 'VALTORGB'):
+            for el in node.color_ramp.elements:
+                hashValue(h, el.position)
+                hashValue(h, el.color)
+        elif(node.type == 'MIX_RGB'):
+            hashValue(h, node.blend_type)
+
+    for link in mat.node_tree.links:
+        hashValue(h, link.from_node.name)
+        hashValue(h, link.from_socket.identifier)
+        hashValue(h, link.to_node.name)
+        hashValue(h, link.to_socket.identifier)
+
+# ------------------------------------------------------------------------
+# Mesh geometry is hashed from bulk reads
+
+def hashMeshData( h, me ):
+
+    defoldMesh.hashGeometry(h, me)
+
+# ------------------------------------------------------------------------
+# Hash everything about an object that ends up in the exported files.
+#   children - objects grouped into this one (group_children)
+
+def hashObject( obj, children = [] ):
+
+    h = hashlib.sha1()
+    hashValue(h, obj.name)
+    hashValue(h, obj.type)
+    hashValue(h, obj.rotation_mode)
+    for row in obj.matrix_world:
+        hashValue(h, row)
+
+    if(obj.parent != None):
+        hashValue(h, obj.parent.name)
+        hashValue(h, obj.parent_type)
+        # Children can pick up the parents Defold properties
+        for item in obj.parent.demo_list:
+            hashProps(h, item)
+        hashValue(h, obj.parent.apply_children)
+
+    for K in obj.keys():
+        hashValue(h, K)
+        if(isinstance(obj[K], str)):
+            hashValue(h, obj[K])
+
+    hashProps(h, obj.defold_props)
+    for item in obj.demo_list:
+        hashProps(h, item)
+
+    for mod in obj.modifiers:
+        hashValue(h, mod.type)
+        hashValue(h, getattr(mod, "object", None))
+
+    if(obj.animation_data != None and obj.animation_data.action != None):
+        action = obj.animation_data.action
+        hashValue(h, action.name)
+        for fcu in action.fcurves:
+            hashValue(h, fcu.data_path)
+            h.update(defoldMesh.readFloats(fcu.keyframe_points, "co", 2).tobytes())
+
+    if(obj.type == "MESH" and obj.data != None):
+        hashMeshData(h, obj.data)
+        for slot in obj.material_slots:
+            hashMaterial(h, slot.material)
+    elif(obj.type == "CAMERA"):
+        cam = obj.data
+        hashValue(h, (cam.angle_y, cam.clip_start, cam.clip_end, cam.lens, cam.ortho_scale))
+
+    for child in children:
+        hashValue(h, hashObject(child))
+
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+# Any change in the sync settings means everything has to be exported again
+
+def configHash( config ):
+
+    h = hashlib.sha1()
+    hashValue(h, MANIFEST_VERSION)
+    hashProps(h, config, config_ignore)
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+
+class SyncManifest(object):
+
+    def __init__(self, temppath, config):
+        self.temppath = temppath
+        self.config_hash = configHash(config)
+        self.previous = {}
+        self.current = {}
+        self.valid = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.temppath, MANIFEST_FILE), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if(data.get("version") == MANIFEST_VERSION and data.get("config") == self.config_hash):
+            self.previous = data.get("objects", {})
+            self.valid = True
+
+    # Forget the last sync - everything will be exported
+    def reset(self):
+        self.previous = {}
+        self.valid = False
+
+    def update(self, name, objhash):
+        self.current[name] = objhash
+
+    # An instance exports the mesh of source, so its hash takes in the source
+    def addInstance(self, name, source):
+        h = hashlib.sha1()
+        hashValue(h, self.current[name])
+        hashValue(h, source)
+        hashValue(h, self.current[source])
+        self.current[name] = h.hexdigest()
+
+    # Export the object again whatever its hash (its files are broken)
+    def forget(self, name):
+        self.previous.pop(name, None)
+
+    def isChanged(self, name):
+        if(self.valid == False or name not in self.current):
+            return True
+        return self.previous.get(name) != self.current[name]
+
+    def changedCount(self):
+        return len([name for name in self.current if self.isChanged(name)])
+
+    # Written as pending, see commitManifest
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "config": self.config_hash,
+            "objects": self.current,
+        }
+        with open(os.path.join(self.temppath, MANIFEST_PENDING), 'w') as f:
+            json.dump(data, f)
+
+# ------------------------------------------------------------------------
+# Once the Lua generation has succeeded the pending manifest becomes the
+# one used for the next sync.
+
+def commitManifest( temppath ):
+
+    pending = os.path.join(temppath, MANIFEST_PENDING)
+    if(os.path.exists(pending)):
+        os.replace(pending, os.path.join(temppath, MANIFEST_FILE))
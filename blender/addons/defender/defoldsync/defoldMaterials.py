@@ -21,6 +21,8 @@
 # ------------------------------------------------------------------------
 
 from defoldsync import defoldUtils
+from defoldsync import defoldTextures
+from defoldsync import defoldProfile
 
 # ------------------------------------------------------------------------
 
@@ -31,24 +33,41 @@ from bpy_extras.io_utils import axis_conversion
 from io import BytesIO
 
 # ------------------------------------------------------------------------
+# Material names are cleaned for Defold. The material itself is not renamed.
 
-def makeBlockPNG(texture_path, matname, name, col):
+def materialName( mat ):
+    return re.sub(r'[^\w]', ' ', mat.name)
+
+# ------------------------------------------------------------------------
 
-    gencolor = (defoldUtils.to_srgb(col[0]), defoldUtils.to_srgb(col[1]), defoldUtils.to_srgb(col[2]), col[3])
+# Make a 16x16 png of a color. Returns the file path.
+#   The color is in the name, so an existing file is kept.
+
+def makeBlockPNG(texture_path, matname, name, col):
 
     hexname = defoldUtils.toHex(col[0], col[1], col[2], col[3])
     texname = str(matname) + "_" + name + "_" + hexname
-    imgw  = 16 
-    imgh  = 16
     filename = texture_path + "/" + texname + ".png"
 
-    img = bpy.data.images.new(texname, width=imgw,height=imgh, alpha=True)
-    img.file_format = 'PNG'
-    img.generated_color = gencolor
+    if(defoldTextures.fileExists(filename) == False):
+        defoldTextures.submitJob(filename, defoldTextures.writeSolidPNGs, [ (filename, col) ])
+    return filename
 
-    img.filepath_raw = filename
-    img.save() 
-    return img
+# ------------------------------------------------------------------------
+# A constant color for a texture slot. With the palette enabled these are
+#   collected per material (see resolveBlockColors) instead of each being
+#   made into its own png.
+
+class BlockColor(object):
+    def __init__(self, matname, name, col):
+        self.matname = matname
+        self.name = name
+        self.col = col
+
+def blockImage(texture_path, matname, name, col):
+    if(palette != None):
+        return BlockColor(matname, name, col)
+    return makeBlockPNG(texture_path, matname, name, col)
 
 # ------------------------------------------------------------------------
 
@@ -69,7 +88,7 @@ def getImageNodeFromColor(color_node, mat, name, texture_path):
             
             position  = link_node.inputs["Fac"].default_value
             col       = link_node.color_ramp.evaluate(position)
-            return makeBlockPNG(texture_path, mat.name, name, [col[0], col[1], col[2], 1.0])       
+            return blockImage(texture_path, materialName(mat), name, [col[0], col[1], col[2], 1.0])       
 
         elif link_node and link_node.type == 'BSDF_DIFFUSE':
             return getImageNode( link_node.inputs, "Color", mat, name, texture_path)
@@ -106,7 +125,7 @@ def getImageNodeFromColor(color_node, mat, name, texture_path):
         # If alpha is default, then base color will use default settings in alpha channel
         if(name == "alpha_map" and col == 1.0):
             return None
-        return makeBlockPNG(texture_path, mat.name, name, [col, col, col, col])
+        return blockImage(texture_path, materialName(mat), name, [col, col, col, col])
 
     # if the node is a color vector. Make a tiny color png in temp
     # print( str(color_node.type) + "  " + str(color_node.name) + "   " + str(color_node.default_value))
@@ -121,7 +140,7 @@ def getImageNodeFromColor(color_node, mat, name, texture_path):
             link_node = link.from_node
             col = link_node.outputs[0].default_value
 
-        return makeBlockPNG(texture_path, mat.name, name, [col[0], col[1], col[2], alpha])
+        return blockImage(texture_path, materialName(mat), name, [col[0], col[1], col[2], alpha])
 
     return None 
 
@@ -136,7 +155,12 @@ def getImageNode( colors, index, mat, name, texture_path ):
 
 def addTextureImageNode( mat, textures, name, imgnode, texture_path, context ):
 
-    if imgnode != None:
+    if isinstance(imgnode, BlockColor):
+        textures[ name ] = imgnode
+    elif isinstance(imgnode, str):
+        # Generated block png
+        textures[ name ] = imgnode.replace('\\','\\\\')
+    elif imgnode != None:
         img = imgnode.filepath_from_user()
         basename = os.path.basename(img)
         splitname = os.path.splitext(basename)
@@ -146,25 +170,45 @@ def addTextureImageNode( mat, textures, name, imgnode, texture_path, context ):
 
         if splitname[1] != '.png' and splitname[1] != '.PNG':
             pngimg = os.path.join(texture_path , splitname[0] + ".png")
-            if(os.path.exists(pngimg) == False):
-                
-                imgnode.file_format='PNG' 
+
+            def convert():
                 image = bpy.data.images.load(img)
 
+                # Render settings are put back, so the scene isnt changed
                 image_settings = bpy.context.scene.render.image_settings
+                file_format = image_settings.file_format
                 image_settings.file_format = "PNG"
                 image.file_format='PNG'
                 image.save_render(pngimg)
+                image_settings.file_format = file_format
+                bpy.data.images.remove(image)
+
+            if(defoldTextures.cache != None and os.path.exists(img)):
+                defoldTextures.cache.convertFile(img, pngimg, convert)
+            elif(os.path.exists(pngimg) == False):
+                convert()
             img = pngimg
 
         # This is done for internal blender images (embedded)
+        #   Saved from a copy so the scene image keeps its own path
         if os.path.exists(img) == False:
             img = os.path.join(texture_path , basename)
-            image_settings = bpy.context.scene.render.image_settings
-            image_settings.file_format = "PNG"
-            imgnode.filepath = img
-            imgnode.save()
+
+            def save():
+                image = imgnode.copy()
+                image.filepath_raw = img
+                image.save()
+                bpy.data.images.remove(image)
+
+            if(defoldTextures.cache != None):
+                defoldTextures.cache.saveImage(imgnode, img, save)
+            else:
+                save()
         
+        # Textures over the size budget are exported resized
+        if(defoldTextures.budget != None):
+            img = defoldTextures.budget.apply(img)
+
         # If this is an image texture, with an active image append its name to the list
         textures[ name ] = img.replace('\\','\\\\')
 
@@ -207,7 +251,7 @@ def ConvertPrincipledBSDF( thisobj, mat, texture_path, context, config ):
     bsdf = mat.node_tree.nodes["Principled BSDF"] 
 
     # material names are cleaned here
-    mat.name = re.sub(r'[^\w]', ' ', mat.name)
+    matname = materialName(mat)
     if(bsdf is not None):
 
         print("[ Principled BSDF ] : Principled bsdf material type used.")
@@ -221,12 +265,12 @@ def ConvertPrincipledBSDF( thisobj, mat, texture_path, context, config ):
 
         lightmap_enable = HasLightmap( bsdf.inputs )
         if lightmap_enable:
-            mat.name = mat.name + "_LightMap"
+            matname = matname + "_LightMap"
     else:
         print("[ ERROR ] : Material type is not Principled BSDF.")
         defoldUtils.ErrorLine( config, " Material type is not Principled BSDF: ",  str(mat.name), "ERROR")
 
-    thisobj["matname"] = mat.name
+    thisobj["matname"] = matname
 
     if(len(textures) > 0):
         thisobj["textures"] = textures
@@ -244,7 +288,7 @@ def ConvertDiffuseBSDF( thisobj, mat, texture_path, context, config ):
     diffusebsdf = mat.node_tree.nodes["Diffuse BSDF"] 
 
     # material names are cleaned here
-    mat.name = re.sub(r'[^\w]', ' ', mat.name)
+    matname = materialName(mat)
     if(diffusebsdf is not None):
 
         print("[ Diffuse BSDF ] : Diffuse bsdf material type used.")
@@ -254,12 +298,12 @@ def ConvertDiffuseBSDF( thisobj, mat, texture_path, context, config ):
 
         lightmap_enable = HasLightmap( diffusebsdf.inputs )
         if lightmap_enable:
-            mat.name = mat.name + "_LightMap"
+            matname = matname + "_LightMap"
     else:
         print("[ ERROR ] : Material type is not Diffuse BSDF.")
         defoldUtils.ErrorLine( config, " Material type is not Diffuse BSDF: ",  str(mat.name), "ERROR")
 
-    thisobj["matname"] = mat.name
+    thisobj["matname"] = matname
 
     if(len(textures) > 0):
         thisobj["textures"] = textures
@@ -277,7 +321,7 @@ def ConvertEmissionShader( thisobj, mat, texture_path, context, config ):
     emission = mat.node_tree.nodes["Emission"] 
 
     # material names are cleaned here
-    mat.name = re.sub(r'[^\w]', ' ', mat.name)
+    matname = materialName(mat)
     if(emission is not None):
 
         print("[ Emission ] : Emission material type used.")
@@ -291,12 +335,12 @@ def ConvertEmissionShader( thisobj, mat, texture_path, context, config ):
 
         lightmap_enable = HasLightmap( emission.inputs )
         if lightmap_enable:
-            mat.name = mat.name + "_LightMap"
+            matname = matname + "_LightMap"
     else:
         print("[ ERROR ] : Material is not Emission type.")
         defoldUtils.ErrorLine( config, " Material is not Emission type: ",  str(mat.name), "ERROR")
 
-    thisobj["matname"] = mat.name
+    thisobj["matname"] = matname
 
     if(len(textures) > 0):
         thisobj["textures"] = textures
@@ -314,7 +358,7 @@ def ConvertMixShader( thisobj, mat, texture_path, context, config ):
     mixshader = mat.node_tree.nodes["Mix Shader"] 
 
     # material names are cleaned here
-    mat.name = re.sub(r'[^\w]', ' ', mat.name)
+    matname = materialName(mat)
     if(mixshader is not None):
 
         print("[ Mix Shader ] : Mix Shader material type used.")
@@ -352,7 +396,7 @@ def ConvertMixShader( thisobj, mat, texture_path, context, config ):
         print("[ ERROR ] : Material is not Mix Shader type.")
         defoldUtils.ErrorLine( config, " Material is not Mix Shader type: ",  str(mat.name), "ERROR")
 
-    thisobj["matname"] = mat.name
+    thisobj["matname"] = matname
 
     if(len(textures) > 0):
         thisobj["textures"] = textures
@@ -369,7 +413,7 @@ node_convert_list = {
     "Mix Shader": ConvertMixShader, 
 }
 
-def ProcessMaterial( thisobj, mat, texture_path, context, config ):
+def ConvertMaterial( thisobj, mat, texture_path, context, config ):
 
     if mat is not None and mat.use_nodes:
         # print("[MATNAME] "+mat.name)
@@ -393,3 +437,160 @@ def ProcessMaterial( thisobj, mat, texture_path, context, config ):
         defoldUtils.ErrorLine( config, " Material type missing or not supported.",  str(mat.name), "ERROR")
 
     return thisobj
+
+# ------------------------------------------------------------------------
+# Materials are converted once per sync. Objects sharing a material get a
+#   copy of the first conversion (matname, textures and shader params).
+
+material_results = {}
+material_stats = { "converted": 0, "reused": 0 }
+
+# Solid color palette for the current sync (None when not enabled)
+palette = None
+palette_config = None
+
+#   full - everything is exported, so the palette starts empty
+def beginMaterials( config, texture_path, full = False ):
+    global palette, palette_config
+    material_results.clear()
+    material_stats["converted"] = 0
+    material_stats["reused"] = 0
+    palette = None
+    if(config.sync_mat_palette == True and config.stream_mesh_type == "MESH"):
+        palette = defoldTextures.Palette(texture_path, full)
+        palette_config = config
+
+def endMaterials():
+    global palette
+    print("[ MATERIALS ] Converted: " + str(material_stats["converted"]) + "  reused: " + str(material_stats["reused"]))
+    material_results.clear()
+    if(palette != None):
+        palette.save()
+        print("[ MATERIALS ] Palette entries: " + str(len(palette.entries)))
+        if(palette.overflow > 0):
+            defoldUtils.ErrorLine( palette_config, " Palette is full, " + str(palette.overflow) + " materials use block textures. A full sync (Incremental Sync off) drops unused colors.", "Palette", "WARNING")
+        palette = None
+
+# ------------------------------------------------------------------------
+# Materials with only constant values use the palette (and the mesh uvs are
+#   set to its texel). Otherwise the constants are made into block pngs.
+
+def resolveBlockColors( result, mat, texture_path, context ):
+
+    textures = result.get("textures", {})
+    blocks = { k: v for k, v in textures.items() if isinstance(v, BlockColor) }
+    if(len(blocks) == 0):
+        return
+
+    index = None
+    if(len(blocks) == len(textures)):
+        index = palette.add({ k: v.col for k, v in blocks.items() }, result.get("mix_shader_factor"))
+
+    if(index != None):
+        for k in blocks:
+            textures[k] = palette.texturePath(k).replace('\\','\\\\')
+        textures["albedo_map"] = palette.texturePath("albedo").replace('\\','\\\\')
+        textures["amr_map"] = palette.texturePath("amr").replace('\\','\\\\')
+        result["palette_uv"] = palette.uv(index)
+    else:
+        for k, v in blocks.items():
+            img = makeBlockPNG(texture_path, v.matname, v.name, v.col)
+            addTextureImageNode(mat, textures, k, img, texture_path, context)
+
+# ------------------------------------------------------------------------
+# Albedo (with alpha or mix shader) and AO/Metallic/Roughness textures for
+#   the PBR Simple shader. The generator used to make these for every mesh,
+#   now they are made once per material (and kept by the texture cache) and
+#   the generator only copies them. Slot names match maketexturefile.
+
+PACK_SIZE = 1024
+
+def texturePath( textures, slot ):
+    path = textures.get(slot)
+    if(path == None):
+        return None
+    return path.replace('\\\\','\\')
+
+def slotPixels( path, default ):
+    if(path == None or os.path.exists(path) == False):
+        return defoldTextures.solidPixels(default)
+    return defoldTextures.loadPixels(path)
+
+# The sources are loaded here, the packing and saving is a texture job
+#   pack - called with the pixels of each source
+def packTexture( output, kind, sources, defaults, pack ):
+
+    for path in sources:
+        if(path != None):
+            defoldTextures.waitFor(path)
+
+    def save():
+        pixels = [ slotPixels(path, default) for path, default in zip(sources, defaults) ]
+        defoldTextures.submitJob(output, lambda: defoldTextures.writePNG(output, pack(*pixels)))
+
+    if(defoldTextures.cache != None):
+        defoldTextures.cache.lookup("pack:" + os.path.normcase(output), defoldTextures.sourcesHash(kind, sources), output, save)
+    else:
+        save()
+    return output.replace('\\','\\\\')
+
+def packMaterialTextures( result, texture_path, config ):
+
+    if(config.sync_shader != "PBR Simple" or "palette_uv" in result):
+        return
+
+    textures = result.get("textures", {})
+    name = os.path.join(texture_path, result["matname"])
+    size = PACK_SIZE
+    if(defoldTextures.budget != None and defoldTextures.budget.maxsize > 0):
+        size = min(size, defoldTextures.budget.maxsize)
+    base = texturePath(textures, "base_color")
+
+    if("mix_color" in textures):
+        mix = texturePath(textures, "mix_color")
+        factor = float(result.get("mix_shader_factor", 0.0))
+        textures["albedo_map"] = packTexture(name + "AMixtexture.png", "mix" + str(factor) + "_" + str(size), 
+            [ base, mix ], [ defoldTextures.PACK_WHITE, defoldTextures.PACK_BLACK ], 
+            lambda b, m: defoldTextures.mixAlbedo(b, m, factor, size, size))
+
+    elif("alpha_map" in textures):
+        alpha = texturePath(textures, "alpha_map")
+        if(base != None and base == alpha):
+            textures["albedo_map"] = textures["base_color"]
+        else:
+            textures["albedo_map"] = packTexture(name + "AlbedoAlpha.png", "alpha", 
+                [ base, alpha ], [ defoldTextures.PACK_WHITE, defoldTextures.PACK_WHITE ], 
+                defoldTextures.packAlbedoAlpha)
+
+    ao = texturePath(textures, "emissive_strength")
+    metallic = texturePath(textures, "metallic_map")
+    roughness = texturePath(textures, "roughness_map")
+    textures["amr_map"] = packTexture(name + "AMRtexture.png", "amr_" + str(size), 
+        [ ao, metallic, roughness ], [ defoldTextures.PACK_WHITE, defoldTextures.PACK_BLACK, defoldTextures.PACK_GREY ], 
+        lambda a, m, r: defoldTextures.packAMR(a, m, r, size, size))
+    result["textures"] = textures
+
+# ------------------------------------------------------------------------
+
+def ProcessMaterial( thisobj, mat, texture_path, context, config ):
+
+    key = 0
+    if(mat is not None):
+        key = mat.as_pointer()
+
+    result = material_results.get(key)
+    if(result is None):
+        with defoldProfile.timed("ProcessMaterial", thisobj.get("name")):
+            result = ConvertMaterial( {}, mat, texture_path, context, config )
+            resolveBlockColors( result, mat, texture_path, context )
+            packMaterialTextures( result, texture_path, config )
+        material_results[key] = result
+        material_stats["converted"] += 1
+    else:
+        material_stats["reused"] += 1
+
+    for k, v in result.items():
+        if(isinstance(v, dict)):
+            v = dict(v)
+        thisobj[k] = v
+    return thisobj
@@ -0,0 +1,266 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Bulk mesh extraction helpers
+#    Mesh data is pulled out of Blender with foreach_get into numpy arrays
+#    so that the per vertex / per corner work is done in one pass instead
+#    of going through the bpy attribute access for every element.
+
+import os, struct, hashlib
+import numpy as np
+
+# ------------------------------------------------------------------------
+# Split a 4x4 matrix (mathutils or nested lists) into a 3x3 and a translation
+
+def matrixParts( mat ):
+    m = np.array([ list(row) for row in mat ], dtype=np.float64)
+    return m[:3, :3], m[:3, 3]
+
+# ------------------------------------------------------------------------
+# Apply a 4x4 matrix to an (N,3) array of points.
+#   The translation is always added (the same as mathutils does for a
+#   3 component vector) so zero results never come out as -0.0
+
+def transformPoints( mat, points ):
+    rot, trans = matrixParts(mat)
+    return points.astype(np.float64) @ rot.T + trans
+
+# ------------------------------------------------------------------------
+# Normalize the rows of an (N,3) array (zero rows are left as zero)
+
+def normalizeRows( vectors ):
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(lengths > 0.0, lengths, 1.0)
+
+# ------------------------------------------------------------------------
+# Bake a scale into points and normals, the same as Mesh.transform with a
+#   scale matrix (normals use the inverse scale, and flip if it is negative)
+
+def scaleGeometry( points, normals, face_normals, scale ):
+    scale = np.asarray(scale, dtype=np.float64)
+    inverse = np.sign(np.prod(scale)) / scale
+    return points * scale, normalizeRows(normals * inverse), normalizeRows(face_normals * inverse)
+
+# ------------------------------------------------------------------------
+# Read a float attribute from a bpy collection into an (N, width) array
+
+def readFloats( collection, attr, width ):
+    data = np.empty(len(collection) * width, dtype=np.float32)
+    collection.foreach_get(attr, data)
+    return data.reshape(-1, width)
+
+# ------------------------------------------------------------------------
+# Read an int attribute from a bpy collection into an (N, width) array
+
+def readInts( collection, attr, width ):
+    data = np.empty(len(collection) * width, dtype=np.int32)
+    collection.foreach_get(attr, data)
+    return data.reshape(-1, width)
+
+# ------------------------------------------------------------------------
+# Add the mesh geometry to a hash - positions, normals, faces, material
+#   indices and uv layers, all from bulk reads.
+
+def hashGeometry( h, me ):
+
+    h.update(struct.pack('<4i', len(me.vertices), len(me.loops), len(me.polygons), len(me.uv_layers)))
+    h.update(readFloats(me.vertices, "co", 3).tobytes())
+    h.update(readFloats(me.vertices, "normal", 3).tobytes())
+    h.update(readInts(me.loops, "vertex_index", 1).tobytes())
+    h.update(readInts(me.polygons, "loop_total", 1).tobytes())
+    h.update(readInts(me.polygons, "material_index", 1).tobytes())
+
+    smooth = np.empty(len(me.polygons), dtype=bool)
+    me.polygons.foreach_get("use_smooth", smooth)
+    h.update(smooth.tobytes())
+
+    h.update(struct.pack('<i', me.uv_layers.active_index))
+    for uv in me.uv_layers:
+        h.update(uv.name.encode('utf-8'))
+        h.update(struct.pack('<?', uv.active_render))
+        h.update(readFloats(uv.data, "uv", 2).tobytes())
+
+    if(me.shape_keys != None):
+        for key in me.shape_keys.key_blocks:
+            h.update(key.name.encode('utf-8'))
+            h.update(readFloats(key.data, "co", 3).tobytes())
+
+# Content hash of a mesh, the same for copies of the same geometry
+def geometryHash( me ):
+    h = hashlib.sha1()
+    hashGeometry(h, me)
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+# Get the second uv layer (the first one that is not the active render layer)
+
+def getSecondUVLayer( me ):
+    uvs = [uv for uv in me.uv_layers if uv.active_render != True]
+    return uvs[0]
+
+# ------------------------------------------------------------------------
+# Pull all the data needed for a mesh buffer export into numpy arrays.
+#   me must already have had calc_loop_triangles called on it.
+#   convert_mat is the axis conversion applied to positions, convert_irot
+#   the one applied to vertex and face normals.
+#   scale (optional) is an object scale to bake into the geometry first.
+
+def getMeshArrays( me, convert_mat, convert_irot, want_uv2, scale = None ):
+
+    tri_verts   = readInts(me.loop_triangles, "vertices", 3)
+    tri_loops   = readInts(me.loop_triangles, "loops", 3)
+
+    points          = readFloats(me.vertices, "co", 3)
+    normals         = readFloats(me.vertices, "normal", 3)
+    face_normals    = readFloats(me.loop_triangles, "normal", 3)
+    if(scale is not None):
+        points, normals, face_normals = scaleGeometry(points, normals, face_normals, scale)
+
+    arrays = {
+        "positions":    transformPoints(convert_mat, points),
+        "normals":      transformPoints(convert_irot, normals),
+        "face_normals": transformPoints(convert_irot, face_normals),
+        "tri_verts":    tri_verts,
+        "uv":           None,
+        "uv2":          None,
+    }
+
+    corner_loops = tri_loops.reshape(-1)
+
+    if(me.uv_layers.active != None and len(me.loops) > 0):
+        uvs = readFloats(me.uv_layers.active.data, "uv", 2)
+        arrays["uv"] = uvs[corner_loops]
+
+    if(want_uv2 == True):
+        uvs = readFloats(getSecondUVLayer(me).data, "uv", 2)
+        arrays["uv2"] = uvs[corner_loops]
+
+    return arrays
+
+# ------------------------------------------------------------------------
+# Expand the mesh arrays into per triangle corner streams.
+#   Returns positions, normals, uv and uv2 (or None) each with one row
+#   per corner, ready to be written as a non indexed triangle list.
+
+def cornerStreams( arrays, facenormals ):
+
+    corners = arrays["tri_verts"].reshape(-1)
+    count = corners.size
+
+    positions = arrays["positions"][corners]
+    if(facenormals == True):
+        normals = np.repeat(arrays["face_normals"], 3, axis=0)
+    else:
+        normals = arrays["normals"][corners]
+
+    uv = arrays["uv"]
+    if(uv is None):
+        uv = np.zeros((count, 2), dtype=np.float32)
+
+    return positions, normals, uv, arrays["uv2"]
+
+# ------------------------------------------------------------------------
+# Weld corners that have the same position, normal, uv and uv2.
+#   Returns the unique vertex streams (in first use order) and the uint32
+#   indices into them, one per corner.
+
+def weldVertices( positions, normals, uv, uv2 ):
+
+    streams = [ positions, normals, uv ]
+    if(uv2 is not None):
+        streams.append(uv2)
+    widths = [ s.shape[1] for s in streams ]
+    corners = np.ascontiguousarray(np.hstack([ s.astype(np.float32) for s in streams ]))
+
+    # Compare whole rows as bytes
+    rows = corners.view(np.dtype((np.void, corners.dtype.itemsize * corners.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    order = np.argsort(first)
+    remap = np.empty(len(order), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+    indices = remap[inverse.reshape(-1)]
+    vertices = corners[first[order]]
+
+    result = []
+    start = 0
+    for width in widths:
+        result.append(vertices[:, start:start + width])
+        start = start + width
+    if(uv2 is None):
+        result.append(None)
+    return result[0], result[1], result[2], result[3], indices
+
+# ------------------------------------------------------------------------
+# Binary mesh buffer file
+#   Header: magic, version, flags, vertex count, index count (all uint32)
+#   Then float32 positions(3), normals(3), uv(2), uv2(2) if flagged and
+#   uint32 indices if the index count is not zero. Little endian.
+#   Read by readmeshbuffer in gen/makefiles.lua
+
+MESHBUFFER_MAGIC    = b"DMSH"
+MESHBUFFER_VERSION  = 1
+MESHBUFFER_UV2      = 1
+MESHBUFFER_HEADER   = 20
+
+def writeMeshBuffer( filepath, positions, normals, uv, uv2, indices = None ):
+
+    flags = 0
+    if(uv2 is not None):
+        flags |= MESHBUFFER_UV2
+
+    index_count = 0
+    if(indices is not None):
+        index_count = len(indices)
+
+    with open(filepath, 'wb') as f:
+        f.write(struct.pack("<4sIIII", MESHBUFFER_MAGIC, MESHBUFFER_VERSION, flags, len(positions), index_count))
+        f.write(np.ascontiguousarray(positions, dtype="<f4").tobytes())
+        f.write(np.ascontiguousarray(normals, dtype="<f4").tobytes())
+        f.write(np.ascontiguousarray(uv, dtype="<f4").tobytes())
+        if(uv2 is not None):
+            f.write(np.ascontiguousarray(uv2, dtype="<f4").tobytes())
+        if(indices is not None):
+            f.write(np.ascontiguousarray(indices, dtype="<u4").tobytes())
+        return f.tell()
+
+# The header is ours and the file holds all the data it lists (a sync can be
+#   interrupted while a buffer is written)
+def checkMeshBuffer( filepath ):
+
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(MESHBUFFER_HEADER)
+        size = os.path.getsize(filepath)
+    except OSError:
+        return False
+    if(len(header) < MESHBUFFER_HEADER):
+        return False
+
+    magic, version, flags, count, index_count = struct.unpack("<4sIIII", header)
+    if(magic != MESHBUFFER_MAGIC or version != MESHBUFFER_VERSION):
+        return False
+    floats = 8
+    if(flags & MESHBUFFER_UV2):
+        floats = 10
+    return size >= MESHBUFFER_HEADER + (count * floats + index_count) * 4
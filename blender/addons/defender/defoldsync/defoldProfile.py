@@ -0,0 +1,192 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Sync profiler
+#    Times the export stages and the work done for each object (mesh
+#    buffers, materials, GLTF files) along with triangle counts and bytes
+#    written. Started by getData, the luajit run is added by the operator
+#    which then saves it as json and csv next to the defender-<scene>.log.
+#
+#    Stages are wall time. The background sync pauses the profile between
+#    its time slices so the time Blender spends drawing isnt counted.
+
+import os, json, csv, time
+
+# Number of slowest objects kept for the panel
+PROFILE_TOP     = 5
+
+# Per object stages written as csv columns
+object_stages   = [ "exportMeshBuffer", "ProcessMaterial", "exportGLTF" ]
+
+# ------------------------------------------------------------------------
+
+class SyncProfile(object):
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.paused = None
+        self.stages = {}
+        self.objects = {}
+        self.counts = {}
+        self.running = []
+        self.top = []
+        self.total = 0.0
+
+    # Add to a stage, and to the object when there is one. Stages inside
+    #   another stage of the same object (ProcessMaterial in exportMeshBuffer)
+    #   arent added to the object time twice.
+    def add(self, stage, seconds, objname = None):
+        entry = self.stages.setdefault(stage, { "time": 0.0, "calls": 0 })
+        entry["time"] += seconds
+        entry["calls"] += 1
+        if(objname != None):
+            obj = self.getObject(objname)
+            obj["stages"][stage] = obj["stages"].get(stage, 0.0) + seconds
+            if(not any(timer.objname == objname for timer in self.running)):
+                obj["time"] += seconds
+
+    def getObject(self, objname):
+        return self.objects.setdefault(objname, { "time": 0.0, "tris": 0, "bytes": 0, "stages": {} })
+
+    def count(self, name, value = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    # Triangles and bytes written for an object (also added to the totals)
+    def addObjectData(self, objname, tris = 0, size = 0):
+        obj = self.getObject(objname)
+        obj["tris"] += tris
+        obj["bytes"] += size
+        self.count("triangles", tris)
+        self.count("bytes", size)
+
+    # Time between pause and resume is left out of the running stages
+    def pause(self):
+        self.paused = time.perf_counter()
+
+    def resume(self):
+        if(self.paused != None):
+            idle = time.perf_counter() - self.paused
+            for timer in self.running:
+                timer.start += idle
+            self.start += idle
+            self.paused = None
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+        self.top = sorted(self.objects.items(), key=lambda item: item[1]["time"], reverse=True)[:PROFILE_TOP]
+
+    def save(self, filepath):
+        data = {
+            "total": self.total,
+            "stages": self.stages,
+            "counts": self.counts,
+            "objects": self.objects,
+        }
+        with open(filepath + ".json", 'w') as f:
+            json.dump(data, f, indent=1)
+
+        with open(filepath + ".csv", 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([ "object", "time", "tris", "bytes" ] + object_stages)
+            for name, obj in sorted(self.objects.items(), key=lambda item: item[1]["time"], reverse=True):
+                row = [ name, "%.6f" % obj["time"], obj["tris"], obj["bytes"] ]
+                row += [ "%.6f" % obj["stages"].get(stage, 0.0) for stage in object_stages ]
+                writer.writerow(row)
+
+# ------------------------------------------------------------------------
+# Times a stage with a with block, or begin and end for stages that arent a
+#   single block. Does nothing when no profile is running (the export
+#   functions can be called on their own).
+
+class StageTimer(object):
+
+    def __init__(self, stage, objname = None):
+        self.stage = stage
+        self.objname = objname
+
+    def begin(self):
+        self.start = time.perf_counter()
+        if(profile != None):
+            profile.running.append(self)
+        return self
+
+    def end(self):
+        if(profile != None and self in profile.running):
+            profile.running.remove(self)
+            profile.add(self.stage, time.perf_counter() - self.start, self.objname)
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.end()
+        return False
+
+# ------------------------------------------------------------------------
+# The profile of the current (or last) sync
+
+profile = None
+
+def beginProfile():
+    global profile
+    profile = SyncProfile()
+
+def endProfile():
+    if(profile != None):
+        profile.finish()
+        print("[ PROFILE ] Total: %.3fs" % profile.total)
+        for stage, entry in sorted(profile.stages.items(), key=lambda item: item[1]["time"], reverse=True):
+            print("[ PROFILE ] " + stage + ": %.3fs  calls: %d" % (entry["time"], entry["calls"]))
+
+def timed(stage, objname = None):
+    return StageTimer(stage, objname)
+
+def count(name, value = 1):
+    if(profile != None):
+        profile.count(name, value)
+
+def addObjectData(objname, tris = 0, size = 0):
+    if(profile != None):
+        profile.addObjectData(objname, tris, size)
+
+def pause():
+    if(profile != None):
+        profile.pause()
+
+def resume():
+    if(profile != None):
+        profile.resume()
+
+# Profile files go next to the defender-<scene>.log
+def saveProfile(filepath):
+    if(profile != None):
+        try:
+            profile.save(filepath)
+        except OSError as e:
+            print("[ PROFILE ] Cant write " + filepath + ": " + str(e))
+
+def fileSize(filepath):
+    if(filepath != None and os.path.exists(filepath)):
+        return os.path.getsize(filepath)
+    return 0
@@ -0,0 +1,196 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Sync progress
+#    The sync is split into stages (objects, meshes, anims, textures, lua)
+#    with a weight each, and stages can be nested inside the steps of
+#    another one. Progress is sent to listeners as events:
+#      { "event": "stage" | "progress" | "message" | "done",
+#        "stage", "percent", "text", "done", "total", "elapsed" }
+#    The panel shows them in the progress bar, the command line prints them.
+#
+#    Events are throttled - progress and message events are only sent when
+#    PROGRESS_INTERVAL has passed and something changed by PROGRESS_STEP, so
+#    a scene of thousands of small objects doesnt redraw for every object.
+#    Stage and done events are always sent.
+
+import time
+
+PROGRESS_INTERVAL   = 0.1
+PROGRESS_STEP       = 1.0
+
+# Stage weights for the whole sync (percent of the progress bar)
+stage_weights = [
+    ("objects",     10),
+    ("meshes",      50),
+    ("anims",       10),
+    ("textures",    10),
+    ("lua",         20),
+]
+
+# ------------------------------------------------------------------------
+
+class ProgressStage(object):
+
+    def __init__(self, name, total, low, high, text, span):
+        self.name = name
+        self.total = max(1, total)
+        self.done = 0
+        self.low = low
+        self.high = high
+        self.text = text
+        self.span = span
+
+    def percent(self):
+        return self.low + (self.high - self.low) * min(self.done, self.total) / self.total
+
+# ------------------------------------------------------------------------
+
+class SyncProgress(object):
+
+    def __init__(self, stages):
+        self.start = time.perf_counter()
+        self.listeners = []
+        self.stack = []
+        self.last_time = 0.0
+        self.last_percent = -PROGRESS_STEP
+        self.last_text = None
+
+        # Stages that arent in this sync get no share of the bar
+        self.ranges = {}
+        total = float(sum(weight for name, weight in stage_weights if name in stages))
+        low = 0.0
+        for name, weight in stage_weights:
+            if(name in stages and total > 0.0):
+                high = low + 100.0 * weight / total
+                self.ranges[name] = (low, high)
+                low = high
+
+    def percent(self):
+        if(len(self.stack) > 0):
+            return self.stack[-1].percent()
+        return self.last_percent
+
+    # A stage of the sync, or one nested into the next span steps of the
+    #   current stage
+    def begin(self, name, total, text, span = 1):
+        if(len(self.stack) > 0 and name not in self.ranges):
+            parent = self.stack[-1]
+            low = parent.percent()
+            high = min(parent.high, low + (parent.high - parent.low) * span / parent.total)
+        else:
+            low, high = self.ranges.get(name, (self.percent(), self.percent()))
+        self.stack.append(ProgressStage(name, total, max(low, 0.0), high, text, span))
+        self.emit("stage", text, True)
+
+    def advance(self, count = 1, text = None):
+        if(len(self.stack) > 0):
+            stage = self.stack[-1]
+            stage.done += count
+            self.emit("progress", text or stage.text)
+
+    def message(self, text):
+        self.emit("message", text)
+
+    def end(self):
+        if(len(self.stack) > 0):
+            stage = self.stack.pop()
+            stage.done = stage.total
+            self.last_percent = stage.high
+            if(len(self.stack) > 0):
+                self.stack[-1].done += stage.span
+            self.emit("progress", stage.text, True, stage)
+
+    def finish(self, text):
+        while(len(self.stack) > 0):
+            self.end()
+        self.last_percent = 100.0
+        self.emit("done", text, True)
+
+    def emit(self, kind, text, force = False, stage = None):
+        now = time.perf_counter()
+        percent = self.percent()
+        if(stage == None and len(self.stack) > 0):
+            stage = self.stack[-1]
+        if(force == False):
+            if(now - self.last_time < PROGRESS_INTERVAL):
+                return
+            if(abs(percent - self.last_percent) < PROGRESS_STEP and text == self.last_text):
+                return
+
+        self.last_time = now
+        self.last_percent = percent
+        self.last_text = text
+
+        event = {
+            "event": kind,
+            "stage": stage.name if stage != None else None,
+            "percent": percent,
+            "text": text,
+            "done": stage.done if stage != None else 0,
+            "total": stage.total if stage != None else 0,
+            "elapsed": now - self.start,
+        }
+        for listener in self.listeners:
+            listener(event)
+
+# ------------------------------------------------------------------------
+# The progress of the current sync. Started by getData, the lua stage and
+#   the finish come from whatever runs the generator.
+
+progress = None
+
+# Listeners for every sync (the command line adds one before the sync starts)
+listeners = []
+
+def beginProgress( stages, sync_listeners = [] ):
+    global progress
+    progress = SyncProgress(stages)
+    progress.listeners.extend(listeners + sync_listeners)
+    return progress
+
+def addListener( listener ):
+    listeners.append(listener)
+    if(progress != None):
+        progress.listeners.append(listener)
+
+def begin( name, total, text, span = 1 ):
+    if(progress != None):
+        progress.begin(name, total, text, span)
+
+def advance( count = 1, text = None ):
+    if(progress != None):
+        progress.advance(count, text)
+
+def message( text ):
+    if(progress != None):
+        progress.message(text)
+
+def end():
+    if(progress != None):
+        progress.end()
+
+def endProgress( text ):
+    if(progress != None):
+        progress.finish(text)
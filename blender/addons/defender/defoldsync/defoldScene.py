@@ -0,0 +1,118 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Scene index
+#    Built once per sync and shared by all the export stages, so checks like
+#    "is this object visible" or "what are its children" are lookups instead
+#    of scans over bpy.context.visible_objects or bpy.data.objects.
+#
+#    A batch sync indexes other scenes with the context scene. Their objects
+#    and collections are added to the same lists, a collection linked into
+#    more than one scene is only listed once.
+
+import bpy
+
+# ------------------------------------------------------------------------
+
+class SceneIndex(object):
+
+    #   scenes - other scenes to add (batch sync), their first view layer is used
+    def __init__(self, context, scenes = []):
+
+        layers = [ (context.scene, context.view_layer, context.visible_objects) ]
+        for scene in scenes:
+            if(scene != context.scene and len(scene.view_layers) > 0):
+                view_layer = scene.view_layers[0]
+                visible_objects = [ obj for obj in view_layer.objects if obj.visible_get(view_layer=view_layer) ]
+                layers.append( (scene, view_layer, visible_objects) )
+
+        # Visible objects keyed by their data pointer
+        self.visible = set()
+
+        # Visible top level collections and their visible objects (in order),
+        # the visible scene objects, and the collection names of each scene
+        self.collections = []
+        self.objects = []
+        self.scenes = []
+        names = set()
+        seen = set()
+
+        for scene, view_layer, visible_objects in layers:
+            visible = set( obj.as_pointer() for obj in visible_objects )
+            self.visible.update(visible)
+
+            collections = []
+            for coll in view_layer.layer_collection.children:
+                if coll.is_visible:
+                    collections.append(coll.name)
+                    if(coll.name not in names):
+                        names.add(coll.name)
+                        self.collections.append( (coll, [ obj for obj in coll.collection.objects if obj.as_pointer() in visible ]) )
+            self.scenes.append( (scene.name, collections) )
+
+            for obj in scene.objects:
+                if(obj.as_pointer() in visible and obj.as_pointer() not in seen):
+                    seen.add(obj.as_pointer())
+                    self.objects.append(obj)
+
+        # Hierarchy for every object in the file - parent to children, and the
+        # collections each object is linked to
+        self.children = {}
+        self.membership = {}
+        for obj in bpy.data.objects:
+            if(obj.parent != None):
+                self.children.setdefault(obj.parent.name, []).append(obj)
+            self.membership[obj.name] = set( coll.name for coll in obj.users_collection )
+
+    # Keep the visible objects of a list (order is kept)
+    def visibleObjects(self, objects):
+        return [ obj for obj in objects if obj.as_pointer() in self.visible ]
+
+    # Names of the collections the object is linked to
+    def collectionsOf(self, obj):
+        return self.membership.get(obj.name, set())
+
+    # Direct children
+    def getChildren(self, obj):
+        return self.children.get(obj.name, [])
+
+    # Children, their children and so on (parents before their children)
+    def getDescendants(self, obj):
+        result = []
+        stack = [ obj ]
+        while(len(stack) > 0):
+            for child in self.getChildren(stack.pop()):
+                result.append(child)
+                stack.append(child)
+        return result
+
+    # The object and its parents, up to the top most parent in the collection.
+    #   collection - name of the collection, None to go all the way up
+    def getAncestors(self, obj, collection = None):
+        result = [ obj ]
+        while(obj.parent != None):
+            if(collection != None and collection not in self.collectionsOf(obj.parent)):
+                break
+            obj = obj.parent
+            result.append(obj)
+        return result
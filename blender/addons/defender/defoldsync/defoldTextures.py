@@ -0,0 +1,593 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Texture conversion cache
+#    Converted and embedded images written to the textures folder are
+#    recorded with the hash of what they were made from. The next sync only
+#    converts (or saves) an image again when its source changed. Sources are
+#    checked by path, mtime and size first and only hashed when those differ,
+#    and a source with the same content as an earlier one reuses its output.
+
+import bpy, os, json, time, shutil, struct, zlib, hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from defoldsync import defoldUtils
+from defoldsync import defoldProgress
+
+CACHE_VERSION   = 1
+CACHE_FILE      = "texturecache.json"
+
+# The cache for the current sync (see beginCache)
+cache = None
+
+# ------------------------------------------------------------------------
+
+def fileHash( filepath ):
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+# Embedded images are hashed from the packed data, or the pixels if there
+# isnt any (generated or painted images)
+
+def imageHash( img ):
+    h = hashlib.sha1()
+    h.update(repr(tuple(img.size)).encode('utf-8'))
+    if(img.packed_file != None):
+        h.update(img.packed_file.data)
+    else:
+        pixels = np.empty(len(img.pixels), dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        h.update(pixels.tobytes())
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+
+class TextureCache(object):
+
+    def __init__(self, texture_path):
+        self.filepath = os.path.join(texture_path, CACHE_FILE)
+        self.entries = {}
+        # Content hash to the output last made from it, and back (kept with entries)
+        self.outputs = {}
+        self.hashes = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filepath, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if(data.get("version") == CACHE_VERSION):
+            self.entries = data.get("entries", {})
+            for entry in self.entries.values():
+                self.addOutput(entry["hash"], entry["output"])
+
+    def save(self):
+        with open(self.filepath, 'w') as f:
+            json.dump({ "version": CACHE_VERSION, "entries": self.entries }, f)
+
+    # An output that is made again from other content no longer has the old hash
+    def addOutput(self, sourcehash, output):
+        old = self.hashes.get(output)
+        if(old != None and old != sourcehash and self.outputs.get(old) == output):
+            del self.outputs[old]
+        self.outputs[sourcehash] = output
+        self.hashes[output] = sourcehash
+
+    # An output made from the same content (by any source) that is still there
+    def findOutput(self, sourcehash):
+        output = self.outputs.get(sourcehash)
+        if(output != None and fileExists(output)):
+            return output
+        return None
+
+    # Reuse (or copy) a cached output for the hash, otherwise call make
+    def lookup(self, key, sourcehash, output, make):
+        entry = self.entries.get(key)
+        if(entry != None and entry["hash"] == sourcehash and entry["output"] == output and fileExists(output)):
+            self.hits += 1
+            return entry
+
+        other = self.findOutput(sourcehash)
+        if(other == output):
+            self.hits += 1
+        elif(other != None):
+            waitFor(other)
+            submitJob(output, shutil.copyfile, other, output)
+            self.hits += 1
+        else:
+            make()
+            self.misses += 1
+        entry = { "hash": sourcehash, "output": output }
+        self.entries[key] = entry
+        self.addOutput(sourcehash, output)
+        return entry
+
+    # Image file converted to another file (eg. jpg to png)
+    def convertFile(self, srcpath, output, convert):
+        key = "file:" + os.path.normcase(os.path.abspath(srcpath))
+        stat = os.stat(srcpath)
+        entry = self.entries.get(key)
+        if(entry != None and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size
+                and entry["output"] == output and fileExists(output)):
+            self.hits += 1
+            return
+
+        entry = self.lookup(key, fileHash(srcpath), output, convert)
+        entry["mtime"] = stat.st_mtime
+        entry["size"] = stat.st_size
+
+    # Embedded image saved to a file
+    def saveImage(self, image, output, save):
+        self.lookup("image:" + os.path.normcase(output), imageHash(image), output, save)
+
+# ------------------------------------------------------------------------
+# Started by getData, and saved (with the hit counts reported) at the end
+
+def beginCache( texture_path ):
+    global cache
+    cache = TextureCache(texture_path)
+    return cache
+
+def endCache():
+    global cache
+    if(cache == None):
+        return
+    cache.save()
+    print("[ TEXTURES ] Cache hits: " + str(cache.hits) + "  misses: " + str(cache.misses))
+    cache = None
+
+# ------------------------------------------------------------------------
+# Texture job pool
+#    Texture work that doesnt use bpy (packing, resizing, encoding and
+#    writing pngs, copies) runs on worker threads while the mesh export
+#    carries on. Images are still loaded and converted by Blender on the main
+#    thread. Jobs are keyed by the file they write, so anything reading that
+#    file can wait for it, and getData waits for all of them at the end.
+
+# The pool for the current sync (see beginPool)
+pool = None
+
+class TexturePool(object):
+
+    def __init__(self, workers, config):
+        self.config = config
+        self.executor = None
+        if(workers > 1):
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.timings = []
+        self.start = time.perf_counter()
+
+    def run(self, output, func, *args):
+        start = time.perf_counter()
+        func(*args)
+        return output, time.perf_counter() - start
+
+    def submit(self, output, func, *args):
+        self.wait(output)
+        if(self.executor == None):
+            self.timings.append(self.run(output, func, *args))
+        else:
+            self.futures[output] = self.executor.submit(self.run, output, func, *args)
+
+    def pending(self, path):
+        return path in self.futures
+
+    def wait(self, path):
+        future = self.futures.pop(path, None)
+        if(future == None):
+            return
+        try:
+            self.timings.append(future.result())
+        except Exception as e:
+            print("[ ERROR ] Texture job " + str(path) + ": " + str(e))
+            defoldUtils.ErrorLine(self.config, " Texture job failed: " + str(e), os.path.basename(path), "ERROR")
+
+    def join(self):
+        paths = list(self.futures)
+        defoldProgress.begin("textures", len(paths), "Writing textures...")
+        for path in paths:
+            self.wait(path)
+            defoldProgress.advance()
+        defoldProgress.end()
+        if(self.executor != None):
+            self.executor.shutdown()
+
+        work = sum( t for output, t in self.timings )
+        print("[ TIMING ] Texture jobs: " + str(len(self.timings)) + " in %.3fs (%.3fs of work)" % (time.perf_counter() - self.start, work))
+        for output, t in sorted(self.timings, key=lambda job: job[1], reverse=True)[:5]:
+            print("[ TIMING ]    " + os.path.basename(output) + ": %.3fs" % t)
+
+def submitJob( output, func, *args ):
+    if(pool != None):
+        pool.submit(output, func, *args)
+    else:
+        func(*args)
+
+def waitFor( path ):
+    if(pool != None):
+        pool.wait(path)
+
+# A file that exists, or will once its job is done
+def fileExists( path ):
+    return (pool != None and pool.pending(path)) or os.path.exists(path)
+
+def beginPool( config ):
+    global pool
+    pool = TexturePool(config.sync_texture_workers, config)
+    return pool
+
+def endPool():
+    global pool
+    if(pool == None):
+        return
+    pool.join()
+    pool = None
+
+# ------------------------------------------------------------------------
+# PNG writer for generated textures (8 bit RGBA)
+#    Only uses numpy and zlib, so there are no bpy image datablocks and it
+#    can be called from worker threads.
+#   pixels - (height, width, 4) uint8 array
+
+PNG_SIGNATURE   = b"\x89PNG\r\n\x1a\n"
+
+def pngChunk( tag, data ):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+def encodePNG( pixels, level = 6 ):
+    height, width = pixels.shape[0], pixels.shape[1]
+    # Every row starts with filter type 0 (none)
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 4)
+    return b"".join([
+        PNG_SIGNATURE,
+        pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+        pngChunk(b"IDAT", zlib.compress(rows.tobytes(), level)),
+        pngChunk(b"IEND", b""),
+    ])
+
+def writePNG( filepath, pixels ):
+    with open(filepath, 'wb') as f:
+        f.write(encodePNG(pixels))
+
+# ------------------------------------------------------------------------
+# Colors (0..1 linear rgb, alpha) to 8 bit sRGB. col can be a single color
+#   or an (N,4) array of them.
+
+def colorBytes( col ):
+    col = np.asarray(col, dtype=np.float64)
+    rgb = col[..., :3]
+    srgb = np.where(rgb < 0.0031308, np.maximum(rgb, 0.0) * 12.92, 1.055 * np.power(np.maximum(rgb, 0.0031308), 1.0 / 2.4) - 0.055)
+    out = np.concatenate([ srgb, col[..., 3:4] ], axis=-1)
+    return np.round(np.clip(out, 0.0, 1.0) * 255).astype(np.uint8)
+
+# ------------------------------------------------------------------------
+# Solid color textures, many at once.
+#   colors - list of [r,g,b,a]. Returns the encoded png for each color.
+
+def encodeSolidPNGs( colors, width = 16, height = 16 ):
+    texels = colorBytes(colors).reshape(-1, 4)
+    return [ encodePNG(np.broadcast_to(texel, (height, width, 4))) for texel in texels ]
+
+#   jobs - list of (filepath, [r,g,b,a])
+def writeSolidPNGs( jobs, width = 16, height = 16 ):
+    if(len(jobs) == 0):
+        return
+    encoded = encodeSolidPNGs([ col for filepath, col in jobs ], width, height)
+    for (filepath, col), data in zip(jobs, encoded):
+        with open(filepath, 'wb') as f:
+            f.write(data)
+
+# ------------------------------------------------------------------------
+# Channel packing for the PBR Simple shader
+#    The same results as material/textures.lua (nearest scaling, AO in red,
+#    roughness in green, metallic in blue) but done on whole arrays.
+#    Pixels are (height, width, 4) uint8, top row first.
+
+# Values of the white/black/grey.png defaults the generator uses
+PACK_WHITE      = 255
+PACK_BLACK      = 0
+PACK_GREY       = 128
+
+def loadPixels( filepath ):
+    img = bpy.data.images.load(filepath, check_existing=False)
+    width, height = img.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    bpy.data.images.remove(img)
+    # Blender images are stored bottom row first
+    pixels = pixels.reshape(height, width, 4)[::-1]
+    return np.round(np.clip(pixels, 0.0, 1.0) * 255).astype(np.uint8)
+
+def solidPixels( value, width = 16, height = 16 ):
+    pixels = np.full((height, width, 4), value, dtype=np.uint8)
+    pixels[..., 3] = 255
+    return pixels
+
+def resizeNearest( pixels, width, height ):
+    if(pixels.shape[0] == height and pixels.shape[1] == width):
+        return pixels
+    ys = np.floor(np.arange(height) / (height / pixels.shape[0])).astype(np.intp)
+    xs = np.floor(np.arange(width) / (width / pixels.shape[1])).astype(np.intp)
+    return pixels[ys][:, xs]
+
+def packAMR( ao, metallic, roughness, width, height ):
+    out = np.full((height, width, 4), 255, dtype=np.uint8)
+    out[..., 0] = resizeNearest(ao, width, height)[..., 0]
+    out[..., 2] = resizeNearest(metallic, width, height)[..., 2]
+    out[..., 1] = resizeNearest(roughness, width, height)[..., 1]
+    return out
+
+def packAlbedoAlpha( albedo, alpha ):
+    out = albedo.copy()
+    out[..., 3] = resizeNearest(alpha, albedo.shape[1], albedo.shape[0])[..., 0]
+    return out
+
+#   factor - amount of base, a number or an array that broadcasts over the pixels
+def mixAlbedo( base, mix, factor, width, height ):
+    factor = np.asarray(factor, dtype=np.float64)
+    base = resizeNearest(base, width, height)[..., :3].astype(np.float64)
+    mix = resizeNearest(mix, width, height)[..., :3].astype(np.float64)
+    out = np.full((height, width, 4), 255, dtype=np.uint8)
+    out[..., :3] = np.floor((base * (factor * 1000.0) + mix * ((1.0 - factor) * 1000.0)) * 0.001)
+    return out
+
+# ------------------------------------------------------------------------
+# Hash of packed texture sources (None for a default), by path, mtime and size
+
+def sourcesHash( kind, sources ):
+    h = hashlib.sha1()
+    h.update(kind.encode('utf-8'))
+    for path in sources:
+        h.update(b'|')
+        if(path != None and os.path.exists(path)):
+            stat = os.stat(path)
+            h.update(repr((os.path.normcase(path), stat.st_mtime, stat.st_size)).encode('utf-8'))
+    return h.hexdigest()
+
+# ------------------------------------------------------------------------
+# Texture size budget
+#    Image textures larger than the max size (or not a power of two, if
+#    asked for) are resized to a new png in the textures folder. The resized
+#    files go through the cache, keyed by the source and the target size.
+
+# The budget for the current sync (see beginBudget)
+budget = None
+
+# Goes into the cache hash of resized files, change it when resizePixels changes
+RESIZE_FILTER = "box-linear"
+
+# Width and height from the png header (None if it isnt a png)
+def pngSize( filepath ):
+    with open(filepath, 'rb') as f:
+        header = f.read(24)
+    if(len(header) < 24 or header[:8] != PNG_SIGNATURE):
+        return None
+    return struct.unpack(">II", header[16:24])
+
+# Box filter by the whole factor, then linear filter the rest of the way
+def resizePixels( pixels, width, height ):
+
+    fy = max(1, pixels.shape[0] // height)
+    fx = max(1, pixels.shape[1] // width)
+    pixels = pixels.astype(np.float32)
+    if(fy > 1 or fx > 1):
+        h = pixels.shape[0] // fy
+        w = pixels.shape[1] // fx
+        pixels = pixels[:h * fy, :w * fx].reshape(h, fy, w, fx, 4).mean(axis=(1, 3))
+
+    if(pixels.shape[0] != height or pixels.shape[1] != width):
+        def samples( size, count ):
+            pos = np.clip((np.arange(count) + 0.5) * (size / count) - 0.5, 0.0, size - 1)
+            first = np.floor(pos).astype(np.intp)
+            return first, np.minimum(first + 1, size - 1), (pos - first).astype(np.float32)
+        y0, y1, wy = samples(pixels.shape[0], height)
+        x0, x1, wx = samples(pixels.shape[1], width)
+        wy = wy[:, None, None]
+        wx = wx[None, :, None]
+        rows = pixels[y0] * (1.0 - wy) + pixels[y1] * wy
+        pixels = rows[:, x0] * (1.0 - wx) + rows[:, x1] * wx
+
+    return np.round(np.clip(pixels, 0.0, 255.0)).astype(np.uint8)
+
+class TextureBudget(object):
+
+    def __init__(self, texture_path, maxsize, pow2):
+        self.texture_path = texture_path
+        self.maxsize = maxsize
+        self.pow2 = pow2
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.resized = []
+        # Files already applied and what they export as (shared textures are counted once)
+        self.applied = {}
+
+    def enabled(self):
+        return self.maxsize > 0 or self.pow2 == True
+
+    def targetSize(self, width, height):
+        scale = 1.0
+        if(self.maxsize > 0 and max(width, height) > self.maxsize):
+            scale = self.maxsize / max(width, height)
+        width = max(1, int(round(width * scale)))
+        height = max(1, int(round(height * scale)))
+        if(self.pow2 == True):
+            width = 1 << (width.bit_length() - 1)
+            height = 1 << (height.bit_length() - 1)
+        return width, height
+
+    # Returns the file to export for the texture (resized if needed)
+    def apply(self, filepath):
+        if(filepath in self.applied):
+            return self.applied[filepath]
+        output = self.resize(filepath)
+        self.applied[filepath] = output
+        return output
+
+    def resize(self, filepath):
+        waitFor(filepath)
+        if(os.path.exists(filepath) == False):
+            return filepath
+        self.bytes_in += os.path.getsize(filepath)
+
+        size = None
+        if(self.enabled()):
+            size = pngSize(filepath)
+        if(size == None or self.targetSize(*size) == tuple(size)):
+            self.bytes_out += os.path.getsize(filepath)
+            return filepath
+
+        width, height = self.targetSize(*size)
+        basename = os.path.splitext(os.path.basename(filepath))[0]
+        output = os.path.join(self.texture_path, basename + "_" + str(width) + "x" + str(height) + ".png")
+
+        def resize():
+            pixels = loadPixels(filepath)
+            submitJob(output, lambda: writePNG(output, resizePixels(pixels, width, height)))
+
+        if(cache != None):
+            kind = "resize:%dx%d:%s:pow2=%s" % (width, height, RESIZE_FILTER, self.pow2)
+            cache.lookup("resize:" + os.path.normcase(output), sourcesHash(kind, [ filepath ]), output, resize)
+        else:
+            resize()
+        self.resized.append(output)
+        return output
+
+def beginBudget( config, texture_path ):
+    global budget
+    maxsize = 0
+    if(config.sync_tex_max_size != "NONE"):
+        maxsize = int(config.sync_tex_max_size)
+    budget = TextureBudget(texture_path, maxsize, config.sync_tex_pow2)
+    return budget
+
+def endBudget():
+    global budget
+    if(budget == None):
+        return
+    # Resized files are only all there once the pool is done
+    for output in budget.resized:
+        if(os.path.exists(output)):
+            budget.bytes_out += os.path.getsize(output)
+    print("[ TEXTURES ] Texture bytes: " + str(budget.bytes_in) + " -> " + str(budget.bytes_out) + "  resized: " + str(len(budget.resized)))
+    budget = None
+
+# ------------------------------------------------------------------------
+# Solid color palette
+#    Materials that only use constant values (no image textures) share one
+#    palette texture per texture slot. Each different set of values gets a
+#    texel column and the mesh uvs are all set to its center. The entries are
+#    kept in palette.json so the texels dont move between incremental syncs
+#    (unchanged objects keep their uvs). A full sync starts a new palette, so
+#    colors that are no longer used are dropped.
+
+PALETTE_FILE    = "palette.json"
+PALETTE_SIZE    = 256
+PALETTE_HEIGHT  = 16
+
+class Palette(object):
+
+    #   reset - start empty instead of loading the last palette
+    def __init__(self, texture_path, reset = False):
+        self.texture_path = texture_path
+        self.filepath = os.path.join(texture_path, PALETTE_FILE)
+        self.entries = {}
+        # Materials that didnt fit (they use block textures instead)
+        self.overflow = 0
+        if(reset == False):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filepath, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if(data.get("version") == CACHE_VERSION):
+            self.entries = data.get("entries", {})
+
+    def texturePath(self, slot):
+        return os.path.join(self.texture_path, "palette_" + slot + ".png")
+
+    # Add a material's values - { slot: [r,g,b,a] } and its mix shader
+    #   factor. Returns the texel index, or None if the palette is full.
+    def add(self, values, factor = None):
+        key = "|".join( slot + ":" + defoldUtils.toHex(*values[slot]) for slot in sorted(values) ) + "|" + str(factor)
+        entry = self.entries.get(key)
+        if(entry == None):
+            if(len(self.entries) >= PALETTE_SIZE):
+                self.overflow += 1
+                return None
+            entry = { "index": len(self.entries), "colors": { slot: list(col) for slot, col in values.items() }, "factor": factor }
+            self.entries[key] = entry
+        return entry["index"]
+
+    def uv(self, index):
+        return [ (index + 0.5) / PALETTE_SIZE, 0.5 ]
+
+    # Texels of a slot for every entry, default where an entry doesnt have it
+    def slotPixels(self, slot, default):
+        pixels = solidPixels(default, PALETTE_SIZE, PALETTE_HEIGHT)
+        for entry in self.entries.values():
+            if(slot in entry["colors"]):
+                pixels[:, entry["index"]] = colorBytes(entry["colors"][slot])
+        return pixels
+
+    # One texture per slot used, all entries written every time. The packed
+    #   albedo and AMR textures are made from the palettes too.
+    def save(self):
+        slots = set()
+        for entry in self.entries.values():
+            slots.update(entry["colors"].keys())
+        for slot in slots:
+            writePNG(self.texturePath(slot), self.slotPixels(slot, PACK_BLACK))
+
+        # Mix shader entries mix per texel, the others use alpha_map
+        base = self.slotPixels("base_color", PACK_WHITE)
+        albedo = packAlbedoAlpha(base, self.slotPixels("alpha_map", PACK_WHITE))
+        factor = np.ones((1, PALETTE_SIZE, 1))
+        mixed = []
+        for entry in self.entries.values():
+            if("mix_color" in entry["colors"]):
+                factor[0, entry["index"], 0] = float(entry["factor"] or 0.0)
+                mixed.append(entry["index"])
+        if(len(mixed) > 0):
+            mix = mixAlbedo(base, self.slotPixels("mix_color", PACK_BLACK), factor, PALETTE_SIZE, PALETTE_HEIGHT)
+            albedo[:, mixed] = mix[:, mixed]
+        writePNG(self.texturePath("albedo"), albedo)
+
+        ao = self.slotPixels("emissive_strength", PACK_WHITE)
+        writePNG(self.texturePath("amr"), packAMR(ao, solidPixels(PACK_BLACK), solidPixels(PACK_GREY), PALETTE_SIZE, PALETTE_HEIGHT))
+
+        with open(self.filepath, 'w') as f:
+            json.dump({ "version": CACHE_VERSION, "entries": self.entries }, f)
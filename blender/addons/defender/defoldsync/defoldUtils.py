@@ -70,6 +70,109 @@ def dump_lua(data):
         return t
     logging.error(f"Unknown type {type(data)}")
 
+# ------------------------------------------------------------------------
+# Streaming Lua table writer
+#   Each field is encoded and written to the file handle on its own, so
+#   memory only ever holds one field (never the whole table). Strings are
+#   escaped for Lua and floats use repr (shortest round trip) so the output
+#   is always the same.
+
+lua_escapes = { i: '\\%03d' % i for i in range(32) }
+lua_escapes.update({ ord('\\'): '\\\\', ord('"'): '\\"', ord('\n'): '\\n', ord('\r'): '\\r', ord('\t'): '\\t', 127: '\\127' })
+
+def luaString(s):
+    return '"' + s.translate(lua_escapes) + '"'
+
+def luaNumber(v):
+    if isinstance(v, float):
+        if v != v:
+            return "(0/0)"
+        if v in (float("inf"), float("-inf")):
+            return v > 0 and "math.huge" or "(-math.huge)"
+        return repr(v)
+    return str(int(v))
+
+def luaKey(k):
+    if(isinstance(k, int) and not isinstance(k, bool)):
+        return '[' + str(k) + '] = '
+    return '[' + luaString(str(k)) + '] = '
+
+# Table keys repeat a lot (x, y, z, name ...) so their encoding is kept
+lua_keys = {}
+
+# Append the Lua tokens for a value to out
+def luaEncode(data, out):
+    t = type(data)
+    if t is str:
+        out.append('"' + data.translate(lua_escapes) + '"')
+    elif t is float:
+        out.append(data - data == 0.0 and repr(data) or luaNumber(data))
+    elif t is dict:
+        out.append("{")
+        sep = ""
+        for k, v in data.items():
+            out.append(sep)
+            key = lua_keys.get(k)
+            if(key == None):
+                key = luaKey(k)
+                if(len(lua_keys) < 4096):
+                    lua_keys[k] = key
+            out.append(key)
+            luaEncode(v, out)
+            sep = ", "
+        out.append("}")
+    elif t is bool:
+        out.append(data and "true" or "false")
+    elif t is int:
+        out.append(str(data))
+    elif data is None:
+        out.append("nil")
+    elif isinstance(data, str):
+        luaEncode(str(data), out)
+    elif isinstance(data, float):
+        luaEncode(float(data), out)
+    elif isinstance(data, int):
+        luaEncode(int(data), out)
+    elif isinstance(data, dict):
+        luaEncode(dict(data), out)
+    elif hasattr(data, "__len__"):
+        out.append("{")
+        sep = ""
+        for v in data:
+            out.append(sep)
+            luaEncode(v, out)
+            sep = ", "
+        out.append("}")
+    else:
+        print("[ ERROR ] Unknown type for Lua: " + str(t))
+        out.append("nil")
+
+class LuaWriter(object):
+
+    def __init__(self, f):
+        self.f = f
+
+    def value(self, data):
+        out = []
+        luaEncode(data, out)
+        self.f.write("".join(out))
+
+    # ["key"] = value, 
+    def field(self, k, data):
+        out = [ luaKey(k) ]
+        luaEncode(data, out)
+        out.append(', \n')
+        self.f.write("".join(out))
+
+    # ["key"] = { 
+    def begin(self, k = None):
+        if(k != None):
+            self.f.write(luaKey(k))
+        self.f.write('{ \n')
+
+    def end(self, last = False):
+        self.f.write(last and '} \n' or '}, \n')
+
 # ------------------------------------------------------------------------
 # Is an object animated
 
@@ -94,6 +197,7 @@ def isAnimated( obj ):
 
 def ClearErrors( mytool ):
     mytool.sync_errors_str.clear()
+    mytool.sync_errors_level.clear()
 
 # ------------------------------------------------------------------------
 # Add errors or warnings to the Errors Panel.
@@ -101,4 +205,5 @@ def ClearErrors( mytool ):
 def ErrorLine(mytool, message = "", title="", level=""):
 
     mytool.sync_errors_str.append( "[" + str(title) + "] " + str(message) )
+    mytool.sync_errors_level.append( str(level) )
     mytool.msgcount = len(mytool.sync_errors_str)
@@ -0,0 +1,152 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------
+# Parallel GLTF/GLB export
+#    The converted scene is saved to a temp blend file and the per object
+#    exports are split across a number of background blender processes.
+#    Each worker writes a manifest of the files it exported, these are
+#    merged when all the workers are done. Anything a worker didnt export is
+#    exported in this blender afterwards.
+#
+#    This file is also the worker script:
+#      blender -b --factory-startup jobs.blend --python defoldWorkers.py -- jobs_0.json
+
+import bpy, os, sys, json, time, queue, subprocess, threading
+
+WORKER_DONE     = "[ WORKER ] DONE "
+
+# ------------------------------------------------------------------------
+# Split the jobs so each worker gets about the same amount of geometry
+
+def splitJobs( jobs, count ):
+
+    shares = [ [] for i in range(count) ]
+    loads = [ 0 ] * count
+    for job in sorted(jobs, key=lambda j: j["cost"], reverse=True):
+        idx = loads.index(min(loads))
+        shares[idx].append(job)
+        loads[idx] += job["cost"]
+    return [ share for share in shares if len(share) > 0 ]
+
+# ------------------------------------------------------------------------
+# Read worker output on a thread so the progress can be updated here
+
+def readWorker( proc, index, lines ):
+    for line in proc.stdout:
+        lines.put( (index, line.rstrip()) )
+    lines.put( (index, None) )
+
+# ------------------------------------------------------------------------
+# Run the jobs in background blender processes.
+#   jobs - list of { name, filepath, format, children, cost }
+#   progress - called with (done, total) as files are exported
+#   This is a generator, it yields while it waits for the workers so the
+#   background sync keeps running (closing it stops the workers).
+#   Returns the jobs that still need exporting (workers failed)
+
+def runGLTFJobs( jobs, workers, temppath, progress ):
+
+    blendfile = os.path.join(temppath, "gltfjobs.blend")
+    bpy.ops.wm.save_as_mainfile(filepath=blendfile, copy=True)
+
+    script = os.path.abspath(__file__)
+    procs = []
+    lines = queue.Queue()
+    shares = splitJobs(jobs, workers)
+
+    for i, share in enumerate(shares):
+        jobfile = os.path.join(temppath, "gltfjobs_" + str(i) + ".json")
+        manifest = os.path.join(temppath, "gltfjobs_" + str(i) + "_done.json")
+        if(os.path.exists(manifest)):
+            os.remove(manifest)
+        with open(jobfile, 'w') as f:
+            json.dump({ "jobs": share, "manifest": manifest }, f)
+
+        cmd = [ bpy.app.binary_path, "-b", "--factory-startup", blendfile, "--python", script, "--", jobfile ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace")
+        threading.Thread(target=readWorker, args=(proc, i, lines), daemon=True).start()
+        procs.append( (proc, manifest) )
+
+    print("[ WORKERS ] Exporting " + str(len(jobs)) + " files with " + str(len(procs)) + " workers")
+
+    done = 0
+    running = len(procs)
+    try:
+        while(running > 0):
+            try:
+                index, line = lines.get_nowait()
+            except queue.Empty:
+                yield
+                time.sleep(0.001)
+                continue
+            if(line == None):
+                running = running - 1
+            elif(line.startswith(WORKER_DONE)):
+                done = done + 1
+                progress(done, len(jobs))
+            elif(line.startswith("Error") or line.startswith("Traceback")):
+                print("[ WORKER " + str(index) + " ] " + line)
+    finally:
+        # Workers still running here were cancelled
+        for proc, manifest in procs:
+            if(proc.poll() == None):
+                proc.terminate()
+            proc.wait()
+        os.remove(blendfile)
+
+    # Merge the worker manifests
+    exported = {}
+    for proc, manifest in procs:
+        if(os.path.exists(manifest)):
+            with open(manifest, 'r') as f:
+                exported.update(json.load(f))
+
+    return [ job for job in jobs if exported.get(job["name"]) != job["filepath"] or not os.path.exists(job["filepath"]) ]
+
+# ------------------------------------------------------------------------
+# Worker side - export the jobs in the file given after --
+
+def workerMain():
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from defoldsync import defoldCmds
+
+    jobfile = sys.argv[sys.argv.index("--") + 1]
+    with open(jobfile, 'r') as f:
+        data = json.load(f)
+
+    exported = {}
+    for job in data["jobs"]:
+        obj = bpy.data.objects.get(job["name"])
+        if(obj == None):
+            continue
+        defoldCmds.selectGLTFObjects(bpy.context, obj, job["children"])
+        defoldCmds.writeGLTF(job["filepath"], job["format"])
+        exported[job["name"]] = job["filepath"]
+        print(WORKER_DONE + job["name"], flush=True)
+
+    with open(data["manifest"], 'w') as f:
+        json.dump(exported, f)
+
+if __name__ == "__main__":
+    workerMain()
@@ -113,6 +113,7 @@ local gen_make      = require("defoldsync.gen.makefiles")
 
 local genmaterial             = gen_make.genmaterial
 local makecollection          = gen_make.makecollection
+local makescenecollection     = gen_make.makescenecollection
 local setupgendata            = gen_make.setgendata
 
 ------------------------------------------------------------------------------------------------------------
@@ -216,7 +217,7 @@ end
 
 ------------------------------------------------------------------------------------------------------------
 
-local function makescene( scenename, objects, meshes, anims )
+local function makescene( scenename, objects, meshes, anims, scenes )
 
     if(objects == nil) then return end 
 
@@ -252,6 +253,13 @@ local function makescene( scenename, objects, meshes, anims )
         makecollection( k, collobjs, sceneobjs )
     end
 
+    -- Batch sync: every scene gets a collection of its collections
+    if(scenes) then 
+        for k,v in pairs(scenes) do 
+            makescenecollection( k, v, collectionlist )
+        end 
+    end
+
     local rootobjs = processChildren(objectlist)
     if(table.count(sceneobjs) > 0) then makecollection( scenename, rootobjs ) end 
 end
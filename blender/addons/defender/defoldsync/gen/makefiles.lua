@@ -2,6 +2,7 @@
 --Local version of the gendata - this is set before making any collections
 local gendata   = nil
 
+local ffi                   = require("ffi")
 local pkl                   = require("defoldsync.utils.pickle")
 local json                  = require("defoldsync.utils.json")
 local materialSimple        = require("defoldsync.material.textures")
@@ -23,6 +24,9 @@ end
 
 local collision_counter     = 1
 
+-- Mesh files already made this sync, instances reuse them (see makegofile)
+local shared_meshes         = {}
+
 ------------------------------------------------------------------------------------------------------------
 -- This will be used to allow custom materials and shaders (coming soon...)
 local pbrsimple = require("defoldsync.material.pbrsimple")
@@ -62,6 +66,7 @@ local gopscript               = templates.gopscript
 local gcollectionroot         = templates.gcollectionroot
 local gcollectionrootscript   = templates.gcollectionrootscript
 local gocollectionheader      = templates.gocollectionheader
+local gcollectioninstance     = templates.gcollectioninstance
 local gocollectiondata        = templates.gocollectiondata
 local gocollectiongeneric     = templates.gocollectiongeneric
 local gcollectioncamera       = templates.gcollectioncamera
@@ -76,6 +81,7 @@ local localpathname           = gen_utils.localpathname
 local getextension            = gen_utils.getextension
 local makefile                = gen_utils.makefile
 local makefilebinary          = gen_utils.makefilebinary
+local fileexists              = gen_utils.fileexists
 local getdefoldprops          = gen_utils.getdefoldprops
 local getcomponents           = gen_utils.getcomponents 
 
@@ -94,6 +100,7 @@ local MODEL_VERSION           = gen_utils.MODEL_VERSION
 
 local function setgendata( newgendata )
     gendata = newgendata 
+    shared_meshes = {}
 
     local picklein = arg[1]..PATH_SEPARATOR.."defoldsync"..PATH_SEPARATOR.."utils"..PATH_SEPARATOR.."pickle.lua"
     local pickleout = gendata.base..gendata.subfolder..PATH_SEPARATOR.."utils"..PATH_SEPARATOR.."pickle.lua"
@@ -143,8 +150,21 @@ end
 
 ------------------------------------------------------------------------------------------------------------
 
+-- Packed textures made by the exporter (defoldMaterials.packMaterialTextures)
+--   are copied, otherwise they are generated here.
+
+local function haspackedtexture( mesh, name )
+    return (mesh.textures and mesh.textures[name]) ~= nil
+end
+
+------------------------------------------------------------------------------------------------------------
+
 local function processaomaetalroughness( filepath, mesh )
 
+    if(haspackedtexture(mesh, "amr_map")) then 
+        return processtexturefile(filepath, mesh, "amr_map", 'white.png')
+    end 
+
     local aofile = getBlenderTexture( filepath, mesh, "emissive_strength", 'white.png')
     local metalfile = getBlenderTexture( filepath, mesh, "metallic_map", 'black.png')
     local roughfile = getBlenderTexture( filepath, mesh, "roughness_map", 'grey.png')
@@ -158,6 +178,11 @@ end
 ------------------------------------------------------------------------------------------------------------
 
 local function processalbedomixshader( filepath, mesh )
+
+    if(haspackedtexture(mesh, "albedo_map")) then 
+        return processtexturefile(filepath, mesh, "albedo_map", 'white.png')
+    end 
+
     local source1file = getBlenderTexture( filepath, mesh, "base_color", 'white.png')
     local source2file = getBlenderTexture( filepath, mesh, "mix_color", 'black.png')
     local factor = tonumber(mesh.mix_shader_factor)
@@ -172,6 +197,10 @@ end
 
 local function processalbedoalpha( filepath, mesh )
 
+    if(haspackedtexture(mesh, "albedo_map")) then 
+        return processtexturefile(filepath, mesh, "albedo_map", 'white.png')
+    end 
+
     if(mesh.textures == nil or mesh.textures["alpha_map"] == nil) then 
         return processtexturefile(filepath, mesh, 'base_color', 'white.png')
     end 
@@ -192,13 +221,109 @@ end
 
 ------------------------------------------------------------------------------------------------------------
 
-local function makebufferfile(name, filepath, mesh )
+-- Binary mesh buffer written by the exporter (defoldMesh.writeMeshBuffer)
+--   Header is followed by float32 positions, normals, uv, uv2 (if flagged)
+--   and then uint32 indices (if index_count > 0)
+
+ffi.cdef[[
+typedef struct meshbuffer_header {
+    char        magic[4];
+    uint32_t    version;
+    uint32_t    flags;
+    uint32_t    vertex_count;
+    uint32_t    index_count;
+} meshbuffer_header;
+]]
+
+local MESHBUFFER_MAGIC      = "DMSH"
+local MESHBUFFER_VERSION    = 1
+local MESHBUFFER_UV2        = 1
+
+local function readmeshbuffer( filename )
+
+    local fh = io.open( filename, "rb" )
+    if(fh == nil) then return nil end
+    local fdata = fh:read("*all")
+    fh:close()
+
+    local headersize = ffi.sizeof("meshbuffer_header")
+    if(#fdata < headersize or fdata:sub(1, 4) ~= MESHBUFFER_MAGIC) then 
+        print("[ERROR] Invalid mesh buffer file: "..tostring(filename))
+        return nil 
+    end
 
-    local bufferdata = bufferfiledata
-    local bufferfilepath = filepath..gendata.folders.meshes..PATH_SEPARATOR..name..".buffer"
-    --print(bufferfilepath)
-    --pprint(name, gendata.meshes[name] )
-    if(mesh == nil or mesh.tris == nil) then return "" end
+    local ptr = ffi.cast("const uint8_t *", fdata)
+    local header = ffi.cast("const meshbuffer_header *", ptr)
+    local count = header.vertex_count
+
+    -- Check the file holds everything the header lists before reading it
+    local floats = 8
+    if(bit.band(header.flags, MESHBUFFER_UV2) ~= 0) then floats = 10 end
+    if(header.version ~= MESHBUFFER_VERSION or #fdata < headersize + (count * floats + header.index_count) * 4) then 
+        print("[ERROR] Mesh buffer file is stale or truncated: "..tostring(filename))
+        return nil 
+    end
+    local floats = ffi.cast("const float *", ptr + headersize)
+
+    local mbuf = {
+        fdata       = fdata,        -- keep the string alive while the pointers are used
+        count       = count,
+        index_count = header.index_count,
+        positions   = floats,
+        normals     = floats + count * 3,
+        uv          = floats + count * 6,
+        uv2         = nil,
+    }
+    local offset = count * 8
+    if(bit.band(header.flags, MESHBUFFER_UV2) ~= 0) then 
+        mbuf.uv2 = floats + offset
+        offset = offset + count * 2
+    end 
+    mbuf.indices = ffi.cast("const uint32_t *", floats + offset)
+    return mbuf
+end
+
+------------------------------------------------------------------------------------------------------------
+-- Expand the binary mesh buffer into the flat arrays used in the buffer file
+--   Defold mesh buffers have no index stream, so a welded (indexed) mesh buffer
+--   is expanded back into a triangle list here.
+
+local function getmeshbufferdata( mesh )
+
+    local vertdata, uvdata, uvdata2, normdata = {}, {}, {}, {}
+    local mbuf = readmeshbuffer( mesh.meshbuffer )
+    if(mbuf == nil) then return nil end
+
+    local pos, norm, uv, uv2 = mbuf.positions, mbuf.normals, mbuf.uv, mbuf.uv2
+    local corners = mbuf.count
+    if(mbuf.index_count > 0) then corners = mbuf.index_count end
+
+    local vi, ui = 1, 1
+    for c = 0, corners-1 do 
+        local i = c
+        if(mbuf.index_count > 0) then 
+            i = mbuf.indices[c] 
+            if(i >= mbuf.count) then 
+                print("[ERROR] Mesh buffer index out of range: "..tostring(mesh.meshbuffer))
+                return nil
+            end
+        end
+        local i3, i2 = i * 3, i * 2
+        vertdata[vi], vertdata[vi+1], vertdata[vi+2] = pos[i3], pos[i3+1], pos[i3+2]
+        normdata[vi], normdata[vi+1], normdata[vi+2] = norm[i3], norm[i3+1], norm[i3+2]
+        uvdata[ui], uvdata[ui+1] = uv[i2], uv[i2+1]
+        if(uv2) then 
+            uvdata2[ui], uvdata2[ui+1] = uv2[i2], uv2[i2+1]
+        end
+        vi, ui = vi + 3, ui + 2
+    end
+    return vertdata, uvdata, uvdata2, normdata
+end
+
+------------------------------------------------------------------------------------------------------------
+-- Expand the (older) json mesh tris into the flat arrays used in the buffer file
+
+local function getjsonbufferdata( mesh )
 
     local verts = mesh.vertices 
     local normals = mesh.normals
@@ -229,6 +354,28 @@ local function makebufferfile(name, filepath, mesh )
             end
         end
     end
+    return vertdata, uvdata, uvdata2, normdata
+end
+
+------------------------------------------------------------------------------------------------------------
+
+local function makebufferfile(name, filepath, mesh )
+
+    local bufferdata = bufferfiledata
+    local bufferfilepath = filepath..gendata.folders.meshes..PATH_SEPARATOR..name..".buffer"
+    --print(bufferfilepath)
+    --pprint(name, gendata.meshes[name] )
+    if(mesh == nil or (mesh.tris == nil and mesh.meshbuffer == nil)) then return "" end
+
+    local vertdata, uvdata, uvdata2, normdata
+    if(mesh.meshbuffer) then 
+        vertdata, uvdata, uvdata2, normdata = getmeshbufferdata( mesh )
+    end
+    -- No (or a broken) mesh buffer, use the json tris if there are any
+    if(vertdata == nil) then 
+        if(mesh.tris == nil) then return "" end
+        vertdata, uvdata, uvdata2, normdata = getjsonbufferdata( mesh )
+    end
 
     bufferdata = string.gsub(bufferdata, "MESH_VERTEX_DATA", table.concat(vertdata, ","))
     bufferdata = string.gsub(bufferdata, "MESH_NORMAL_DATA", table.concat(normdata, ","))
@@ -361,6 +508,14 @@ local function makemeshfile(name, filepath, mesh, material_override, mprops )
     return meshfilepath, { matfile = materialfile, texfiles = alltextures, texnames = alltexturenames }
 end
 
+------------------------------------------------------------------------------------------------------------
+-- Property values are written into the script as Lua string literals (the 
+--   syncdata values arrive unescaped)
+
+local function luastring( value )
+    return string.format("%q", tostring(value))
+end
+
 ------------------------------------------------------------------------------------------------------------
 
 local function makescriptfile( name, filepath, objs )
@@ -384,7 +539,7 @@ local function makescriptfile( name, filepath, objs )
         if(v.props) then 
             for pkey, pvalue in pairs(v.props) do 
                 propcount = propcount + 1
-                scriptdata = scriptdata..'gop.set("'..pkey..'", "'..pvalue..'")\n'
+                scriptdata = scriptdata..'gop.set('..luastring(pkey)..', '..luastring(pvalue)..')\n'
             end 
         end 
         if(v.defold_props) then 
@@ -392,9 +547,9 @@ local function makescriptfile( name, filepath, objs )
                 if(v.command == "Set Key/Value") then 
                     propcount = propcount + 1
                     if(v.keyval.is_table == true) then 
-                        scriptdata = scriptdata..'gop.set("'..tostring(v.keyval.key)..'", {} )\n'
+                        scriptdata = scriptdata..'gop.set('..luastring(v.keyval.key)..', {} )\n'
                     else
-                        scriptdata = scriptdata..'gop.set("'..tostring(v.keyval.key)..'", "'..tostring(v.keyval.value)..'")\n'
+                        scriptdata = scriptdata..'gop.set('..luastring(v.keyval.key)..', '..luastring(v.keyval.value)..')\n'
                     end
                 end
                 if(v.command == "Init Script") then 
@@ -403,7 +558,7 @@ local function makescriptfile( name, filepath, objs )
                 end
                 if(v.command == "Update Script") then 
                     propcount = propcount + 1
-                    updatescript = updatescript.."    "..tostring(v.scipt_init)..'\n'
+                    updatescript = updatescript.."    "..tostring(v.scipt_update)..'\n'
                 end
             end
         end
@@ -436,11 +591,51 @@ local function makescriptfile( name, filepath, objs )
     return localpathname(gendata, filepath..gendata.folders.scripts..PATH_SEPARATOR..name..".script")
 end
 
+------------------------------------------------------------------------------------------------------------
+-- Check a generated file and the project files it refers to (meshes, buffers, 
+--   textures..) are all there and not empty. Returns the file data.
+--   followrefs - check referenced files too (mesh files are always followed)
+
+local function readgenfile( fpath, followrefs )
+
+    local fh = io.open(fpath, "rb")
+    if(fh == nil) then return nil end
+    local fdata = fh:read("*all")
+    fh:close()
+    if(fdata == nil or #fdata == 0) then return nil end
+    if(followrefs ~= true) then return fdata end
+
+    -- Paths are quoted (or escaped quoted in embedded components)
+    for localpath in string.gmatch(fdata, '"(/[^"\\]+%.%w+)\\?"') do 
+        if(string.sub(localpath, 1, 10) ~= "/builtins/") then 
+            local refpath = gendata.base..localpath
+            if(readgenfile(refpath, getextension(refpath) == "mesh") == nil) then return nil end
+        end
+    end
+    return fdata
+end
+
 ------------------------------------------------------------------------------------------------------------
 
 local function makegofile( name, filepath, go )
 
-    local godata = gofiledata
+    -- Incremental sync: the go, mesh and buffer files from the last sync are still valid
+    --   if they are all still there. A collider keeps its id in the go, so it is only 
+    --   reused if that is the id the object gets now (and the id is still used up).
+    local gofilepath = filepath..gendata.folders.gos..PATH_SEPARATOR..name..".go"
+    local godata = nil
+    if(go.unchanged) then godata = readgenfile(gofilepath, true) end
+    if(godata) then 
+        if(go.type ~= "MESH" or gendata.meshes[name] == nil or getdefoldprops(go, "Collider") == nil) then 
+            return gofilepath
+        end
+        if(string.find(godata, 'id: "collisionobject_'..collision_counter..'"', 1, true)) then 
+            collision_counter = collision_counter + 1
+            return gofilepath
+        end
+    end
+
+    godata = gofiledata
     local meshdata = nil
 
     local animname, animfile = nil, nil 
@@ -463,7 +658,6 @@ local function makegofile( name, filepath, go )
         end 
     end
 
-    local gofilepath = filepath..gendata.folders.gos..PATH_SEPARATOR..name..".go"
     godata = string.gsub(godata, "MESH_GO_NAME", go.name.."_mesh")
     -- If animated need to use model type 
     local matname = nil
@@ -527,7 +721,15 @@ local function makegofile( name, filepath, go )
                     godata = string.gsub(godata, "GO_COLLIDER_COMPONENT", "")
                 end                
 
-                local meshfile, mdata = makemeshfile(name, filepath, mesh, material_override, mprops)
+                -- Linked duplicates point at the json of the object that was exported, 
+                --   the mesh files are made once under that name and shared.
+                local meshname = mesh.name or name
+                local shared = shared_meshes[meshname]
+                if(shared == nil) then 
+                    shared = { makemeshfile(meshname, filepath, mesh, material_override, mprops) }
+                    shared_meshes[meshname] = shared
+                end
+                local meshfile, mdata = shared[1], shared[2]
                 if( animfile == "gltf" ) then animfile = localpathname(gendata,  meshfile ) end
                 meshdata = mdata 
                 matname = mesh.matname
@@ -733,6 +935,29 @@ local function makecollection( collectionname, objects, objlist )
 
 end 
 
+------------------------------------------------------------------------------------------------------------
+-- Batch sync: a collection for a scene that places the collections of the scene. 
+--   The collections (and the meshes, materials and textures they use) are shared 
+--   by all the scenes.
+
+local function makescenecollection( scenename, collections, collectionlist )
+
+    local colldata = string.gsub(gocollectionheader, "COLLECTION_NAME", scenename)
+    local scenepath = gendata.project_path..PATH_SEPARATOR
+
+    for i, name in ipairs(collections) do 
+        if(collectionlist[name]) then 
+            local instdata = string.gsub(gcollectioninstance, "COLLECTION_ID", name)
+            instdata = string.gsub(instdata, "COLLECTION_FILE_PATH", localpathname(gendata, scenepath..name..".collection"))
+            colldata = colldata.."\n"..instdata
+        end
+    end
+
+    -- Dont overwrite a collection with the same name as the scene
+    if(collectionlist[scenename]) then scenename = scenename.."_scene" end
+    makefile( scenepath..scenename..".collection", colldata )
+end 
+
 ------------------------------------------------------------------------------------------------------------
 
 return {
@@ -743,6 +968,7 @@ return {
     makegofile                  = makegofile,
     genmaterial                 = genmaterial,
     makecollection              = makecollection,
+    makescenecollection         = makescenecollection,
     setgendata                  = setgendata,
 }
 
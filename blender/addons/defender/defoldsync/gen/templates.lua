@@ -379,6 +379,30 @@ name: "COLLECTION_NAME"
 scale_along_z: 0
 ]]
 
+-- A collection placed in another collection (batch sync scene collections)
+local gcollectioninstance = [[
+collection_instances {
+    id: "COLLECTION_ID"
+    collection: "COLLECTION_FILE_PATH"
+    position {
+        x: 0.0
+        y: 0.0
+        z: 0.0
+    }
+    rotation {
+        x: 0.0
+        y: 0.0
+        z: 0.0
+        w: 1.0
+    }
+    scale3 {
+        x: 1.0
+        y: 1.0
+        z: 1.0
+    }
+}
+]]
+
 local gocollectiondata = [[
 instances {
     id: "GO_NAME"
@@ -484,6 +508,7 @@ return {
     gcollectionroot         = gcollectionroot,
     gcollectionrootscript   = gcollectionrootscript,
     gocollectionheader      = gocollectionheader,
+    gcollectioninstance     = gcollectioninstance,
     gocollectiondata        = gocollectiondata,
     gocollectiongeneric     = gocollectiongeneric,
     gcollectioncamera       = gcollectioncamera,
@@ -145,6 +145,15 @@ end
 
 ------------------------------------------------------------------------------------------------------------
 
+local function fileexists( fpath )
+
+    local fh = io.open(fpath, "rb")
+    if(fh) then fh:close() end
+    return fh ~= nil
+end
+
+------------------------------------------------------------------------------------------------------------
+
 local function makefilebinary( fpath, fdata )
 
     local fh = io.open(fpath, "wb")
@@ -243,6 +252,7 @@ return {
     getextension        = getextension,
     makefile            = makefile,
     makefilebinary      = makefilebinary,
+    fileexists          = fileexists,
     makefolders         = makefolders,
     getdefoldprops      = getdefoldprops,
     getcomponents       = getcomponents,
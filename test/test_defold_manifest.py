@@ -0,0 +1,189 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Incremental sync manifest
+#    Which objects SyncManifest reports as changed against the last saved
+#    manifest, and what goes into the config hash.
+#
+#   Run from the repo root with:
+#     python -m unittest discover test
+
+import os, sys, json, shutil, tempfile, types, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_dir = os.path.join(root, "blender", "addons", "defender")
+sys.path.append(addon_dir)
+sys.path.append(os.path.join(root, "bench"))
+
+import fakebpy
+fakebpy.install()
+
+from defoldsync import defoldManifest
+
+# ------------------------------------------------------------------------
+# Stand in for the sync_tool property group (only what hashProps reads)
+
+class FakeConfig(object):
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+        props = [ types.SimpleNamespace(identifier=name) for name in values ]
+        self.bl_rna = types.SimpleNamespace(properties=props)
+
+def makeConfig(**changes):
+    values = { "sync_mode": "Sync Build", "sync_proj": "/proj", "sync_incremental": True, "sync_progress": 0.0 }
+    values.update(changes)
+    return FakeConfig(**values)
+
+# ------------------------------------------------------------------------
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.config = makeConfig()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp, ignore_errors=True)
+
+    # Sync once with the objects and commit the manifest
+    def syncOnce(self, objects, config = None):
+        manifest = defoldManifest.SyncManifest(self.temp, config or self.config)
+        for name, objhash in objects.items():
+            manifest.update(name, objhash)
+        manifest.save()
+        defoldManifest.commitManifest(self.temp)
+        return manifest
+
+    def test_no_previous_manifest(self):
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        self.assertFalse(manifest.valid)
+        self.assertTrue(manifest.isChanged("Cube"))
+
+    def test_unchanged_and_changed(self):
+        self.syncOnce({ "Cube": "a", "Sphere": "b" })
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        manifest.update("Sphere", "c")
+        manifest.update("Cone", "d")
+        self.assertTrue(manifest.valid)
+        self.assertFalse(manifest.isChanged("Cube"))
+        self.assertTrue(manifest.isChanged("Sphere"))
+        self.assertTrue(manifest.isChanged("Cone"))
+        self.assertTrue(manifest.isChanged("NotUpdated"))
+        self.assertEqual(manifest.changedCount(), 2)
+
+    def test_pending_until_committed(self):
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        manifest.save()
+        self.assertFalse(defoldManifest.SyncManifest(self.temp, self.config).valid)
+        defoldManifest.commitManifest(self.temp)
+        self.assertTrue(defoldManifest.SyncManifest(self.temp, self.config).valid)
+
+    def test_invalid_manifest(self):
+        with open(os.path.join(self.temp, defoldManifest.MANIFEST_FILE), 'w') as f:
+            f.write("{ not json")
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        self.assertFalse(manifest.valid)
+        self.assertTrue(manifest.isChanged("Cube"))
+
+    def test_old_version(self):
+        self.syncOnce({ "Cube": "a" })
+        filepath = os.path.join(self.temp, defoldManifest.MANIFEST_FILE)
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        data["version"] = defoldManifest.MANIFEST_VERSION - 1
+        with open(filepath, 'w') as f:
+            json.dump(data, f)
+        self.assertFalse(defoldManifest.SyncManifest(self.temp, self.config).valid)
+
+    def test_config_change(self):
+        self.syncOnce({ "Cube": "a" })
+        manifest = defoldManifest.SyncManifest(self.temp, makeConfig(sync_mode="Sync Run"))
+        manifest.update("Cube", "a")
+        self.assertFalse(manifest.valid)
+        self.assertTrue(manifest.isChanged("Cube"))
+
+    def test_config_ignore(self):
+        self.assertEqual(defoldManifest.configHash(self.config), defoldManifest.configHash(makeConfig(sync_incremental=False, sync_progress=0.5)))
+        self.assertNotEqual(defoldManifest.configHash(self.config), defoldManifest.configHash(makeConfig(sync_proj="/other")))
+
+    def test_forget(self):
+        self.syncOnce({ "Cube": "a", "Sphere": "b" })
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        manifest.update("Sphere", "b")
+        manifest.forget("Cube")
+        self.assertTrue(manifest.isChanged("Cube"))
+        self.assertFalse(manifest.isChanged("Sphere"))
+
+    def test_reset(self):
+        self.syncOnce({ "Cube": "a" })
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        manifest.reset()
+        self.assertTrue(manifest.isChanged("Cube"))
+
+    # Instances take in the hash of the object they share the mesh with
+    def test_instance_follows_source(self):
+        def instanceHash(source):
+            manifest = defoldManifest.SyncManifest(self.temp, self.config)
+            manifest.update("Cube", source)
+            manifest.update("Cube.001", "i")
+            manifest.addInstance("Cube.001", "Cube")
+            return manifest.current["Cube.001"]
+        self.assertEqual(instanceHash("a"), instanceHash("a"))
+        self.assertNotEqual(instanceHash("a"), instanceHash("b"))
+
+    def test_instance_changed(self):
+        def sync(source, instance):
+            manifest = defoldManifest.SyncManifest(self.temp, self.config)
+            manifest.update("Cube", source)
+            manifest.update("Cube.001", instance)
+            manifest.addInstance("Cube.001", "Cube")
+            manifest.save()
+            defoldManifest.commitManifest(self.temp)
+            return manifest
+        sync("a", "i")
+        self.assertFalse(sync("a", "i").isChanged("Cube.001"))
+        manifest = sync("b", "i")
+        self.assertTrue(manifest.isChanged("Cube"))
+        self.assertTrue(manifest.isChanged("Cube.001"))
+        self.assertTrue(sync("b", "j").isChanged("Cube.001"))
+
+    def test_instance_source_name(self):
+        manifest = defoldManifest.SyncManifest(self.temp, self.config)
+        manifest.update("Cube", "a")
+        manifest.update("Sphere", "a")
+        manifest.update("Inst1", "i")
+        manifest.update("Inst2", "i")
+        manifest.addInstance("Inst1", "Cube")
+        manifest.addInstance("Inst2", "Sphere")
+        self.assertNotEqual(manifest.current["Inst1"], manifest.current["Inst2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Vertex welding
+#    weldVertices has to keep every corner (indexing the welded streams gives
+#    the corners back) and only merge corners that match in every stream.
+#
+#   Run from the repo root with:
+#     python -m unittest discover test
+
+import os, sys, shutil, tempfile, unittest
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_dir = os.path.join(root, "blender", "addons", "defender")
+sys.path.append(addon_dir)
+sys.path.append(os.path.join(root, "bench"))
+
+import fakebpy
+fakebpy.install()
+
+from defoldsync import defoldMesh
+
+# ------------------------------------------------------------------------
+# Two triangles of a quad, corners 1,2 and 3,5 are the same vertices
+
+def makeQuad():
+    positions = np.array([ [0,0,0], [1,0,0], [1,1,0], [1,1,0], [0,1,0], [0,0,0] ], dtype=np.float32)
+    normals = np.tile(np.array([ [0,0,1] ], dtype=np.float32), (6, 1))
+    uv = positions[:, :2].copy()
+    return positions, normals, uv
+
+# ------------------------------------------------------------------------
+
+class WeldTest(unittest.TestCase):
+
+    def checkCorners(self, streams, welded):
+        indices = welded[4]
+        self.assertEqual(indices.dtype, np.uint32)
+        self.assertEqual(len(indices), len(streams[0]))
+        for stream, weld in zip(streams, welded[:4]):
+            if(stream is None):
+                self.assertIsNone(weld)
+            else:
+                np.testing.assert_array_equal(weld[indices], stream)
+
+    def test_quad(self):
+        positions, normals, uv = makeQuad()
+        welded = defoldMesh.weldVertices(positions, normals, uv, None)
+        self.assertEqual(len(welded[0]), 4)
+        self.checkCorners((positions, normals, uv, None), welded)
+        # Unique vertices stay in first use order
+        np.testing.assert_array_equal(welded[4], [ 0, 1, 2, 2, 3, 0 ])
+
+    def test_split_by_normal_and_uv(self):
+        positions, normals, uv = makeQuad()
+        normals[3] = [ 0, 1, 0 ]
+        uv[5] = [ 0.5, 0.5 ]
+        welded = defoldMesh.weldVertices(positions, normals, uv, None)
+        self.assertEqual(len(welded[0]), 6)
+        self.checkCorners((positions, normals, uv, None), welded)
+
+    def test_split_by_uv2(self):
+        positions, normals, uv = makeQuad()
+        uv2 = uv.copy()
+        welded = defoldMesh.weldVertices(positions, normals, uv, uv2)
+        self.assertEqual(len(welded[0]), 4)
+        uv2[2] = [ 0.25, 0.25 ]
+        welded = defoldMesh.weldVertices(positions, normals, uv, uv2)
+        self.assertEqual(len(welded[0]), 5)
+        self.checkCorners((positions, normals, uv, uv2), welded)
+
+    # The welded streams written with their indices make a valid buffer file
+    def test_buffer_file(self):
+        temp = tempfile.mkdtemp()
+        try:
+            filepath = os.path.join(temp, "quad.mbuf")
+            positions, normals, uv, uv2, indices = defoldMesh.weldVertices(*makeQuad(), None)
+            size = defoldMesh.writeMeshBuffer(filepath, positions, normals, uv, uv2, indices)
+            self.assertEqual(size, defoldMesh.MESHBUFFER_HEADER + (4 * 8 + 6) * 4)
+            self.assertTrue(defoldMesh.checkMeshBuffer(filepath))
+            with open(filepath, 'r+b') as f:
+                f.truncate(size - 4)
+            self.assertFalse(defoldMesh.checkMeshBuffer(filepath))
+        finally:
+            shutil.rmtree(temp, ignore_errors=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Material palette
+#    Materials with the same values share a texel, a full palette counts the
+#    materials that didnt fit and a reset palette doesnt load the last one.
+#
+#   Run from the repo root with:
+#     python -m unittest discover test
+
+import os, sys, shutil, tempfile, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_dir = os.path.join(root, "blender", "addons", "defender")
+sys.path.append(addon_dir)
+sys.path.append(os.path.join(root, "bench"))
+
+import fakebpy
+fakebpy.install()
+
+from defoldsync import defoldTextures
+
+# A different color for each i
+def color(i):
+    return [ (i % 16) / 15.0, (i // 16 % 16) / 15.0, (i // 256 % 16) / 15.0, 1.0 ]
+
+# ------------------------------------------------------------------------
+
+class PaletteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp, ignore_errors=True)
+
+    def test_dedup(self):
+        palette = defoldTextures.Palette(self.temp)
+        red = palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0] })
+        green = palette.add({ "base_color": [0.0, 1.0, 0.0, 1.0] })
+        self.assertEqual(red, 0)
+        self.assertEqual(green, 1)
+        self.assertEqual(palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0] }), red)
+        self.assertEqual(len(palette.entries), 2)
+
+    # Values are keyed by their 8 bit color, the slots and the mix factor
+    def test_key(self):
+        palette = defoldTextures.Palette(self.temp)
+        red = palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0] })
+        self.assertEqual(palette.add({ "base_color": [0.999, 0.0, 0.0, 1.0] }), red)
+        self.assertNotEqual(palette.add({ "emissive_color": [1.0, 0.0, 0.0, 1.0] }), red)
+        self.assertNotEqual(palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0] }, 0.5), red)
+        self.assertEqual(palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0], "mix_color": [0.0, 0.0, 1.0, 1.0] }, 0.5), 
+            palette.add({ "mix_color": [0.0, 0.0, 1.0, 1.0], "base_color": [1.0, 0.0, 0.0, 1.0] }, 0.5))
+
+    def test_overflow(self):
+        palette = defoldTextures.Palette(self.temp)
+        for i in range(defoldTextures.PALETTE_SIZE):
+            self.assertEqual(palette.add({ "base_color": color(i) }), i)
+        self.assertEqual(palette.overflow, 0)
+        self.assertIsNone(palette.add({ "base_color": color(defoldTextures.PALETTE_SIZE) }))
+        self.assertIsNone(palette.add({ "base_color": color(defoldTextures.PALETTE_SIZE + 1) }))
+        self.assertEqual(palette.overflow, 2)
+        # Materials already in the palette still get their texel
+        self.assertEqual(palette.add({ "base_color": color(3) }), 3)
+        self.assertEqual(palette.overflow, 2)
+
+    def test_reload_and_reset(self):
+        palette = defoldTextures.Palette(self.temp)
+        palette.add({ "base_color": [1.0, 0.0, 0.0, 1.0] })
+        palette.add({ "base_color": [0.0, 1.0, 0.0, 1.0] })
+        palette.save()
+        self.assertTrue(os.path.exists(palette.texturePath("albedo")))
+
+        palette = defoldTextures.Palette(self.temp)
+        self.assertEqual(palette.add({ "base_color": [0.0, 1.0, 0.0, 1.0] }), 1)
+
+        palette = defoldTextures.Palette(self.temp, True)
+        self.assertEqual(len(palette.entries), 0)
+        self.assertEqual(palette.add({ "base_color": [0.0, 1.0, 0.0, 1.0] }), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Defold property round trip
+#    Property values with quotes and backslashes are written to syncdata by
+#    the LuaWriter, read back by luajit and put into the generated collection
+#    script by makescriptfile. The script has to load, and the values and
+#    init/update code have to come out the same as they went in.
+#
+#   Run from the repo root with:
+#     python -m unittest discover test
+#   PNG_LIB can name the libpng luajit loads (default libpng.so).
+
+import os, sys, json, shutil, tempfile, subprocess, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_dir = os.path.join(root, "blender", "addons", "defender")
+sys.path.append(addon_dir)
+sys.path.append(os.path.join(root, "bench"))
+
+import fakebpy
+fakebpy.install()
+
+from defoldsync import defoldUtils
+
+luajit = os.path.join(addon_dir, "defoldsync", "luajit", "linux", "luajit")
+
+# Makes the script with makescriptfile, runs it with a stand in gop and prints 
+#   what it set as json
+driver = r'''
+GDIR_PATH = arg[1]
+ffi_png_lib = os.getenv("PNG_LIB")
+package.path = package.path..";"..arg[1].."/?.lua"
+local json = require("defoldsync.utils.json")
+local gen_make = require("defoldsync.gen.makefiles")
+local data = dofile(arg[2])
+
+local gendata = { base = arg[3], subfolder = "", folders = { scripts = "scripts" } }
+gendata.project_path = arg[3]
+gen_make.setgendata(gendata)
+
+local scriptfile = gen_make.makescriptfile("Test", arg[3].."/", data)
+local chunk = assert(loadfile(arg[3].."/scripts/Test.script"))
+
+local values = {}
+local gop = { set = function(k, v) values[k] = v end, getall = function() return {} end }
+local pkl = { unpickle = function() return {} end }
+local env = setmetatable({ require = function(name) 
+    if(name == "utils.pickle") then return pkl end 
+    return gop 
+end }, { __index = _G })
+setfenv(chunk, env)
+chunk()
+
+local self = {}
+env.init(self)
+env.update(self)
+values.init = self.init
+values.update = self.update
+print(json.encode(values))
+'''
+
+# ------------------------------------------------------------------------
+
+class DefoldPropsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.temp, "scripts"))
+        os.makedirs(os.path.join(self.temp, "utils"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp, ignore_errors=True)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "luajit for linux only")
+    def test_quotes_and_backslashes(self):
+
+        value = 'say "hi" \\ C:\\temp\\ \'single\''
+        thisobj = {
+            "name": "Cube",
+            "type": "MESH",
+            "props": { "custom": value },
+            "defold_props": [
+                { "command": "Set Key/Value", "keyval": { "key": "msg", "value": value, "is_table": False } },
+                { "command": "Init Script", "scipt_init": 'self.init = "a \\"b\\" \\\\ c"' },
+                { "command": "Update Script", "scipt_update": 'self.update = \'x "y"\'' },
+            ],
+        }
+
+        datafile = os.path.join(self.temp, "data.lua")
+        with open(datafile, 'w', encoding='utf-8') as f:
+            f.write("return ")
+            lw = defoldUtils.LuaWriter(f)
+            lw.begin()
+            lw.field("Cube", thisobj)
+            lw.end(True)
+
+        driverfile = os.path.join(self.temp, "driver.lua")
+        with open(driverfile, 'w') as f:
+            f.write(driver)
+
+        out = subprocess.check_output([ luajit, driverfile, addon_dir, datafile, self.temp ], universal_newlines=True)
+        values = json.loads(out.strip().splitlines()[-1])
+
+        self.assertEqual(values["custom"], value)
+        self.assertEqual(values["msg"], value)
+        self.assertEqual(values["init"], 'a "b" \\ c')
+        self.assertEqual(values["update"], 'x "y"')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -----  MIT license ------------------------------------------------------------
+# Copyright (c) 2022 David Lannan
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ------------------------------------------------------------------------
+
+
+# ------------------------------------------------------------------------
+# Scene index
+#    Children, descendants and ancestors looked up from the index built over
+#    a stand in scene.
+#
+#   Run from the repo root with:
+#     python -m unittest discover test
+
+import os, sys, types, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_dir = os.path.join(root, "blender", "addons", "defender")
+sys.path.append(addon_dir)
+sys.path.append(os.path.join(root, "bench"))
+
+import fakebpy
+fakebpy.install()
+
+import bpy
+from defoldsync import defoldScene
+
+# ------------------------------------------------------------------------
+# Stand in objects and collections (only what SceneIndex reads)
+
+class FakeObject(object):
+
+    def __init__(self, name, parent = None, collections = []):
+        self.name = name
+        self.parent = parent
+        self.users_collection = [ types.SimpleNamespace(name=coll) for coll in collections ]
+
+    def as_pointer(self):
+        return id(self)
+
+def makeContext(objects, collections):
+    layer_collections = []
+    for name, members in collections.items():
+        coll = types.SimpleNamespace(objects=members)
+        layer_collections.append(types.SimpleNamespace(name=name, is_visible=True, collection=coll))
+    view_layer = types.SimpleNamespace(layer_collection=types.SimpleNamespace(children=layer_collections))
+    scene = types.SimpleNamespace(name="Scene", objects=objects)
+    return types.SimpleNamespace(scene=scene, view_layer=view_layer, visible_objects=objects)
+
+# ------------------------------------------------------------------------
+
+class SceneIndexTest(unittest.TestCase):
+
+    #   Root (Level) > Arm (Level) > Hand (Level) > Finger (Props)
+    #                > Leg (Level)
+    def setUp(self):
+        self.root = FakeObject("Root", None, [ "Level" ])
+        self.arm = FakeObject("Arm", self.root, [ "Level" ])
+        self.leg = FakeObject("Leg", self.root, [ "Level" ])
+        self.hand = FakeObject("Hand", self.arm, [ "Level" ])
+        self.finger = FakeObject("Finger", self.hand, [ "Props" ])
+        self.other = FakeObject("Other", None, [ "Props" ])
+        objects = [ self.root, self.arm, self.leg, self.hand, self.finger, self.other ]
+
+        bpy.data = types.SimpleNamespace(objects=objects)
+        context = makeContext(objects, { "Level": objects[:4], "Props": [ self.finger, self.other ] })
+        self.index = defoldScene.SceneIndex(context)
+
+    def tearDown(self):
+        del bpy.data
+
+    def test_children(self):
+        self.assertEqual(self.index.getChildren(self.root), [ self.arm, self.leg ])
+        self.assertEqual(self.index.getChildren(self.finger), [])
+
+    def test_descendants(self):
+        descendants = self.index.getDescendants(self.root)
+        self.assertEqual(sorted(obj.name for obj in descendants), [ "Arm", "Finger", "Hand", "Leg" ])
+        # Parents come before their children
+        for obj in descendants:
+            if(obj.parent != self.root):
+                self.assertLess(descendants.index(obj.parent), descendants.index(obj))
+        self.assertEqual(self.index.getDescendants(self.other), [])
+
+    def test_ancestors(self):
+        self.assertEqual(self.index.getAncestors(self.finger), [ self.finger, self.hand, self.arm, self.root ])
+        self.assertEqual(self.index.getAncestors(self.root), [ self.root ])
+
+    # Stops at the first parent that isnt in the collection
+    def test_ancestors_in_collection(self):
+        self.assertEqual(self.index.getAncestors(self.finger, "Props"), [ self.finger ])
+        self.assertEqual(self.index.getAncestors(self.hand, "Level"), [ self.hand, self.arm, self.root ])
+
+    def test_collections(self):
+        self.assertEqual(self.index.collectionsOf(self.finger), { "Props" })
+        self.assertEqual([ coll.name for coll, objs in self.index.collections ], [ "Level", "Props" ])
+        self.assertEqual(self.index.visibleObjects([ self.other, FakeObject("Hidden") ]), [ self.other ])
+
+if __name__ == "__main__":
+    unittest.main()